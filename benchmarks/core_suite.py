@@ -0,0 +1,194 @@
+"""
+Benchmarks the hot paths of the smart_home core at several home sizes.
+
+Every benchmark is run `--repeat` times, and more often on small homes,
+where single runs are noisy; the fastest run is kept. The
+results are written as JSON and compared with a stored baseline; a
+benchmark slower than the baseline by more than `--threshold` is reported
+as a regression and makes the command exit with status 1.
+
+Usage:
+    python -m benchmarks.core_suite [--sizes 1000,100000,1000000] [--repeat 3]
+        [--output results.json] [--baseline benchmarks/baseline.json]
+        [--threshold 0.25] [--min-delta 0.01] [--save-baseline]
+"""
+import argparse
+import contextlib
+import gc
+import io
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+from typing import Callable, Dict, List, Optional
+
+from smart_home.home import Home
+from smart_home.smart_bulb import SmartBulb
+from smart_home.air_conditioner import AirConditioner
+from smart_home.scheduler import Scheduler
+from smart_home.data_manager import DataManager
+
+DEFAULT_SIZES = (1000, 100_000, 1_000_000)
+DEFAULT_BASELINE = os.path.join(os.path.dirname(__file__), "baseline.json")
+DEVICES_PER_ROOM = 20
+MAX_REPEAT = 25
+# One bulb in this many is programmable, with two events
+PROGRAMMABLE_EVERY = 10
+# add_event keeps the schedule sorted by inserting into arrays, so adding n
+# events is quadratic; the "add_event" benchmark adds min(size, this) events.
+MAX_SCHEDULE_EVENTS = 100_000
+
+
+def build_home(devices: int) -> Home:
+    """A home with `devices` devices, half bulbs and half air conditioners."""
+    home = Home(f"Benchmark Home ({devices} devices)")
+    room_name = None
+    for index in range(devices):
+        if index % DEVICES_PER_ROOM == 0:
+            room_name = home.add_room(f"Room {index // DEVICES_PER_ROOM}").name
+        if index % 2 == 0:
+            device = SmartBulb(f"Bulb {index}", is_programmable=index % (2 * PROGRAMMABLE_EVERY) == 0)
+        else:
+            device = AirConditioner(f"AC {index}")
+        home.add_device_to_room(device, room_name)
+    for scheduler in home.schedulers:
+        scheduler.add_events([("Monday", 7, 0, 0, "turn_on"), ("Monday", 23, 0, 0, "turn_off")])
+    home.mark_clean()
+    return home
+
+
+def best_of(repeat: int, run: Callable[[], None], setup: Optional[Callable[[], None]] = None) -> float:
+    """The fastest of `repeat` runs, in seconds; garbage collection is paused while timing."""
+    best = float("inf")
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        gc.collect()
+        gc.disable()
+        try:
+            started = time.perf_counter()
+            run()
+            best = min(best, time.perf_counter() - started)
+        finally:
+            gc.enable()
+    return best
+
+
+def bench_size(devices: int, repeat: int, workdir: str) -> Dict[str, float]:
+    """Runs every benchmark on a home of `devices` devices."""
+    repeat = max(repeat, min(MAX_REPEAT, 100_000 // devices))
+    home = build_home(devices)
+    data = home.to_dict()
+    filename = os.path.join(workdir, f"home_{devices}.json")
+    DataManager.save_home_to_json(home, filename)
+    results = {
+        "to_dict": best_of(repeat, home.to_dict),
+        "from_dict": best_of(repeat, lambda data=data: Home.from_dict(data)),
+        "save_home_to_json": best_of(repeat, lambda: DataManager.save_home_to_json(home, filename)),
+        "load_home_from_json": best_of(repeat, lambda: DataManager.load_home_from_json(filename)),
+        "synchronize_id_counters": best_of(repeat, lambda: DataManager._synchronize_id_counters(home)),
+        "get_all_devices": best_of(repeat, lambda: sum(1 for _ in home.get_all_devices())),
+    }
+    # The dict of a large home is big; don't keep it alive for the remaining benchmarks.
+    del data
+
+    events = min(devices, MAX_SCHEDULE_EVENTS)
+    days = Scheduler.get_week_days()
+    # A fixed pseudo-random walk over the week, so inserts land all over the schedule.
+    times = [((i * 7919) % 604800) for i in range(events)]
+    specs = [(days[t // 86400], t // 3600 % 24, t // 60 % 60, t % 60, "turn_on" if i % 2 else "turn_off")
+             for i, t in enumerate(times)]
+    schedulers: List[Scheduler] = []
+
+    def new_scheduler() -> None:
+        schedulers[:] = [Scheduler(SmartBulb("Scheduled Bulb", is_programmable=True))]
+
+    def add_all() -> None:
+        add_event = schedulers[0].add_event
+        for spec in specs:
+            add_event(*spec)
+
+    results["add_event"] = best_of(repeat, add_all, setup=new_scheduler)
+    return results
+
+
+def compare(results: Dict[str, Dict[str, float]], baseline: Dict[str, Dict[str, float]],
+            threshold: float, min_delta: float) -> List[str]:
+    """
+    Describes every benchmark more than `threshold` slower than its baseline.
+
+    Slowdowns of less than `min_delta` seconds are ignored; at the smallest
+    sizes they are mostly noise.
+    """
+    regressions = []
+    for size, timings in results.items():
+        for name, seconds in timings.items():
+            reference = baseline.get(size, {}).get(name)
+            if reference and seconds > reference * (1 + threshold) and seconds - reference >= min_delta:
+                regressions.append(f"{name} @ {size} devices: {seconds:.4f} s vs {reference:.4f} s "
+                                   f"({(seconds / reference - 1) * 100:+.0f}%)")
+    return regressions
+
+
+def print_table(results: Dict[str, Dict[str, float]], baseline: Dict[str, Dict[str, float]]) -> None:
+    for size, timings in results.items():
+        print(f"{size} devices:")
+        for name, seconds in timings.items():
+            reference = baseline.get(size, {}).get(name)
+            change = f"  {(seconds / reference - 1) * 100:+6.1f}%" if reference else ""
+            print(f"  {name:<28} {seconds:10.4f} s{change}")
+
+
+def main(argv) -> int:
+    parser = argparse.ArgumentParser(prog="benchmarks.core_suite", description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", default=",".join(str(size) for size in DEFAULT_SIZES),
+                        help="comma-separated device counts")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--threshold", type=float, default=0.25, help="allowed slowdown, 0.25 = 25%%")
+    parser.add_argument("--min-delta", type=float, default=0.01, help="ignore slowdowns below this many seconds")
+    parser.add_argument("--save-baseline", action="store_true", help="store the results as the new baseline")
+    args = parser.parse_args(argv)
+    sizes = [int(size) for size in args.sizes.split(",")]
+
+    results = {}
+    with tempfile.TemporaryDirectory() as workdir:
+        for size in sizes:
+            # DataManager reports every save and load; keep the output readable.
+            with contextlib.redirect_stdout(io.StringIO()):
+                results[str(size)] = bench_size(size, args.repeat, workdir)
+            print(f"Measured {size} devices.", file=sys.stderr)
+
+    report = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "repeat": args.repeat,
+        "results": results,
+    }
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)["results"]
+    if args.save_baseline:
+        # Sizes that were not measured keep their previous baseline.
+        with open(args.baseline, "w") as f:
+            json.dump({**report, "results": {**baseline, **results}}, f, indent=4)
+        print(f"Baseline saved to {args.baseline}")
+        baseline = {}
+    regressions = compare(results, baseline, args.threshold, args.min_delta)
+    report["regressions"] = regressions
+
+    print_table(results, baseline)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=4)
+    for regression in regressions:
+        print(f"REGRESSION: {regression}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,40 @@
+"""
+Measures the memory held by device objects.
+
+Usage:
+    python -m benchmarks.device_memory [COUNT]
+"""
+import sys
+import tracemalloc
+
+from smart_home.smart_bulb import SmartBulb
+from smart_home.air_conditioner import AirConditioner
+
+
+def measure(factory, count: int) -> float:
+    """Returns the bytes allocated per object created by `factory`."""
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    objects = [factory(i) for i in range(count)]
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    allocated = sum(stat.size_diff for stat in after.compare_to(before, 'filename'))
+    # The list holding the objects is not part of the per-device cost.
+    allocated -= sys.getsizeof(objects)
+    return allocated / count
+
+
+def main(argv) -> None:
+    count = int(argv[0]) if argv else 100_000
+    results = {
+        "SmartBulb": measure(lambda i: SmartBulb(f"Bulb {i}"), count),
+        "SmartBulb (colored)": measure(lambda i: SmartBulb(f"Bulb {i}", color={'r': i % 256, 'g': 0, 'b': 0}), count),
+        "AirConditioner": measure(lambda i: AirConditioner(f"AC {i}"), count),
+    }
+    print(f"Bytes per device ({count} devices, names included):")
+    for name, per_device in results.items():
+        print(f"  {name:<22} {per_device:8.1f}")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
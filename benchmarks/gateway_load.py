@@ -0,0 +1,59 @@
+"""
+Load-tests the device gateway against the local device simulator.
+
+Every device gets alternating status writes and rising intensity writes, so
+the run exercises per-device ordering, coalescing and retries. The run is
+repeated with a connection per command and with the pooled, pipelined
+transport.
+
+Usage:
+    python -m benchmarks.gateway_load [DEVICES] [WRITES_PER_DEVICE] [LATENCY] [FAILURE_RATE]
+"""
+import asyncio
+import sys
+import time
+
+from smart_home.gateway import DeviceGateway, DeviceCommand, StreamTransport
+from smart_home.device_simulator import DeviceSimulator
+from smart_home.transport import PooledTransport
+
+
+async def run(devices: int, writes: int, latency: float, failure_rate: float, pooled: bool) -> None:
+    simulator = DeviceSimulator(latency=latency, jitter=latency / 2, failure_rate=failure_rate, seed=1)
+    host, port = await simulator.start()
+    transport = PooledTransport(host, port) if pooled else StreamTransport(host, port)
+    # Without a pool every command in flight holds a socket of its own.
+    gateway = DeviceGateway(transport, max_in_flight=1000 if pooled else 100)
+    started = time.perf_counter()
+    for step in range(writes):
+        for device in range(devices):
+            gateway.submit(DeviceCommand(f"device-{device}", "status", step % 2 == 0))
+            gateway.submit(DeviceCommand(f"device-{device}", "intensity", step))
+    await gateway.drain()
+    elapsed = time.perf_counter() - started
+    connections = transport.stats() if pooled else []
+    await gateway.close()
+    await simulator.close()
+
+    stats = gateway.stats()
+    print(f"{type(transport).__name__}: {stats['submitted']} commands to {devices} devices in {elapsed:.2f} s "
+          f"({stats['submitted'] / elapsed:.0f} commands/s, {stats['delivered'] / elapsed:.0f} delivered/s)")
+    for name, value in stats.items():
+        print(f"  {name:<13} {value:.4f}" if isinstance(value, float) else f"  {name:<13} {value}")
+    print(f"  bridge        {simulator.stats()}")
+    for index, connection in enumerate(connections):
+        print(f"  connection {index}  frames {connection['frames']}, mean batch {connection['mean_batch']:.1f}, "
+              f"mean RTT {connection['mean_rtt'] * 1000:.1f} ms, max RTT {connection['max_rtt'] * 1000:.1f} ms")
+
+
+def main(argv) -> None:
+    devices = int(argv[0]) if len(argv) > 0 else 1000
+    writes = int(argv[1]) if len(argv) > 1 else 10
+    latency = float(argv[2]) if len(argv) > 2 else 0.005
+    failure_rate = float(argv[3]) if len(argv) > 3 else 0.01
+    for pooled in (False, True):
+        asyncio.run(run(devices, writes, latency, failure_rate, pooled))
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
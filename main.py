@@ -1,12 +1,21 @@
-from smart_home_ui.main_controller import MainController
+import sys
 
 DATA_FILE = "home_data.json"
 
-def main() -> None:
+def main(argv=None) -> int:
+    args = sys.argv[1:] if argv is None else list(argv)
+    if "--headless" in args:
+        # The daemon never imports smart_home_ui, so Tk is not loaded at all.
+        from smart_home.daemon import main as run_headless
+        args.remove("--headless")
+        return run_headless(args, default_data_file=DATA_FILE)
+
+    from smart_home_ui.main_controller import MainController
     print("--- Welcome to the Smart Home Management System (v2) ---")
 
-    app = MainController(DATA_FILE)
+    app = MainController(args[0] if args else DATA_FILE)
     app.run()
+    return 0
 
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
@@ -7,6 +7,7 @@ class AirConditioner(Device):
     Represents a smart air conditioner, a concrete implementation of a Device.
     Its intensity is managed as temperature.
     """
+    __slots__ = ('_name',)
     _id_counter = itertools.count()
     DEFAULT_TEMP_INCREMENT = 1
 
@@ -48,10 +49,10 @@ class AirConditioner(Device):
         increment = amount if amount else self.DEFAULT_TEMP_INCREMENT
         new_temp = self._intensity + increment
         if new_temp > self._max_intensity:
-            self._intensity = self._max_intensity
+            self._update_intensity(self._max_intensity)
             print(f"Temperature for {self.name} set to maximum ({self._max_intensity}°C).")
         else:
-            self._intensity = new_temp
+            self._update_intensity(new_temp)
 
     def decrease_intensity(self, amount: Optional[int] = None) -> None:
         """
@@ -61,10 +62,10 @@ class AirConditioner(Device):
         decrement = amount if amount else self.DEFAULT_TEMP_INCREMENT
         new_temp = self._intensity - decrement
         if new_temp < self._min_intensity:
-            self._intensity = self._min_intensity
+            self._update_intensity(self._min_intensity)
             print(f"Temperature for {self.name} set to minimum ({self._min_intensity}°C).")
         else:
-            self._intensity = new_temp
+            self._update_intensity(new_temp)
 
     def __str__(self) -> str:
         status_str = "ON" if self.status else "OFF"
@@ -0,0 +1,299 @@
+import mmap
+import shutil
+import struct
+import sys
+import tempfile
+from array import array
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from .home import Home, DEVICE_CLASSES
+from .room import Room
+from .device import Device
+from .smart_bulb import SmartBulb
+from .air_conditioner import AirConditioner
+from .scheduler import Scheduler
+
+MAGIC = b"SHB1"
+VERSION = 1
+
+# magic, version, reserved, counts (strings, rooms, devices, schedulers, events),
+# byte offsets of the sections that follow
+HEADER = struct.Struct("<4sHH5I5Q")
+# name index, first device index, device count
+ROOM_RECORD = struct.Struct("<III")
+# id index, name index, type code, flags, intensity, packed 0xRRGGBB color
+DEVICE_RECORD = struct.Struct("<IIBBhI")
+# device index, first event index, event count
+SCHEDULER_RECORD = struct.Struct("<III")
+
+FLAG_STATUS = 0x01
+FLAG_PROGRAMMABLE = 0x02
+
+DEVICE_TYPE_CODES = {SmartBulb: 0, AirConditioner: 1}
+DEVICE_TYPES = {code: cls for cls, code in DEVICE_TYPE_CODES.items()}
+
+# (id, type name, name, is_programmable, status, intensity, packed color or None)
+DeviceRow = Tuple[str, str, str, bool, bool, int, Optional[int]]
+# (device id, its (seconds_of_week, action_code) events in order)
+ScheduleRow = Tuple[str, Sequence[Tuple[int, int]]]
+
+_SWAP_BYTES = sys.byteorder != "little"
+
+
+class BinarySnapshotError(ValueError):
+    """Raised when a file is not a valid binary home snapshot."""
+    pass
+
+
+class _StringTable:
+    """Deduplicating table of UTF-8 strings addressed by index."""
+
+    def __init__(self):
+        self._indexes: Dict[str, int] = {}
+        self._encoded: List[bytes] = []
+
+    def add(self, value: str) -> int:
+        index = self._indexes.get(value)
+        if index is None:
+            index = self._indexes[value] = len(self._encoded)
+            self._encoded.append(value.encode("utf-8"))
+        return index
+
+    def __len__(self) -> int:
+        return len(self._encoded)
+
+    def to_bytes(self) -> bytes:
+        offsets = array("I", [0])
+        for data in self._encoded:
+            offsets.append(offsets[-1] + len(data))
+        if _SWAP_BYTES:
+            offsets.byteswap()
+        return offsets.tobytes() + b"".join(self._encoded)
+
+
+def _device_record(id_index: int, name_index: int, device_class: type, status: bool, is_programmable: bool,
+                   intensity: int, color: int) -> bytes:
+    type_code = DEVICE_TYPE_CODES.get(device_class)
+    if type_code is None:
+        raise BinarySnapshotError(f"Unsupported device type '{device_class.__name__}'.")
+    flags = (FLAG_STATUS if status else 0) | (FLAG_PROGRAMMABLE if is_programmable else 0)
+    return DEVICE_RECORD.pack(id_index, name_index, type_code, flags, intensity, color)
+
+
+def _header(string_count: int, room_count: int, device_count: int, scheduler_count: int, event_count: int,
+            section_sizes: Sequence[int]) -> bytes:
+    """The file header; `section_sizes` are the byte sizes of the strings, rooms, devices and schedulers sections."""
+    offset = HEADER.size
+    section_offsets = []
+    for size in section_sizes:
+        section_offsets.append(offset)
+        offset += size
+    # Event times follow the scheduler records, and the actions follow the times.
+    section_offsets.append(offset)
+    return HEADER.pack(MAGIC, VERSION, 0, string_count, room_count, device_count, scheduler_count, event_count,
+                       *section_offsets)
+
+
+def save_home(home: Home, filename: str) -> None:
+    """Writes a home to a binary snapshot file."""
+    strings = _StringTable()
+    strings.add(home.name)
+    room_records = bytearray()
+    device_records = bytearray()
+    device_positions: Dict[str, int] = {}
+
+    store = Device.store
+    for room in home.rooms:
+        devices = room.devices
+        room_records += ROOM_RECORD.pack(strings.add(room.name), len(device_positions), len(devices))
+        # State columns are copied straight out of the DeviceStore.
+        slots = room.slots()
+        statuses = store.gather(store.status, slots)
+        intensities = store.gather(store.intensity, slots)
+        colors = store.gather(store.color, slots)
+        for i, device in enumerate(devices):
+            device_records += _device_record(strings.add(device.id), strings.add(device.name), type(device),
+                                             statuses[i], device.is_programmable, intensities[i], colors[i])
+            device_positions[device.id] = len(device_positions)
+
+    scheduler_records = bytearray()
+    times = array("i")
+    actions = array("b")
+    schedulers = [s for s in home.schedulers if s.device.id in device_positions]
+    for scheduler in schedulers:
+        event_times, event_actions = scheduler.event_arrays()
+        scheduler_records += SCHEDULER_RECORD.pack(device_positions[scheduler.device.id], len(times), len(event_times))
+        times.extend(event_times)
+        actions.extend(event_actions)
+    if _SWAP_BYTES:
+        times.byteswap()
+
+    string_bytes = strings.to_bytes()
+    header = _header(len(strings), len(home.rooms), len(device_positions), len(schedulers), len(times),
+                     [len(string_bytes), len(room_records), len(device_records), len(scheduler_records)])
+    with open(filename, "wb") as f:
+        f.write(header)
+        f.write(string_bytes)
+        f.write(room_records)
+        f.write(device_records)
+        f.write(scheduler_records)
+        f.write(times.tobytes())
+        f.write(actions.tobytes())
+
+
+def write_rooms(filename: str, home_name: str,
+                rooms: Iterable[Tuple[str, Sequence[DeviceRow], Iterable[ScheduleRow]]]) -> None:
+    """
+    Writes a binary snapshot from plain rows, one room at a time.
+
+    Each room is a (name, devices, schedules) tuple; schedules may only
+    refer to devices of their own room. Sections are spooled to temporary
+    files and joined at the end, so memory use does not grow with the size
+    of the home. Unlike `save_home`, strings are not deduplicated.
+    """
+    sections = [tempfile.TemporaryFile() for _ in range(7)]
+    string_offsets, string_blob, room_records, device_records, scheduler_records, times, actions = sections
+    counts = {"strings": 0, "rooms": 0, "devices": 0, "schedulers": 0, "events": 0, "blob": 0}
+
+    def add_string(value: str) -> int:
+        data = value.encode("utf-8")
+        counts["blob"] += len(data)
+        string_blob.write(data)
+        string_offsets.write(struct.pack("<I", counts["blob"]))
+        counts["strings"] += 1
+        return counts["strings"] - 1
+
+    try:
+        string_offsets.write(struct.pack("<I", 0))
+        add_string(home_name)
+        for room_name, devices, schedules in rooms:
+            room_records.write(ROOM_RECORD.pack(add_string(room_name), counts["devices"], len(devices)))
+            counts["rooms"] += 1
+            positions = {}
+            for device_id, device_type, name, is_programmable, status, intensity, color in devices:
+                device_class = DEVICE_CLASSES.get(device_type)
+                if device_class is None:
+                    raise BinarySnapshotError(f"Unsupported device type '{device_type}'.")
+                device_records.write(_device_record(add_string(device_id), add_string(name), device_class,
+                                                    status, is_programmable, intensity, color or 0))
+                positions[device_id] = counts["devices"]
+                counts["devices"] += 1
+            for device_id, events in schedules:
+                scheduler_records.write(SCHEDULER_RECORD.pack(positions[device_id], counts["events"], len(events)))
+                times.write(struct.pack(f"<{len(events)}i", *(offset for offset, _ in events)))
+                actions.write(struct.pack(f"<{len(events)}b", *(action for _, action in events)))
+                counts["schedulers"] += 1
+                counts["events"] += len(events)
+
+        header = _header(counts["strings"], counts["rooms"], counts["devices"], counts["schedulers"],
+                         counts["events"], [string_offsets.tell() + string_blob.tell(), room_records.tell(),
+                                            device_records.tell(), scheduler_records.tell()])
+        with open(filename, "wb") as f:
+            f.write(header)
+            for section in sections:
+                section.seek(0)
+                shutil.copyfileobj(section, f)
+    finally:
+        for section in sections:
+            section.close()
+
+
+def load_home(filename: str) -> Home:
+    """
+    Reads a home from a binary snapshot file.
+
+    The file is memory-mapped and its fixed-width records are decoded
+    directly into Room, Device and Scheduler objects.
+    """
+    with open(filename, "rb") as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            try:
+                return _decode(mapped)
+            except BinarySnapshotError as e:
+                # Re-raised below: the traceback keeps views into the map alive,
+                # which would prevent it from being closed.
+                message = str(e)
+    raise BinarySnapshotError(message)
+
+
+def _decode(mapped: mmap.mmap) -> Home:
+    buffer = memoryview(mapped)
+    if len(buffer) < HEADER.size:
+        raise BinarySnapshotError("File is too short to be a binary snapshot.")
+    (magic, version, _, string_count, room_count, device_count, scheduler_count, event_count,
+     strings_at, rooms_at, devices_at, schedulers_at, events_at) = HEADER.unpack_from(buffer)
+    if magic != MAGIC:
+        raise BinarySnapshotError("Not a binary home snapshot.")
+    if version != VERSION:
+        raise BinarySnapshotError(f"Unsupported snapshot version {version}.")
+
+    try:
+        string_offsets = array("I")
+        string_offsets.frombytes(buffer[strings_at:strings_at + 4 * (string_count + 1)])
+        if _SWAP_BYTES:
+            string_offsets.byteswap()
+        blob_at = strings_at + 4 * (string_count + 1)
+        blob = bytes(buffer[blob_at:blob_at + string_offsets[-1]])
+        strings = [blob[string_offsets[i]:string_offsets[i + 1]].decode("utf-8") for i in range(string_count)]
+
+        devices: List[Device] = []
+        records = buffer[devices_at:devices_at + device_count * DEVICE_RECORD.size]
+        for id_index, name_index, type_code, flags, intensity, color in DEVICE_RECORD.iter_unpack(records):
+            devices.append(_build_device(strings[id_index], strings[name_index], type_code, flags, intensity, color))
+
+        home = Home(strings[0])
+        records = buffer[rooms_at:rooms_at + room_count * ROOM_RECORD.size]
+        for name_index, first, count in ROOM_RECORD.iter_unpack(records):
+            room = Room(strings[name_index])
+            for device in devices[first:first + count]:
+                room.add_device(device)
+            home._attach_room(room)
+
+        times = array("i")
+        times.frombytes(buffer[events_at:events_at + 4 * event_count])
+        if _SWAP_BYTES:
+            times.byteswap()
+        actions_at = events_at + 4 * event_count
+        actions = array("b")
+        actions.frombytes(buffer[actions_at:actions_at + event_count])
+
+        records = buffer[schedulers_at:schedulers_at + scheduler_count * SCHEDULER_RECORD.size]
+        for device_index, first, count in SCHEDULER_RECORD.iter_unpack(records):
+            scheduler = Scheduler.from_arrays(devices[device_index], times[first:first + count],
+                                              actions[first:first + count])
+            home._attach_scheduler(scheduler)
+    except (IndexError, UnicodeDecodeError, struct.error) as e:
+        raise BinarySnapshotError(f"Corrupted binary snapshot: {e}") from e
+    home.mark_clean()
+    return home
+
+
+def _build_device(device_id: str, name: str, type_code: int, flags: int, intensity: int, color: int) -> Device:
+    device_class = DEVICE_TYPES.get(type_code)
+    if device_class is None:
+        raise BinarySnapshotError(f"Unknown device type code {type_code}.")
+    status = bool(flags & FLAG_STATUS)
+    if device_class is SmartBulb:
+        device = SmartBulb(name, is_programmable=bool(flags & FLAG_PROGRAMMABLE))
+        device._color = color
+    else:
+        device = device_class(name)
+    device._id = device_id
+    device._status = status
+    device._intensity = intensity
+    return device
+
+
+def main(argv: List[str]) -> int:
+    """Converts between JSON and binary snapshots: python -m smart_home.binary_snapshot SRC DST"""
+    from .data_manager import DataManager
+
+    if len(argv) != 2:
+        print("Usage: python -m smart_home.binary_snapshot SOURCE DESTINATION")
+        return 2
+    DataManager.convert(argv[0], argv[1])
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
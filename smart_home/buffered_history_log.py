@@ -0,0 +1,236 @@
+import csv
+import io
+import json
+import os
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, Iterable, List, NamedTuple, Optional
+
+from .device import Device
+from .home import Home
+from .room import Room
+
+FORMATS = ("ndjson", "csv")
+CSV_COLUMNS = ("ts", "room", "device", "type", "name", "status", "intensity", "color")
+
+
+class HistoryRecord(NamedTuple):
+    """The state of one device at one point in time."""
+    timestamp: float
+    room: str
+    device_id: str
+    fields: Dict[str, Any]
+
+
+def _device_fields(device: Device) -> Dict[str, Any]:
+    fields: Dict[str, Any] = {"type": type(device).__name__, "name": device.name,
+                              "status": device.status, "intensity": device.intensity}
+    packed = getattr(device, 'packed_color', None)
+    if packed is not None:
+        fields["color"] = f"#{packed:06x}"
+    return fields
+
+
+class BufferedHistoryLog:
+    """
+    Structured, buffered counterpart of `Room.save_log`.
+
+    Records are queued in memory by the caller and written in batches by a
+    background thread, as NDJSON (one object per line) or CSV. The file is
+    rotated once it grows past `max_bytes` or is older than
+    `rotate_interval` seconds; rotated files are kept as `<file>.1` (newest)
+    to `<file>.<backup_count>`. If the writer falls behind by more than
+    `max_queue` records, the oldest ones are dropped instead of blocking.
+    """
+
+    def __init__(self, filename: str, format: str = "ndjson", flush_interval: float = 1.0,
+                 batch_size: int = 1000, max_bytes: Optional[int] = None,
+                 rotate_interval: Optional[float] = None, backup_count: int = 5,
+                 max_queue: int = 100000, clock: Callable[[], float] = time.time):
+        """
+        Opens the log and starts its writer thread.
+
+        Args:
+            filename: The log file to append to.
+            format: 'ndjson' or 'csv'.
+            flush_interval: Longest time in seconds a record waits before being written.
+            batch_size: Number of queued records that triggers an early write.
+            max_bytes: Size after which the file is rotated, or None.
+            rotate_interval: Age in seconds after which the file is rotated, or None.
+            backup_count: Number of rotated files to keep.
+            max_queue: Number of queued records after which the oldest are dropped.
+            clock: Returns the current time in seconds since the epoch.
+        """
+        if format not in FORMATS:
+            raise ValueError(f"Unknown log format '{format}'.")
+        self.filename = filename
+        self.format = format
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.max_bytes = max_bytes
+        self.rotate_interval = rotate_interval
+        self.backup_count = backup_count
+        self.max_queue = max_queue
+        self._clock = clock
+        self._queue: Deque[HistoryRecord] = deque()
+        self._condition = threading.Condition()
+        self._flush_requested = False
+        self._written_generation = 0
+        self._queued_generation = 0
+        self._closed = False
+        self.dropped = 0
+        self.written = 0
+        self.failed = 0  # Records lost because their batch could not be written
+        self.rotations = 0
+
+        self._file = None
+        self._opened_at = 0.0
+        self._open()
+        self._thread = threading.Thread(target=self._run, name="BufferedHistoryLog", daemon=True)
+        self._thread.start()
+
+    def record(self, room_name: str, device: Device, timestamp: Optional[float] = None) -> None:
+        """Queues the current state of one device."""
+        self._enqueue([HistoryRecord(self._clock() if timestamp is None else timestamp,
+                                     room_name, device.id, _device_fields(device))])
+
+    def log_room(self, room: Room, timestamp: Optional[float] = None) -> None:
+        """Queues the current state of every device in a room."""
+        self.log_rooms([room], timestamp)
+
+    def log_home(self, home: Home, timestamp: Optional[float] = None) -> None:
+        """Queues the current state of every device in a home."""
+        self.log_rooms(home.rooms, timestamp)
+
+    def log_rooms(self, rooms: Iterable[Room], timestamp: Optional[float] = None) -> None:
+        """Queues the current state of every device in the given rooms, all with one timestamp."""
+        timestamp = self._clock() if timestamp is None else timestamp
+        records: List[HistoryRecord] = []
+        for room in rooms:
+            name = room.name
+            for device in room.devices:
+                records.append(HistoryRecord(timestamp, name, device.id, _device_fields(device)))
+        self._enqueue(records)
+
+    def _enqueue(self, records: List[HistoryRecord]) -> None:
+        if not records:
+            return
+        with self._condition:
+            if self._closed:
+                raise ValueError("History log is closed.")
+            self._queue.extend(records)
+            self._queued_generation += 1
+            overflow = len(self._queue) - self.max_queue
+            if overflow > 0:
+                for _ in range(overflow):
+                    self._queue.popleft()
+                self.dropped += overflow
+            if len(self._queue) >= self.batch_size:
+                self._condition.notify_all()
+
+    @property
+    def pending(self) -> int:
+        """The number of queued records not yet written."""
+        with self._condition:
+            return len(self._queue)
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """
+        Waits until every record queued so far has been written.
+
+        Returns:
+            False if the timeout expired first.
+        """
+        with self._condition:
+            target = self._queued_generation
+            self._flush_requested = True
+            self._condition.notify_all()
+            return self._condition.wait_for(lambda: self._written_generation >= target, timeout)
+
+    def close(self) -> None:
+        """Writes the remaining records, stops the writer thread and closes the file."""
+        with self._condition:
+            if self._closed:
+                return
+            self._closed = True
+            self._condition.notify_all()
+        self._thread.join()
+        self._file.close()
+
+    def _run(self) -> None:
+        """Writes queued records in batches until the log is closed."""
+        while True:
+            with self._condition:
+                self._condition.wait_for(lambda: self._closed or self._flush_requested
+                                         or len(self._queue) >= self.batch_size, self.flush_interval)
+                batch = list(self._queue)
+                self._queue.clear()
+                generation = self._queued_generation
+                self._flush_requested = False
+                closed = self._closed
+            if batch:
+                try:
+                    self._write(batch)
+                except Exception as e:
+                    # The thread must survive, or flush() would wait forever and the queue would overflow.
+                    self.failed += len(batch)
+                    print(f"Error writing history log '{self.filename}': {e}")
+            with self._condition:
+                self._written_generation = generation
+                self._condition.notify_all()
+            if closed:
+                return
+
+    def _write(self, batch: List[HistoryRecord]) -> None:
+        data = self._encode(batch)
+        if self._should_rotate(len(data)):
+            self._rotate()
+            if self.format == "csv":
+                # The fresh file needs its own header row.
+                data = self._encode(batch)
+        self._file.write(data)
+        self._file.flush()
+        self.written += len(batch)
+
+    def _encode(self, batch: List[HistoryRecord]) -> bytes:
+        if self.format == "ndjson":
+            lines = [json.dumps({"ts": record.timestamp, "room": record.room, "device": record.device_id,
+                                 "fields": record.fields}, separators=(',', ':')) for record in batch]
+            return ("\n".join(lines) + "\n").encode("utf-8")
+        out = io.StringIO()
+        writer = csv.writer(out, lineterminator="\n")
+        if self._file.tell() == 0:
+            writer.writerow(CSV_COLUMNS)
+        for record in batch:
+            fields = record.fields
+            writer.writerow((record.timestamp, record.room, record.device_id, fields.get("type"),
+                             fields.get("name"), int(fields.get("status", False)), fields.get("intensity"),
+                             fields.get("color", "")))
+        return out.getvalue().encode("utf-8")
+
+    def _should_rotate(self, incoming: int) -> bool:
+        size = self._file.tell()
+        if size == 0:
+            return False
+        if self.max_bytes is not None and size + incoming > self.max_bytes:
+            return True
+        return self.rotate_interval is not None and self._clock() - self._opened_at >= self.rotate_interval
+
+    def _rotate(self) -> None:
+        """Shifts `<file>.N` to `<file>.N+1`, moves the current file to `<file>.1` and reopens it."""
+        self._file.close()
+        if self.backup_count > 0:
+            for index in range(self.backup_count - 1, 0, -1):
+                source = f"{self.filename}.{index}"
+                if os.path.exists(source):
+                    os.replace(source, f"{self.filename}.{index + 1}")
+            os.replace(self.filename, f"{self.filename}.1")
+        else:
+            os.remove(self.filename)
+        self.rotations += 1
+        self._open()
+
+    def _open(self) -> None:
+        self._file = open(self.filename, 'ab')
+        self._opened_at = self._clock()
@@ -0,0 +1,158 @@
+import signal
+import sys
+import threading
+import time
+from typing import Callable, List, Optional
+
+from .home import Home
+from .data_manager import DataManager
+from .schedule_runner import ScheduleRunner
+from .buffered_history_log import BufferedHistoryLog, FORMATS
+from .metrics import METRICS
+
+
+class HomeDaemon:
+    """
+    Runs a home without a user interface.
+
+    Loads the home, executes its schedules, saves changes periodically and
+    optionally logs the state of every device to a history log. Only
+    `smart_home` is imported, so it runs on machines without Tk or a display.
+    """
+
+    def __init__(self, data_file: str, autosave_interval: float = 30.0, log_file: Optional[str] = None,
+                 log_interval: float = 60.0, log_format: str = "ndjson",
+                 default_name: str = "My First Smart Home", metrics_file: Optional[str] = None,
+                 clock: Callable[[], float] = time.time):
+        """
+        Initializes the daemon; nothing is loaded until `start`.
+
+        Args:
+            data_file: The saved home, in any format DataManager supports.
+            autosave_interval: Seconds between two delta saves.
+            log_file: History log to append device states to, or None.
+            log_interval: Seconds between two history snapshots.
+            log_format: 'ndjson' or 'csv'.
+            default_name: Name of the home if the file does not exist.
+            metrics_file: Enables metrics and writes a snapshot there after every save;
+                Prometheus text for '.prom' files, appended NDJSON otherwise.
+            clock: Returns the current time in seconds since the epoch.
+        """
+        self.data_file = data_file
+        self.autosave_interval = autosave_interval
+        self.log_file = log_file
+        self.log_interval = log_interval
+        self.log_format = log_format
+        self.default_name = default_name
+        self.metrics_file = metrics_file
+        self._clock = clock
+        self.home: Optional[Home] = None
+        self.runner: Optional[ScheduleRunner] = None
+        self.history_log: Optional[BufferedHistoryLog] = None
+        self._stopped = threading.Event()
+        self._next_save = 0.0
+        self._next_log = 0.0
+
+    def start(self) -> None:
+        """Loads the home and starts executing its schedules."""
+        if self.metrics_file:
+            METRICS.enable()
+        self.home = DataManager.load_home(self.data_file)
+        if self.home is None:
+            self.home = Home(self.default_name)
+        self.runner = ScheduleRunner(self.home, clock=self._clock)
+        self.runner.start()
+        if self.log_file:
+            self.history_log = BufferedHistoryLog(self.log_file, format=self.log_format, clock=self._clock)
+        now = self._clock()
+        self._next_save = now + self.autosave_interval
+        self._next_log = now
+
+    def tick(self, now: Optional[float] = None) -> float:
+        """
+        Runs the periodic work that is due.
+
+        Returns:
+            The time at which something is due next.
+        """
+        now = self._clock() if now is None else now
+        if now >= self._next_save:
+            self.save()
+            self.write_metrics()
+            self._next_save = now + self.autosave_interval
+        if self.history_log is not None and now >= self._next_log:
+            self.history_log.log_home(self.home, now)
+            self._next_log = now + self.log_interval
+        if self.history_log is None:
+            return self._next_save
+        return min(self._next_save, self._next_log)
+
+    def save(self) -> bool:
+        """Writes pending changes; see `DataManager.save_changes`."""
+        try:
+            return DataManager.save_changes(self.home, self.data_file)
+        except Exception as e:
+            print(f"Autosave failed: {e}")
+            return False
+
+    def write_metrics(self) -> None:
+        """Writes a metrics snapshot to `metrics_file`, if one was given."""
+        if not self.metrics_file:
+            return
+        try:
+            if self.metrics_file.endswith(".prom"):
+                METRICS.write_prometheus(self.metrics_file)
+            else:
+                METRICS.write_ndjson(self.metrics_file)
+        except OSError as e:
+            print(f"Writing metrics failed: {e}")
+
+    def run_forever(self) -> None:
+        """Calls `tick` whenever work is due until `stop` is called."""
+        while not self._stopped.is_set():
+            due = self.tick()
+            self._stopped.wait(max(0.0, due - self._clock()))
+
+    def stop(self) -> None:
+        """Makes `run_forever` return; safe to call from signal handlers and other threads."""
+        self._stopped.set()
+
+    def close(self) -> None:
+        """Stops the schedule runner, saves pending changes and closes the history log."""
+        if self.runner is not None:
+            self.runner.stop()
+        if self.home is not None:
+            self.save()
+        if self.history_log is not None:
+            self.history_log.close()
+        self.write_metrics()
+
+
+def main(argv: List[str], default_data_file: str = "home_data.json") -> int:
+    """Runs a home headless: python -m smart_home.daemon [DATA_FILE] [options]"""
+    import argparse
+
+    parser = argparse.ArgumentParser(prog="smart_home.daemon", description="Run a smart home without a GUI.")
+    parser.add_argument("data_file", nargs="?", default=default_data_file)
+    parser.add_argument("--autosave-interval", type=float, default=30.0, help="seconds between saves")
+    parser.add_argument("--log-file", help="append device states to this history log")
+    parser.add_argument("--log-interval", type=float, default=60.0, help="seconds between history snapshots")
+    parser.add_argument("--log-format", choices=FORMATS, default="ndjson")
+    parser.add_argument("--metrics-file", help="write metrics here after every save (.prom for Prometheus text)")
+    args = parser.parse_args(argv)
+
+    daemon = HomeDaemon(args.data_file, autosave_interval=args.autosave_interval, log_file=args.log_file,
+                        log_interval=args.log_interval, log_format=args.log_format, metrics_file=args.metrics_file)
+    daemon.start()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(signum, lambda *_: daemon.stop())
+    print(f"Running '{daemon.home.name}' headless. Press Ctrl+C to stop.")
+    try:
+        daemon.run_forever()
+    finally:
+        daemon.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
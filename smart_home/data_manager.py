@@ -1,15 +1,23 @@
 import json
 import os
 import itertools
-from typing import Optional
+import sqlite3
+from typing import Optional, Tuple
 
 from .smart_bulb import SmartBulb
 from .air_conditioner import AirConditioner
 from .home import Home
+from .journal import HomeJournal
+from . import binary_snapshot
+from .binary_snapshot import BinarySnapshotError
+from .sqlite_store import SQLiteStore
+from .metrics import METRICS
 
 
 class DataManager:
-    """Utility class to save and load the home state from a JSON file."""
+    """Utility class to save and load the home state from JSON, binary snapshot or SQLite files."""
+    BINARY_EXTENSIONS = (".shb",)
+    SQLITE_EXTENSIONS = (".db", ".sqlite", ".sqlite3")
 
     @staticmethod
     def _synchronize_id_counters(home: 'Home') -> None:
@@ -35,6 +43,7 @@ class DataManager:
         print(f"ID counters synchronized. Next Bulb ID: {max_bulb_id + 1}, Next AC ID: {max_ac_id + 1}.")
 
     @staticmethod
+    @METRICS.timed("data_manager_save_seconds", "Seconds spent saving a home", format="json")
     def save_home_to_json(home_object: 'Home', filename: str) -> None:
         """Serializes the Home object to a JSON file."""
         try:
@@ -46,6 +55,7 @@ class DataManager:
             raise
 
     @staticmethod
+    @METRICS.timed("data_manager_load_seconds", "Seconds spent loading a home", format="json")
     def load_home_from_json(filename: str) -> Optional['Home']:
         """Deserializes a Home object from a JSON file."""
         if not os.path.exists(filename):
@@ -62,7 +72,208 @@ class DataManager:
             
             print(f"Home state successfully loaded from {filename}")
             return home
-        except (IOError, json.JSONDecodeError, KeyError, TypeError) as e:
+        except (IOError, ValueError, KeyError, TypeError) as e:
             print(f"Error loading home state from '{filename}': {e}")
             print("Starting with a new, empty home due to loading error.")
             return Home("Recovery Home")
+
+    @staticmethod
+    def is_binary_file(filename: str) -> bool:
+        """Whether the file extension selects the binary snapshot format."""
+        return os.path.splitext(filename)[1].lower() in DataManager.BINARY_EXTENSIONS
+
+    @staticmethod
+    @METRICS.timed("data_manager_save_seconds", "Seconds spent saving a home", format="binary")
+    def save_home_to_binary(home_object: 'Home', filename: str) -> None:
+        """Serializes the Home object to a binary snapshot file."""
+        try:
+            binary_snapshot.save_home(home_object, filename)
+            print(f"Home state successfully saved to {filename}")
+        except (IOError, BinarySnapshotError) as e:
+            print(f"Error saving home state: {e}")
+            raise
+
+    @staticmethod
+    @METRICS.timed("data_manager_load_seconds", "Seconds spent loading a home", format="binary")
+    def load_home_from_binary(filename: str) -> Optional['Home']:
+        """Deserializes a Home object from a memory-mapped binary snapshot file."""
+        if not os.path.exists(filename):
+            print("No data file found.")
+            return None
+
+        try:
+            home = binary_snapshot.load_home(filename)
+
+            DataManager._synchronize_id_counters(home)
+
+            print(f"Home state successfully loaded from {filename}")
+            return home
+        except (IOError, ValueError) as e:
+            print(f"Error loading home state from '{filename}': {e}")
+            print("Starting with a new, empty home due to loading error.")
+            return Home("Recovery Home")
+
+    @staticmethod
+    def is_sqlite_file(filename: str) -> bool:
+        """Whether the file extension selects the SQLite backend."""
+        return os.path.splitext(filename)[1].lower() in DataManager.SQLITE_EXTENSIONS
+
+    @staticmethod
+    @METRICS.timed("data_manager_save_seconds", "Seconds spent saving a home", format="sqlite")
+    def save_home_to_sqlite(home_object: 'Home', filename: str) -> None:
+        """Writes a full copy of the Home object to an SQLite database."""
+        try:
+            store = SQLiteStore(filename)
+            try:
+                store.save_home(home_object)
+            finally:
+                store.close()
+            print(f"Home state successfully saved to {filename}")
+        except sqlite3.Error as e:
+            print(f"Error saving home state: {e}")
+            raise
+
+    @staticmethod
+    @METRICS.timed("data_manager_load_seconds", "Seconds spent loading a home", format="sqlite")
+    def load_home_from_sqlite(filename: str) -> Optional['Home']:
+        """Loads a Home object from an SQLite database."""
+        if not os.path.exists(filename):
+            print("No data file found.")
+            return None
+
+        try:
+            store = SQLiteStore(filename)
+            try:
+                home = store.load_home()
+            finally:
+                store.close()
+            if home is None:
+                print("No home stored in the database.")
+                return None
+
+            DataManager._synchronize_id_counters(home)
+
+            print(f"Home state successfully loaded from {filename}")
+            return home
+        except (sqlite3.Error, ValueError, KeyError, TypeError) as e:
+            print(f"Error loading home state from '{filename}': {e}")
+            print("Starting with a new, empty home due to loading error.")
+            return Home("Recovery Home")
+
+    @staticmethod
+    def open_sqlite_home(filename: str, default_name: str = "My Home") -> Tuple['Home', SQLiteStore]:
+        """
+        Loads a home from an SQLite database and keeps it in sync row by row.
+
+        Every later device, room or schedule change is written to the
+        affected rows only, so no explicit save is needed.
+        """
+        store = SQLiteStore(filename)
+        home = store.load_home()
+        if home is None:
+            home = Home(default_name)
+            store.save_home(home)
+        home.mark_clean()
+        DataManager._synchronize_id_counters(home)
+        store.attach(home)
+        return home, store
+
+    @staticmethod
+    def save_home(home_object: 'Home', filename: str) -> None:
+        """Saves the home in the format selected by the file extension."""
+        if DataManager.is_binary_file(filename):
+            DataManager.save_home_to_binary(home_object, filename)
+        elif DataManager.is_sqlite_file(filename):
+            DataManager.save_home_to_sqlite(home_object, filename)
+        else:
+            DataManager.save_home_to_json(home_object, filename)
+
+    @staticmethod
+    def load_home(filename: str) -> Optional['Home']:
+        """Loads a home in the format selected by the file extension."""
+        if DataManager.is_binary_file(filename):
+            return DataManager.load_home_from_binary(filename)
+        if DataManager.is_sqlite_file(filename):
+            return DataManager.load_home_from_sqlite(filename)
+        return DataManager.load_home_from_json(filename)
+
+    @staticmethod
+    @METRICS.timed("data_manager_save_changes_seconds", "Seconds spent saving the changes of a home")
+    def save_changes(home_object: 'Home', filename: str) -> bool:
+        """
+        Saves only what changed since the last save.
+
+        Nothing is written if the home is clean. An existing SQLite database
+        gets one row update per changed device; other formats, and structural
+        changes, fall back to a full save.
+
+        Returns:
+            True if anything was written.
+        """
+        if not home_object.is_dirty:
+            return False
+        devices, structure_changed = home_object.take_changes()
+        try:
+            if DataManager.is_sqlite_file(filename) and os.path.exists(filename) and not structure_changed:
+                store = SQLiteStore(filename)
+                try:
+                    store.update_device_states(devices)
+                finally:
+                    store.close()
+            else:
+                DataManager.save_home(home_object, filename)
+        except Exception:
+            home_object.mark_dirty()
+            raise
+        return True
+
+    @staticmethod
+    def convert(source: str, destination: str) -> None:
+        """Converts a saved home between formats, e.g. home_data.json -> home_data.shb."""
+        if not os.path.exists(source):
+            raise FileNotFoundError(f"No data file found at '{source}'.")
+        if DataManager.is_binary_file(source):
+            home = binary_snapshot.load_home(source)
+        elif DataManager.is_sqlite_file(source):
+            store = SQLiteStore(source)
+            try:
+                home = store.load_home()
+            finally:
+                store.close()
+            if home is None:
+                raise ValueError(f"No home stored in '{source}'.")
+        else:
+            with open(source, 'r') as f:
+                home = Home.from_dict(json.load(f))
+        DataManager.save_home(home, destination)
+
+    @staticmethod
+    def open_journaled_home(filename: str, default_name: str = "My Home") -> Tuple['Home', HomeJournal]:
+        """
+        Loads a home in journaled mode and keeps journaling its mutations.
+
+        The JSON snapshot in `filename` (if any) is loaded first, then the
+        mutations recorded in `<filename>.journal` are replayed on top of it.
+        Afterwards every change is appended to the journal, so no explicit
+        save is needed; call `HomeJournal.compact` (or let it run in the
+        background) to fold the journal into a new snapshot.
+        """
+        journal_seq = 0
+        if os.path.exists(filename):
+            with open(filename, 'r') as f:
+                data = json.load(f)
+            journal_seq = data.get("journal_seq", 0)
+            home = Home.from_dict(data)
+        else:
+            home = Home(default_name)
+
+        applied, last_seq = HomeJournal.replay(home, filename, journal_seq)
+        home.mark_clean()
+        DataManager._synchronize_id_counters(home)
+        print(f"Home state loaded from {filename} ({applied} journal records replayed).")
+
+        journal = HomeJournal(filename)
+        journal.attach(home, last_seq)
+        if not os.path.exists(filename):
+            journal.compact()
+        return home, journal
@@ -1,16 +1,61 @@
 from abc import ABC, abstractmethod
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Optional, Callable, Tuple
+from .device_store import DeviceStore, DEFAULT_STORE
 
 class Device(ABC):
-    """Abstract base class for all smart devices."""
+    """
+    Abstract base class for all smart devices.
+
+    Status, intensity and intensity bounds live in a shared DeviceStore; a
+    device only keeps its slot in that store.
+    """
+    # Slots instead of a per-instance __dict__ keep large homes small in memory.
+    __slots__ = ('_id', '_slot', '_observers', '_generation')
+    store: DeviceStore = DEFAULT_STORE
 
     def __init__(self, device_id: str, min_intensity: int, max_intensity: int):
         """Initializes a generic device."""
         self._id: str = device_id
-        self._status: bool = False
-        self._min_intensity: int = min_intensity
-        self._max_intensity: int = max_intensity
-        self._intensity: int = min_intensity
+        self._slot: int = self.store.allocate(min_intensity, max_intensity)
+        # A tuple is shared while empty and rebuilt on the rare (un)subscription.
+        self._observers: Tuple[Callable[['Device', str], None], ...] = ()
+        self._generation: int = 0
+
+    def __del__(self):
+        try:
+            self.store.release(self._slot)
+        except AttributeError:
+            # __init__ failed before a slot was allocated.
+            pass
+
+    @property
+    def _status(self) -> bool:
+        return bool(self.store.status[self._slot])
+
+    @_status.setter
+    def _status(self, value: bool) -> None:
+        self.store.status[self._slot] = 1 if value else 0
+
+    @property
+    def _intensity(self) -> int:
+        return self.store.intensity[self._slot]
+
+    @_intensity.setter
+    def _intensity(self, value: int) -> None:
+        self.store.intensity[self._slot] = value
+
+    @property
+    def _min_intensity(self) -> int:
+        return self.store.min_intensity[self._slot]
+
+    @property
+    def _max_intensity(self) -> int:
+        return self.store.max_intensity[self._slot]
+
+    @property
+    def slot(self) -> int:
+        """The index of this device's state in its DeviceStore."""
+        return self._slot
 
     @property
     def id(self) -> str:
@@ -27,28 +72,64 @@ class Device(ABC):
         """The current intensity of the device."""
         return self._intensity
         
+    @property
+    def generation(self) -> int:
+        """A counter bumped every time the device's state changes."""
+        return self._generation
+
     @property
     def is_programmable(self) -> bool:
         """Whether the device supports scheduling. Defaults to False."""
         return False
 
+    def add_observer(self, callback: Callable[['Device', str], None]) -> None:
+        """
+        Registers a callback for state changes.
+
+        The callback receives the device and the name of the changed field
+        ('status', 'intensity' or 'color').
+        """
+        self._observers = self._observers + (callback,)
+
+    def remove_observer(self, callback: Callable[['Device', str], None]) -> None:
+        """Unregisters a previously added observer."""
+        observers = list(self._observers)
+        observers.remove(callback)
+        self._observers = tuple(observers)
+
+    def _notify(self, field: str) -> None:
+        """Bumps the generation and notifies all observers that `field` changed."""
+        self._generation += 1
+        for callback in self._observers:
+            callback(self, field)
+
+    def _update_intensity(self, value: int) -> None:
+        """Stores a new intensity and notifies observers if it changed."""
+        if value != self._intensity:
+            self._intensity = value
+            self._notify('intensity')
+
     def turn_on(self) -> None:
         """Turns the device on."""
-        self._status = True
+        if not self._status:
+            self._status = True
+            self._notify('status')
 
     def turn_off(self) -> None:
         """Turns the device off and resets intensity."""
-        self._status = False
-        self._intensity = self._min_intensity
+        if self._status:
+            self._status = False
+            self._notify('status')
+        self._update_intensity(self._min_intensity)
 
     def set_intensity(self, value: int) -> None:
         """Sets the device's intensity to a specific value."""
         if self._min_intensity <= value <= self._max_intensity:
-            self._intensity = value
+            self._update_intensity(value)
         elif value < self._min_intensity:
-            self._intensity = self._min_intensity
+            self._update_intensity(self._min_intensity)
         else:
-            self._intensity = self._max_intensity
+            self._update_intensity(self._max_intensity)
 
     @abstractmethod
     def increase_intensity(self, amount: Optional[int] = None) -> None:
@@ -0,0 +1,253 @@
+import threading
+import time
+from array import array
+from bisect import bisect_left, bisect_right
+from collections.abc import Sequence
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple
+
+# Fields recorded per device; an air conditioner's temperature is its intensity.
+FIELDS = ('status', 'intensity')
+FIELD_ALIASES = {'temperature': 'intensity'}
+
+# (bucket width in seconds, number of buckets) of each downsampled tier
+DEFAULT_TIERS = ((60, 240), (3600, 168))
+
+# (time, min, max, sum, count)
+_Bucket = Tuple[float, int, int, float, int]
+
+
+class HistoryPoint(NamedTuple):
+    """One raw sample (count 1) or an aggregate over a time bucket."""
+    timestamp: float
+    min: int
+    max: int
+    mean: float
+    count: int
+
+
+def _point(timestamp: float, low: int, high: int, total: float, count: int) -> HistoryPoint:
+    return HistoryPoint(timestamp, low, high, total / count, count)
+
+
+class _TimesView(Sequence):
+    """The start times of a ring in chronological order, for bisect."""
+    __slots__ = ('_ring',)
+
+    def __init__(self, ring: '_Ring'):
+        self._ring = ring
+
+    def __len__(self) -> int:
+        return len(self._ring.times)
+
+    def __getitem__(self, index: int) -> float:
+        ring = self._ring
+        return ring.times[(ring.head + index) % len(ring.times)]
+
+
+class _Ring:
+    """
+    Fixed-capacity ring of (time, min, max, sum, count) buckets in typed arrays.
+
+    With `width` 0 every sample is its own bucket; otherwise samples falling
+    into the same `width`-second interval are merged.
+    """
+    __slots__ = ('capacity', 'width', 'times', 'mins', 'maxs', 'sums', 'counts', 'head')
+
+    def __init__(self, capacity: int, width: int = 0):
+        self.capacity = capacity
+        self.width = width
+        # The arrays grow up to `capacity` and are overwritten in place from then on.
+        self.times = array('d')
+        self.mins = array('i')
+        self.maxs = array('i')
+        self.sums = array('d')
+        self.counts = array('I')
+        self.head = 0
+
+    def push(self, timestamp: float, low: int, high: int, total: float, count: int) -> Optional[_Bucket]:
+        """
+        Adds a sample or bucket.
+
+        Returns:
+            The oldest bucket if it had to make room, otherwise None.
+        """
+        times = self.times
+        size = len(times)
+        start = timestamp - timestamp % self.width if self.width else timestamp
+        if self.width and size:
+            last = (self.head + size - 1) % size
+            # Input arrives oldest first, so it can only extend the newest bucket.
+            if start <= times[last]:
+                if low < self.mins[last]:
+                    self.mins[last] = low
+                if high > self.maxs[last]:
+                    self.maxs[last] = high
+                self.sums[last] += total
+                self.counts[last] += count
+                return None
+        if size < self.capacity:
+            times.append(start)
+            self.mins.append(low)
+            self.maxs.append(high)
+            self.sums.append(total)
+            self.counts.append(count)
+            return None
+        i = self.head
+        evicted = (times[i], self.mins[i], self.maxs[i], self.sums[i], self.counts[i])
+        times[i], self.mins[i], self.maxs[i], self.sums[i], self.counts[i] = start, low, high, total, count
+        self.head = (i + 1) % size
+        return evicted
+
+    def range(self, start: float, end: float) -> List[_Bucket]:
+        """Gets the buckets overlapping [start, end), oldest first."""
+        view = _TimesView(self)
+        low = bisect_right(view, start - self.width) if self.width else bisect_left(view, start)
+        high = bisect_left(view, end)
+        size = len(self.times)
+        result = []
+        for logical in range(low, high):
+            i = (self.head + logical) % size
+            result.append((self.times[i], self.mins[i], self.maxs[i], self.sums[i], self.counts[i]))
+        return result
+
+    def itemsize(self) -> int:
+        """Bytes used per bucket."""
+        return sum(column.itemsize for column in (self.times, self.mins, self.maxs, self.sums, self.counts))
+
+
+class _Series:
+    """The raw ring of one device field followed by its downsampled tiers."""
+    __slots__ = ('rings',)
+
+    def __init__(self, raw_capacity: int, tiers: Tuple[Tuple[int, int], ...]):
+        self.rings = [_Ring(raw_capacity)] + [_Ring(capacity, width) for width, capacity in tiers]
+
+    def add(self, timestamp: float, value: int) -> None:
+        evicted = self.rings[0].push(timestamp, value, value, value, 1)
+        for ring in self.rings[1:]:
+            if evicted is None:
+                return
+            evicted = ring.push(*evicted)
+        # Whatever falls out of the coarsest tier is gone for good.
+
+    def range(self, start: float, end: float) -> List[_Bucket]:
+        # Every tier only holds data older than the tier before it.
+        result = []
+        for ring in reversed(self.rings):
+            result.extend(ring.range(start, end))
+        return result
+
+
+class DeviceHistory:
+    """
+    In-memory time series of device status and intensity changes.
+
+    Each device field gets a ring buffer of raw samples. Samples pushed out
+    of it are merged into per-minute buckets, those into per-hour buckets,
+    and those are eventually discarded, so memory per device is bounded no
+    matter how long the process runs. Buffers are created on a device's
+    first change. Recording and querying may happen on different threads.
+    """
+
+    def __init__(self, raw_capacity: int = 256, tiers: Tuple[Tuple[int, int], ...] = DEFAULT_TIERS,
+                 clock: Callable[[], float] = time.time):
+        """
+        Initializes an empty history.
+
+        Args:
+            raw_capacity: Number of raw samples kept per device field.
+            tiers: (bucket width in seconds, bucket count) of each downsampled
+                tier, finest first.
+            clock: Returns the current time in seconds since the epoch.
+        """
+        if raw_capacity < 1 or any(width <= 0 or capacity < 1 for width, capacity in tiers):
+            raise ValueError("History capacities and bucket widths must be positive.")
+        self.raw_capacity = raw_capacity
+        self.tiers = tuple(tiers)
+        self._clock = clock
+        self._series: Dict[Tuple[str, str], _Series] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        """The number of recorded device fields."""
+        return len(self._series)
+
+    @property
+    def max_bytes_per_field(self) -> int:
+        """Upper bound of the buffer memory used by one device field."""
+        series = _Series(self.raw_capacity, self.tiers)
+        return sum(ring.capacity * ring.itemsize() for ring in series.rings)
+
+    def record(self, device_id: str, field: str, value: int, timestamp: Optional[float] = None) -> None:
+        """Appends one sample for a device field."""
+        key = (device_id, field)
+        if timestamp is None:
+            timestamp = self._clock()
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = _Series(self.raw_capacity, self.tiers)
+            series.add(timestamp, int(value))
+
+    def forget(self, device_id: str) -> None:
+        """Drops all history of a device."""
+        with self._lock:
+            for field in FIELDS:
+                self._series.pop((device_id, field), None)
+
+    def on_home_event(self, event: str, subject: Any) -> None:
+        """Home observer recording device changes; see `Home.enable_history`."""
+        if event == 'device_changed':
+            device, field = subject
+            if field in FIELDS:
+                self.record(device.id, field, getattr(device, field))
+        elif event == 'device_removed':
+            self.forget(subject.id)
+
+    def query(self, device_id: str, start: Optional[float] = None, end: Optional[float] = None,
+              resolution: Optional[float] = None, field: str = 'intensity') -> List[HistoryPoint]:
+        """
+        Gets the history of one device field in [start, end).
+
+        Args:
+            device_id: The device to look up.
+            start: Earliest time included, or None for everything recorded.
+            end: Time before which to stop, or None for up to now.
+            resolution: Bucket width in seconds to aggregate into, or None
+                for the stored samples and buckets as they are.
+            field: 'status', 'intensity' or 'temperature'.
+
+        Returns:
+            Points ordered by time. Old data is only available at the
+            resolution of the tier it has been merged into.
+        """
+        field = FIELD_ALIASES.get(field, field)
+        if field not in FIELDS:
+            raise ValueError(f"Unknown history field '{field}'.")
+        with self._lock:
+            series = self._series.get((device_id, field))
+            if series is None:
+                return []
+            buckets = series.range(float('-inf') if start is None else start,
+                                   float('inf') if end is None else end)
+        if resolution is None:
+            return [_point(*bucket) for bucket in buckets]
+        if resolution <= 0:
+            raise ValueError("Resolution must be positive.")
+
+        points: List[HistoryPoint] = []
+        current: Optional[List[Any]] = None
+        for t, low, high, total, count in buckets:
+            bucket_start = t - t % resolution
+            if current is not None and current[0] == bucket_start:
+                current[1] = min(current[1], low)
+                current[2] = max(current[2], high)
+                current[3] += total
+                current[4] += count
+            else:
+                if current is not None:
+                    points.append(_point(*current))
+                current = [bucket_start, low, high, total, count]
+        if current is not None:
+            points.append(_point(*current))
+        return points
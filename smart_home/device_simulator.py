@@ -0,0 +1,177 @@
+import asyncio
+import json
+import random
+import sys
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from .gateway import DeviceCommand
+
+
+class DeviceSimulator:
+    """
+    A local bridge that stands in for a fleet of real devices.
+
+    Speaks the gateway's line protocol over TCP, with single commands or
+    frames of several, and answers after a configurable latency. A share of
+    the commands fails with an error and a share of the requests is dropped
+    without an answer, so timeouts and retries can be load tested offline.
+    The last value of every device field is kept in `state`.
+    """
+
+    def __init__(self, latency: float = 0.005, jitter: float = 0.0, failure_rate: float = 0.0,
+                 drop_rate: float = 0.0, seed: Optional[int] = None):
+        """
+        Initializes the simulator; nothing listens until `start`.
+
+        Args:
+            latency: Seconds every request or frame takes at least.
+            jitter: Up to this many seconds are added at random.
+            failure_rate: Share of the answered commands that fail.
+            drop_rate: Share of requests and frames never answered.
+            seed: Makes failures, drops and jitter repeatable.
+        """
+        if not (0 <= failure_rate <= 1 and 0 <= drop_rate <= 1):
+            raise ValueError("Failure and drop rates must be between 0 and 1.")
+        self.latency = latency
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        self.drop_rate = drop_rate
+        self._random = random.Random(seed)
+        self.state: Dict[str, Dict[str, Any]] = {}
+        self.connections = 0
+        self.frames = 0
+        self.requests = 0  # Commands received, in frames or on their own
+        self.applied = 0
+        self.failed = 0
+        self.dropped = 0
+        self.malformed = 0  # Requests that could not be decoded
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._tasks: Set[asyncio.Task] = set()
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> Tuple[str, int]:
+        """Starts listening; port 0 picks a free port. Returns the address."""
+        self._server = await asyncio.start_server(self._handle, host, port)
+        return self._server.sockets[0].getsockname()[:2]
+
+    async def close(self) -> None:
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+        for task in list(self._tasks):
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self.connections += 1
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    request_id, frame, commands = self._parse(line)
+                except ValueError as e:
+                    self.malformed += 1
+                    writer.write(json.dumps({"id": None, "ok": False, "error": f"Malformed request: {e}"},
+                                            separators=(',', ':')).encode() + b"\n")
+                    continue
+                # Requests on one connection are answered as soon as each is done.
+                task = asyncio.create_task(self._answer(request_id, frame, commands, writer))
+                self._tasks.add(task)
+                task.add_done_callback(self._tasks.discard)
+        except (ConnectionError, ValueError):
+            # Lost, or a line longer than the stream limit; either way the connection is done.
+            pass
+        finally:
+            writer.close()
+
+    @staticmethod
+    def _parse(line: bytes) -> Tuple[Any, bool, List[DeviceCommand]]:
+        """Decodes a request into its id, whether it is a frame, and its commands."""
+        request = json.loads(line)
+        if not isinstance(request, dict) or "id" not in request:
+            raise ValueError("expected an object with an id")
+        frame = request.get("commands")
+        if frame is not None and not isinstance(frame, list):
+            raise ValueError("'commands' must be a list")
+        try:
+            commands = [DeviceCommand.from_dict(command) for command in (frame if frame is not None else [request])]
+        except (KeyError, TypeError) as e:
+            raise ValueError(f"invalid command ({e!r})")
+        return request["id"], frame is not None, commands
+
+    def _delay(self) -> float:
+        return self.latency + self._random.uniform(0, self.jitter) if self.jitter else self.latency
+
+    async def _answer(self, request_id: Any, frame: bool, commands: List[DeviceCommand],
+                      writer: asyncio.StreamWriter) -> None:
+        # A frame packs several commands; the whole frame is delayed or lost together.
+        self.frames += 1
+        self.requests += len(commands)
+        lost = self._random.random() < self.drop_rate
+        await asyncio.sleep(self._delay())
+        if lost:
+            self.dropped += len(commands)
+            return
+        results = [self._apply(command) for command in commands]
+        if frame:
+            response = {"id": request_id, "results": results}
+        else:
+            response = {"id": request_id, **results[0]}
+        if not writer.is_closing():
+            writer.write(json.dumps(response, separators=(',', ':')).encode() + b"\n")
+
+    def _apply(self, command: DeviceCommand) -> Dict[str, Any]:
+        if self._random.random() < self.failure_rate:
+            self.failed += 1
+            return {"ok": False, "error": "Simulated device failure."}
+        self.state.setdefault(command.device_id, {})[command.field] = command.value
+        self.applied += 1
+        return {"ok": True}
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "connections": self.connections,
+            "frames": self.frames,
+            "requests": self.requests,
+            "applied": self.applied,
+            "failed": self.failed,
+            "dropped": self.dropped,
+            "malformed": self.malformed,
+            "devices": len(self.state),
+        }
+
+
+def main(argv: List[str]) -> int:
+    """Runs a simulator: python -m smart_home.device_simulator [options]"""
+    import argparse
+
+    parser = argparse.ArgumentParser(prog="smart_home.device_simulator", description="Simulate a device bridge.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.005, help="seconds per request or frame")
+    parser.add_argument("--jitter", type=float, default=0.0, help="random extra seconds per request or frame")
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    parser.add_argument("--drop-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int)
+    args = parser.parse_args(argv)
+
+    async def serve() -> None:
+        simulator = DeviceSimulator(args.latency, args.jitter, args.failure_rate, args.drop_rate, args.seed)
+        host, port = await simulator.start(args.host, args.port)
+        print(f"Simulating devices on {host}:{port}. Press Ctrl+C to stop.")
+        try:
+            await asyncio.Event().wait()
+        finally:
+            await simulator.close()
+            print(simulator.stats())
+
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
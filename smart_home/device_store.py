@@ -0,0 +1,128 @@
+import threading
+from array import array
+from collections import deque
+from typing import Deque, List, Optional, Sequence
+
+try:
+    import numpy as np
+except ImportError:  # NumPy is optional; the array module is always available.
+    np = None
+
+# Below this many slots the NumPy round trip costs more than it saves.
+_NUMPY_THRESHOLD = 4096
+
+
+class DeviceStore:
+    """
+    Struct-of-arrays storage for the state of every device.
+
+    Each device owns one slot, i.e. one index into contiguous typed arrays
+    holding its status, intensity, intensity bounds and packed color.
+    Device objects only keep their slot, so operations over many devices
+    work on the columns directly instead of calling methods per object.
+    Slots of garbage-collected devices are reused.
+    """
+
+    def __init__(self):
+        self.status = array('b')
+        self.intensity = array('i')
+        self.min_intensity = array('i')
+        self.max_intensity = array('i')
+        self.color = array('I')
+        # Freed slots; a deque because release() appends without the lock.
+        self._free: Deque[int] = deque()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        """The number of slots currently in use."""
+        return len(self.status) - len(self._free)
+
+    @property
+    def capacity(self) -> int:
+        """The number of slots allocated so far, used or free."""
+        return len(self.status)
+
+    def allocate(self, min_intensity: int, max_intensity: int, color: int = 0) -> int:
+        """Reserves a slot for a new device that starts off at its minimum intensity."""
+        with self._lock:
+            try:
+                slot = self._free.pop()
+            except IndexError:
+                slot = None
+            if slot is not None:
+                self.status[slot] = 0
+                self.intensity[slot] = min_intensity
+                self.min_intensity[slot] = min_intensity
+                self.max_intensity[slot] = max_intensity
+                self.color[slot] = color
+                return slot
+            self.status.append(0)
+            self.intensity.append(min_intensity)
+            self.min_intensity.append(min_intensity)
+            self.max_intensity.append(max_intensity)
+            self.color.append(color)
+            return len(self.status) - 1
+
+    def release(self, slot: int) -> None:
+        """
+        Returns a slot to the free list.
+
+        Called from Device.__del__, which the garbage collector may run on a
+        thread already holding the lock, so the lock is not taken here.
+        """
+        self._free.append(slot)
+
+    def count_on(self, slots: Sequence[int]) -> int:
+        """Counts how many of the given slots are switched on."""
+        if np is not None and len(slots) >= _NUMPY_THRESHOLD:
+            # The lock keeps allocate() from resizing the array while NumPy views it.
+            with self._lock:
+                return int(np.count_nonzero(np.frombuffer(self.status, dtype=np.int8)[self._index(slots)]))
+        status = self.status
+        return sum([status[slot] for slot in slots])
+
+    def sum_intensity(self, slots: Sequence[int]) -> int:
+        """Sums the intensity of the given slots."""
+        if np is not None and len(slots) >= _NUMPY_THRESHOLD:
+            with self._lock:
+                return int(np.frombuffer(self.intensity, dtype=np.int32)[self._index(slots)].sum(dtype=np.int64))
+        intensity = self.intensity
+        return sum([intensity[slot] for slot in slots])
+
+    def mean_intensity(self, slots: Sequence[int]) -> Optional[float]:
+        """Returns the average intensity of the given slots, or None if there are none."""
+        if not len(slots):
+            return None
+        return self.sum_intensity(slots) / len(slots)
+
+    def clamp_intensity(self, slots: Sequence[int], upper: Optional[int] = None) -> List[int]:
+        """
+        Caps the intensity of the given slots.
+
+        Each intensity is limited to `upper` (but never below the slot's own
+        minimum), or to the slot's own maximum if `upper` is None.
+
+        Returns:
+            The slots whose intensity changed.
+        """
+        intensity, low, high = self.intensity, self.min_intensity, self.max_intensity
+        changed = []
+        for slot in slots:
+            cap = high[slot] if upper is None else min(high[slot], max(low[slot], upper))
+            if intensity[slot] > cap:
+                intensity[slot] = cap
+                changed.append(slot)
+        return changed
+
+    def gather(self, column: array, slots: Sequence[int]) -> array:
+        """Copies the values of `column` at the given slots into a new array."""
+        return array(column.typecode, [column[slot] for slot in slots])
+
+    @staticmethod
+    def _index(slots: Sequence[int]):
+        if isinstance(slots, array) and slots.typecode == 'i':
+            return np.frombuffer(slots, dtype=np.int32)
+        return np.fromiter(slots, dtype=np.int64, count=len(slots))
+
+
+DEFAULT_STORE = DeviceStore()
@@ -0,0 +1,179 @@
+import threading
+from typing import Any, Callable, Dict, FrozenSet, Iterable, List, NamedTuple, Optional, Tuple
+
+ROOM_ADDED = 'room_added'
+DEVICE_ADDED = 'device_added'
+DEVICE_REMOVED = 'device_removed'
+DEVICE_CHANGED = 'device_changed'
+SCHEDULER_ADDED = 'scheduler_added'
+SCHEDULER_REMOVED = 'scheduler_removed'
+SCHEDULE_CHANGED = 'schedule_changed'
+EVENT_KINDS = (ROOM_ADDED, DEVICE_ADDED, DEVICE_REMOVED, DEVICE_CHANGED,
+               SCHEDULER_ADDED, SCHEDULER_REMOVED, SCHEDULE_CHANGED)
+
+
+class ChangeEvent(NamedTuple):
+    """A change in a home, as delivered by the EventBus."""
+    kind: str  # One of EVENT_KINDS
+    device_id: Optional[str]  # None for room events
+    room: Optional[str]  # Name of the room involved
+    field: Optional[str]  # 'status', 'intensity' or 'color' for DEVICE_CHANGED
+    subject: Any  # The Room, Device or Scheduler that changed
+
+    @property
+    def key(self) -> Tuple[str, Optional[str], Optional[str], Optional[str]]:
+        """Events with equal keys supersede each other when coalesced."""
+        return self.kind, self.device_id, self.room, self.field
+
+
+class Subscription:
+    """A registered subscriber and its filter."""
+
+    def __init__(self, bus: 'EventBus', callback: Callable, kinds: Optional[FrozenSet[str]],
+                 device_id: Optional[str], room: Optional[str], coalesce: bool):
+        self.bus = bus
+        self.callback = callback
+        self.kinds = kinds
+        self.device_id = device_id
+        self.room = room
+        self.coalesce = coalesce
+        self._pending: Dict[tuple, ChangeEvent] = {}
+        # Events may be published from the schedule runner's thread while another thread flushes.
+        self._lock = threading.Lock()
+
+    def matches(self, event: ChangeEvent) -> bool:
+        """Whether the event passes this subscription's filter."""
+        return ((self.kinds is None or event.kind in self.kinds)
+                and (self.device_id is None or event.device_id == self.device_id)
+                and (self.room is None or event.room == self.room))
+
+    def unsubscribe(self) -> None:
+        """Stops delivery to this subscriber."""
+        self.bus.unsubscribe(self)
+
+
+class EventBus:
+    """
+    Publish/subscribe view of every change in a Home.
+
+    Subscribers can filter by event kind, device and room. A coalescing
+    subscriber receives a list of events on `flush`, where repeated changes
+    of the same device field are reduced to the latest one; the bus flushes
+    itself at the end of every `Home.apply` batch.
+
+    The bus only registers with the home while it has subscribers, so a
+    home nobody listens to pays nothing for it.
+    """
+
+    def __init__(self, home: Any):
+        """Creates the bus of a home; use `Home.events` instead of calling this."""
+        self._home = home
+        self._all: List[Subscription] = []
+        self._by_device: Dict[str, List[Subscription]] = {}
+        self._by_room: Dict[str, List[Subscription]] = {}
+        self._coalescing: List[Subscription] = []
+        self._count = 0
+
+    def __len__(self) -> int:
+        """The number of subscribers."""
+        return self._count
+
+    def subscribe(self, callback: Callable, kinds: Optional[Iterable[str]] = None,
+                  device_id: Optional[str] = None, room: Optional[str] = None,
+                  coalesce: bool = False) -> Subscription:
+        """
+        Registers a subscriber.
+
+        Args:
+            callback: Called with each ChangeEvent, or with a list of them
+                if `coalesce` is set.
+            kinds: Event kinds to receive, or None for all.
+            device_id: Only receive events of this device.
+            room: Only receive events of devices in (or of) this room.
+            coalesce: Queue events until `flush`, keeping only the latest per key.
+        """
+        kinds = frozenset(kinds) if kinds is not None else None
+        if kinds is not None and not kinds <= set(EVENT_KINDS):
+            raise ValueError(f"Unknown event kinds: {', '.join(sorted(kinds - set(EVENT_KINDS)))}.")
+        subscription = Subscription(self, callback, kinds, device_id, room, coalesce)
+        self._bucket(subscription).append(subscription)
+        if coalesce:
+            self._coalescing.append(subscription)
+        if self._count == 0:
+            self._home.add_observer(self._on_home_event)
+        self._count += 1
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        """Removes a subscriber; unknown subscriptions are ignored."""
+        bucket = self._bucket(subscription)
+        if subscription not in bucket:
+            return
+        bucket.remove(subscription)
+        if subscription.coalesce:
+            self._coalescing.remove(subscription)
+        self._count -= 1
+        if self._count == 0:
+            self._home.remove_observer(self._on_home_event)
+
+    def _bucket(self, subscription: Subscription) -> List[Subscription]:
+        # Device and room subscribers are only looked at for their own events.
+        if subscription.device_id is not None:
+            return self._by_device.setdefault(subscription.device_id, [])
+        if subscription.room is not None:
+            return self._by_room.setdefault(subscription.room, [])
+        return self._all
+
+    def publish(self, event: ChangeEvent) -> None:
+        """Delivers an event to every matching subscriber."""
+        candidates = self._all
+        if event.device_id is not None and event.device_id in self._by_device:
+            candidates = candidates + self._by_device[event.device_id]
+        if event.room is not None and event.room in self._by_room:
+            candidates = candidates + self._by_room[event.room]
+        for subscription in candidates:
+            if subscription.matches(event):
+                if subscription.coalesce:
+                    with subscription._lock:
+                        # Re-inserted so the queue stays in the order of the latest events.
+                        subscription._pending.pop(event.key, None)
+                        subscription._pending[event.key] = event
+                else:
+                    subscription.callback(event)
+
+    def flush(self) -> int:
+        """
+        Delivers the queued events of coalescing subscribers.
+
+        Returns:
+            The number of events delivered.
+        """
+        delivered = 0
+        for subscription in list(self._coalescing):
+            with subscription._lock:
+                pending, subscription._pending = subscription._pending, {}
+            if pending:
+                delivered += len(pending)
+                subscription.callback(list(pending.values()))
+        return delivered
+
+    def _on_home_event(self, event: str, subject: Any) -> None:
+        """Translates a home observer call into a ChangeEvent."""
+        if event == 'batch_finished':
+            self.flush()
+            return
+        if event == 'batch_started':
+            return
+        field = None
+        if event == DEVICE_CHANGED:
+            subject, field = subject
+            device_id = subject.id
+        elif event == ROOM_ADDED:
+            self.publish(ChangeEvent(event, None, subject.name, None, subject))
+            return
+        elif event in (SCHEDULER_ADDED, SCHEDULER_REMOVED, SCHEDULE_CHANGED):
+            device_id = subject.device.id
+        else:
+            device_id = subject.id
+        room = self._home.get_room_of_device(device_id)
+        self.publish(ChangeEvent(event, device_id, room.name if room is not None else None, field, subject))
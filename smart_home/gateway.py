@@ -0,0 +1,271 @@
+import asyncio
+import json
+from collections import deque
+from typing import Any, Deque, Dict, NamedTuple, Optional
+
+from .device import Device
+from .event_bus import DEVICE_CHANGED, ChangeEvent
+from .metrics import METRICS
+
+# Writes of these fields only matter for their latest value.
+COALESCED_FIELDS = ('intensity', 'color')
+
+
+class GatewayError(Exception):
+    """A command could not be delivered to its device."""
+
+
+class CommandRejectedError(GatewayError):
+    """The device, or the bridge in front of it, answered a command with an error."""
+
+
+class DeviceCommand(NamedTuple):
+    """Sets one field of a real device."""
+    device_id: str
+    field: str  # 'status', 'intensity' or 'color'
+    value: Any
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"device": self.device_id, "field": self.field, "value": self.value}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'DeviceCommand':
+        return cls(data["device"], data["field"], data["value"])
+
+    @classmethod
+    def for_device(cls, device: Device, field: str) -> 'DeviceCommand':
+        """The command that gives the real device the current value of `field` of `device`."""
+        if field == 'status':
+            return cls(device.id, field, device.status)
+        if field == 'intensity':
+            return cls(device.id, field, device.intensity)
+        if field == 'color':
+            return cls(device.id, field, dict(device.color))
+        raise ValueError(f"Unknown device field '{field}'.")
+
+
+def encode_request(request_id: int, command: DeviceCommand) -> bytes:
+    """One line of the bridge protocol: a JSON object per line, answered with the same id."""
+    return json.dumps({"id": request_id, **command.to_dict()}, separators=(',', ':')).encode() + b"\n"
+
+
+def check_response(line: bytes) -> Dict[str, Any]:
+    """Decodes a response line, raising if the bridge closed or reported an error."""
+    if not line:
+        raise ConnectionError("The bridge closed the connection.")
+    try:
+        response = json.loads(line)
+    except ValueError:
+        raise GatewayError(f"Malformed response from the bridge: {line[:80]!r}")
+    if not response.get("ok"):
+        raise CommandRejectedError(response.get("error", "Command rejected."))
+    return response
+
+
+class StreamTransport:
+    """Sends every command over its own TCP connection to a bridge."""
+
+    def __init__(self, host: str, port: int):
+        self.host = host
+        self.port = port
+
+    async def send(self, command: DeviceCommand) -> None:
+        reader, writer = await asyncio.open_connection(self.host, self.port)
+        try:
+            writer.write(encode_request(1, command))
+            await writer.drain()
+            check_response(await reader.readline())
+        finally:
+            writer.close()
+
+    async def close(self) -> None:
+        pass
+
+
+class _Pending:
+    __slots__ = ('command', 'future', 'submitted')
+
+    def __init__(self, command: DeviceCommand, future: asyncio.Future, submitted: float):
+        self.command = command
+        self.future = future
+        self.submitted = submitted
+
+
+class DeviceGateway:
+    """
+    Delivers device commands to real hardware through a transport.
+
+    Commands of one device are sent one at a time in submission order, while
+    up to `max_in_flight` devices are served concurrently. A queued intensity
+    or color write is dropped when a newer write of the same field arrives
+    for the same device. Failed or timed-out sends are retried with
+    exponential backoff.
+
+    Everything except `attach`'s forwarding runs on the event loop and must
+    be called from it.
+    """
+
+    def __init__(self, transport: Any, max_in_flight: int = 64, timeout: float = 1.0,
+                 retries: int = 2, backoff: float = 0.05):
+        """
+        Initializes the gateway.
+
+        Args:
+            transport: Has `async send(command)` and `async close()`.
+            max_in_flight: Most commands being sent at the same time.
+            timeout: Seconds a single send may take.
+            retries: Additional attempts after a failed send.
+            backoff: Delay before the first retry; doubled for each further one.
+        """
+        self.transport = transport
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self._semaphore = asyncio.Semaphore(max_in_flight)
+        self._queues: Dict[str, Deque[_Pending]] = {}
+        self._workers: Dict[str, asyncio.Task] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._subscription = None
+        self.submitted = 0
+        self.delivered = 0
+        self.coalesced = 0  # Writes dropped in favour of a newer one
+        self.retried = 0
+        self.failed = 0
+        self._latency_total = 0.0
+        self._latency_max = 0.0
+
+    def submit(self, command: DeviceCommand) -> asyncio.Future:
+        """
+        Queues a command for its device.
+
+        Returns:
+            A future that becomes True once the command was delivered, False if
+            a newer write superseded it, or raises GatewayError if it failed.
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        queue = self._queues.setdefault(command.device_id, deque())
+        if command.field in COALESCED_FIELDS:
+            for pending in queue:
+                if pending.command.field == command.field:
+                    queue.remove(pending)
+                    self.coalesced += 1
+                    if not pending.future.done():
+                        pending.future.set_result(False)
+                    break
+        queue.append(_Pending(command, future, loop.time()))
+        self.submitted += 1
+        if command.device_id not in self._workers:
+            self._workers[command.device_id] = loop.create_task(self._drain_device(command.device_id))
+        return future
+
+    async def _drain_device(self, device_id: str) -> None:
+        queue = self._queues[device_id]
+        try:
+            while queue:
+                async with self._semaphore:
+                    # Taken only now, so it can still be coalesced while waiting for a slot.
+                    pending = queue.popleft()
+                    try:
+                        await self._deliver(pending)
+                    except asyncio.CancelledError:
+                        if not pending.future.done():
+                            pending.future.set_exception(GatewayError("The gateway was closed."))
+                        raise
+        finally:
+            del self._workers[device_id]
+            if not queue:
+                del self._queues[device_id]
+
+    async def _deliver(self, pending: _Pending) -> None:
+        error: Optional[BaseException] = None
+        for attempt in range(self.retries + 1):
+            if attempt:
+                self.retried += 1
+                if METRICS.enabled:
+                    METRICS.counter("device_command_retries_total", "Device command sends retried").inc()
+                await asyncio.sleep(self.backoff * 2 ** (attempt - 1))
+            try:
+                await asyncio.wait_for(self.transport.send(pending.command), self.timeout)
+            except (OSError, asyncio.TimeoutError, GatewayError) as e:
+                error = e
+                continue
+            latency = asyncio.get_running_loop().time() - pending.submitted
+            self._latency_total += latency
+            self._latency_max = max(self._latency_max, latency)
+            self.delivered += 1
+            if METRICS.enabled:
+                METRICS.histogram("device_command_latency_seconds",
+                                  "Seconds from submitting a device command to its delivery",
+                                  field=pending.command.field).observe(latency)
+            if not pending.future.done():
+                pending.future.set_result(True)
+            return
+        self.failed += 1
+        if METRICS.enabled:
+            METRICS.counter("device_command_failures_total", "Device commands given up after all retries",
+                            field=pending.command.field).inc()
+        if not pending.future.done():
+            command = pending.command
+            pending.future.set_exception(GatewayError(
+                f"Setting {command.field} of device '{command.device_id}' failed after "
+                f"{self.retries + 1} attempts: {error!r}"))
+
+    async def drain(self) -> None:
+        """Waits until every submitted command was delivered, superseded or failed."""
+        while self._workers:
+            await asyncio.gather(*list(self._workers.values()), return_exceptions=True)
+
+    async def close(self) -> None:
+        """Stops forwarding, cancels queued commands and closes the transport."""
+        self.detach()
+        for task in list(self._workers.values()):
+            task.cancel()
+        await asyncio.gather(*list(self._workers.values()), return_exceptions=True)
+        for queue in self._queues.values():
+            for pending in queue:
+                if not pending.future.done():
+                    pending.future.set_exception(GatewayError("The gateway was closed."))
+        self._queues.clear()
+        await self.transport.close()
+
+    def attach(self, home: Any) -> None:
+        """
+        Sends every device change of `home` to the device.
+
+        Must be called on the event loop; the home may then be changed from
+        any thread, e.g. by the ScheduleRunner.
+        """
+        self._loop = asyncio.get_running_loop()
+        self._subscription = home.events.subscribe(self._on_change, kinds=(DEVICE_CHANGED,))
+
+    def detach(self) -> None:
+        """Stops forwarding the changes of the attached home."""
+        if self._subscription is not None:
+            self._subscription.unsubscribe()
+            self._subscription = None
+
+    def _on_change(self, event: ChangeEvent) -> None:
+        # The value is read now, on the thread that changed the device.
+        command = DeviceCommand.for_device(event.subject, event.field)
+        self._loop.call_soon_threadsafe(self._submit_forwarded, command)
+
+    def _submit_forwarded(self, command: DeviceCommand) -> None:
+        self.submit(command).add_done_callback(self._report_failure)
+
+    @staticmethod
+    def _report_failure(future: asyncio.Future) -> None:
+        if not future.cancelled() and future.exception() is not None:
+            print(f"Warning: {future.exception()}")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "submitted": self.submitted,
+            "delivered": self.delivered,
+            "coalesced": self.coalesced,
+            "retried": self.retried,
+            "failed": self.failed,
+            "queued": sum(len(queue) for queue in self._queues.values()),
+            "mean_latency": self._latency_total / self.delivered if self.delivered else 0.0,
+            "max_latency": self._latency_max,
+        }
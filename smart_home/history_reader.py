@@ -0,0 +1,278 @@
+import csv
+import datetime
+import json
+import os
+import re
+import struct
+import zlib
+from array import array
+from bisect import bisect_left
+from typing import BinaryIO, Iterator, List, Optional, Tuple
+
+from .buffered_history_log import HistoryRecord
+
+INDEX_MAGIC = b"SHX1"
+INDEX_VERSION = 1
+# magic, version, format code, fingerprint of the log's first bytes, bytes covered, entry count
+INDEX_HEADER = struct.Struct("<4sHHIQQ")
+FINGERPRINT_BYTES = 256
+
+# The format is sniffed from the first bytes of the log.
+FORMAT_CODES = {"ndjson": 0, "csv": 1, "text": 2}
+TEXT_HEADER = b"--- Log for Room: "
+TEXT_TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+_TEXT_DEVICE = re.compile(r"^  - Device: (?P<name>.*) \((?P<id>[^()]*)\) \| Type: ")
+
+
+class HistoryLogReader:
+    """
+    Reads a time range out of a history log without scanning the whole file.
+
+    Works on NDJSON and CSV logs written by BufferedHistoryLog and on the text
+    logs of `Room.save_log`. A sparse index of (timestamp, byte offset) pairs,
+    one about every `index_interval` bytes, is kept next to the log in
+    `<log>.idx`. It is extended, not rebuilt, when the log grows, and rebuilt
+    when the log was rotated or replaced. Records are expected in time order,
+    which is how both writers append them.
+    """
+
+    def __init__(self, filename: str, index_interval: int = 64 * 1024):
+        """
+        Opens a log for reading.
+
+        Args:
+            filename: The history log.
+            index_interval: Approximate number of bytes between two index entries.
+        """
+        self.filename = filename
+        self.index_file = filename + ".idx"
+        self.index_interval = index_interval
+        self.format: Optional[str] = None
+        self._fingerprint = 0
+        self._covered = 0
+        self._times = array('d')
+        self._offsets = array('q')
+        self._load_index()
+
+    def __len__(self) -> int:
+        """The number of index entries."""
+        return len(self._times)
+
+    def refresh(self) -> None:
+        """Brings the index up to date with the log, extending or rebuilding it."""
+        with open(self.filename, 'rb') as f:
+            head = f.read(FINGERPRINT_BYTES)
+            size = f.seek(0, os.SEEK_END)
+            # A log that was rotated or rewritten no longer starts with the indexed bytes.
+            if size < self._covered or zlib.crc32(head[:min(self._covered, FINGERPRINT_BYTES)]) != self._fingerprint:
+                self._reset()
+            if self.format is None:
+                self.format = _sniff(head)
+            if self.format is None:
+                return
+            if size > self._covered:
+                self._extend(f, size)
+                self._fingerprint = zlib.crc32(head[:min(self._covered, FINGERPRINT_BYTES)])
+                self._save_index()
+
+    def read(self, start: Optional[float] = None, end: Optional[float] = None) -> Iterator[HistoryRecord]:
+        """
+        Yields the records with start <= timestamp < end.
+
+        The file is opened at the last index entry before `start`, so only a
+        small part of it is read besides the matching records.
+        """
+        self.refresh()
+        if self.format is None:
+            return
+        offset = 0
+        if start is not None:
+            entry = bisect_left(self._times, start) - 1
+            if entry >= 0:
+                offset = self._offsets[entry]
+        with open(self.filename, 'rb') as f:
+            f.seek(offset)
+            for timestamp, data in self._records(f):
+                if start is not None and timestamp < start:
+                    continue
+                if end is not None and timestamp >= end:
+                    return
+                yield from self._decode(timestamp, data)
+
+    def _records(self, f: BinaryIO) -> Iterator[Tuple[float, bytes]]:
+        """Yields (timestamp, raw bytes) of every record from the current position."""
+        if self.format == "text":
+            block: List[bytes] = []
+            block_time = 0.0
+            for line in f:
+                if line.startswith(TEXT_HEADER):
+                    if block:
+                        yield block_time, b"".join(block)
+                    block, block_time = [line], _text_timestamp(line)
+                elif block:
+                    block.append(line)
+            if block:
+                yield block_time, b"".join(block)
+            return
+        for line in f:
+            if not line.endswith(b"\n"):
+                return  # Still being written
+            timestamp = _line_timestamp(line, self.format)
+            if timestamp is not None:
+                yield timestamp, line
+
+    def _decode(self, timestamp: float, data: bytes) -> Iterator[HistoryRecord]:
+        text = data.decode("utf-8")
+        if self.format == "ndjson":
+            record = json.loads(text)
+            yield HistoryRecord(record["ts"], record["room"], record["device"], record["fields"])
+        elif self.format == "csv":
+            ts, room, device_id, device_type, name, status, intensity, color = next(csv.reader([text]))
+            fields = {"type": device_type, "name": name, "status": status == "1", "intensity": int(intensity)}
+            if color:
+                fields["color"] = color
+            yield HistoryRecord(timestamp, room, device_id, fields)
+        else:
+            header, *lines = text.splitlines()
+            room = header[len(TEXT_HEADER):].rsplit(" at ", 1)[0]
+            for line in lines:
+                match = _TEXT_DEVICE.match(line)
+                if match:
+                    yield HistoryRecord(timestamp, room, match.group("id"),
+                                        {"name": match.group("name"), "text": line.strip()[2:]})
+
+    def _extend(self, f: BinaryIO, size: int) -> None:
+        """
+        Adds index entries for the part of the log appended since the last refresh.
+
+        Instead of reading every line, it jumps ahead by `index_interval`
+        bytes and indexes the first record that starts after that point.
+        """
+        position = self._covered
+        next_entry = self._offsets[-1] + self.index_interval if len(self._offsets) else 0
+        while True:
+            position = max(position, next_entry)
+            f.seek(position)
+            if position:
+                # Skip the rest of the record the jump landed in.
+                partial = f.readline()
+                if not partial.endswith(b"\n"):
+                    break
+                position += len(partial)
+            found = self._next_record(f, position)
+            if found is None:
+                break
+            timestamp, offset = found
+            self._times.append(timestamp)
+            self._offsets.append(offset)
+            next_entry = offset + self.index_interval
+            position = offset
+        self._covered = _last_line_end(f, size)
+
+    def _next_record(self, f: BinaryIO, position: int) -> Optional[Tuple[float, int]]:
+        """Finds the first complete record starting at or after `position`."""
+        f.seek(position)
+        for line in f:
+            if not line.endswith(b"\n"):
+                return None
+            if self.format == "text":
+                timestamp = _text_timestamp(line) if line.startswith(TEXT_HEADER) else None
+            else:
+                timestamp = _line_timestamp(line, self.format)
+            if timestamp is not None:
+                return timestamp, position
+            position += len(line)
+        return None
+
+    def _reset(self) -> None:
+        self.format = None
+        self._fingerprint = 0
+        self._covered = 0
+        self._times = array('d')
+        self._offsets = array('q')
+
+    def _load_index(self) -> None:
+        """Reads the side index if there is a valid one."""
+        try:
+            with open(self.index_file, 'rb') as f:
+                data = f.read()
+        except OSError:
+            return
+        if len(data) < INDEX_HEADER.size:
+            return
+        magic, version, format_code, fingerprint, covered, count = INDEX_HEADER.unpack_from(data)
+        body = data[INDEX_HEADER.size:]
+        if magic != INDEX_MAGIC or version != INDEX_VERSION or len(body) != 16 * count:
+            return
+        self._times.frombytes(body[:8 * count])
+        self._offsets.frombytes(body[8 * count:])
+        self.format = {code: name for name, code in FORMAT_CODES.items()}.get(format_code)
+        self._fingerprint = fingerprint
+        self._covered = covered
+
+    def _save_index(self) -> None:
+        temp_file = self.index_file + ".tmp"
+        with open(temp_file, 'wb') as f:
+            f.write(INDEX_HEADER.pack(INDEX_MAGIC, INDEX_VERSION, FORMAT_CODES[self.format], self._fingerprint,
+                                      self._covered, len(self._times)))
+            f.write(self._times.tobytes())
+            f.write(self._offsets.tobytes())
+        os.replace(temp_file, self.index_file)
+
+
+def read_rotated(filename: str, start: Optional[float] = None,
+                 end: Optional[float] = None) -> Iterator[HistoryRecord]:
+    """Yields matching records from `<log>.N` ... `<log>.1` and then `<log>`, oldest first."""
+    backups = []
+    index = 1
+    while os.path.exists(f"{filename}.{index}"):
+        backups.append(f"{filename}.{index}")
+        index += 1
+    for path in reversed(backups):
+        yield from HistoryLogReader(path).read(start, end)
+    if os.path.exists(filename):
+        yield from HistoryLogReader(filename).read(start, end)
+
+
+def _sniff(head: bytes) -> Optional[str]:
+    if head.startswith(b"{"):
+        return "ndjson"
+    if head.startswith(b"ts,"):
+        return "csv"
+    if head.startswith(TEXT_HEADER):
+        return "text"
+    return None
+
+
+def _line_timestamp(line: bytes, format: str) -> Optional[float]:
+    """Reads the timestamp at the start of an NDJSON or CSV line without parsing the rest."""
+    try:
+        if format == "ndjson":
+            if line.startswith(b'{"ts":'):
+                return float(line[6:line.index(b",")])
+            return float(json.loads(line)["ts"])
+        return float(line[:line.index(b",")])
+    except (ValueError, KeyError, TypeError):
+        return None  # A CSV header row or a damaged line
+
+
+def _text_timestamp(line: bytes) -> float:
+    stamp = line.rstrip().rsplit(b" at ", 1)[-1][:19].decode("ascii", "replace")
+    try:
+        return datetime.datetime.strptime(stamp, TEXT_TIMESTAMP_FORMAT).timestamp()
+    except ValueError:
+        return 0.0
+
+
+def _last_line_end(f: BinaryIO, size: int) -> int:
+    """Returns the offset just after the last newline in the file."""
+    position = size
+    while position > 0:
+        step = min(4096, position)
+        f.seek(position - step)
+        chunk = f.read(step)
+        newline = chunk.rfind(b"\n")
+        if newline >= 0:
+            return position - step + newline + 1
+        position -= step
+    return 0
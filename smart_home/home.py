@@ -1,15 +1,44 @@
-from typing import List, Dict, Any, Iterator, Optional
+import fnmatch
+import functools
+import threading
+import time
+from array import array
+from typing import List, Dict, Any, Iterator, Optional, Callable, Tuple, Union, NamedTuple
 from .room import Room
 from .device import Device
 from .smart_bulb import SmartBulb
 from .air_conditioner import AirConditioner
 from .scheduler import Scheduler
+from .device_history import DeviceHistory, HistoryPoint
+from .event_bus import EventBus
+from .metrics import METRICS
 
 DEVICE_CLASSES = {
     "SmartBulb": SmartBulb,
     "AirConditioner": AirConditioner,
 }
 
+SELECTOR_KEYS = ('room', 'type', 'name', 'programmable', 'status')
+BULK_ACTIONS = ('turn_on', 'turn_off', 'set_intensity', 'set_temperature', 'change_color')
+
+
+def _locked(method: Callable) -> Callable:
+    """Runs a structural change of the home while holding `Home.lock`."""
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self.lock:
+            return method(self, *args, **kwargs)
+    return wrapper
+
+
+class ApplyResult(NamedTuple):
+    """Summary of a bulk `Home.apply` call."""
+    matched: int  # Devices selected
+    changed: int  # Devices whose state actually changed
+    skipped: int  # Selected devices the action does not apply to
+    elapsed: float  # Seconds spent
+
+
 class Home:
     """Represents the entire smart home, aggregating rooms and schedulers."""
 
@@ -18,6 +47,27 @@ class Home:
         self._name = name
         self._rooms: Dict[str, Room] = {}
         self._schedulers: Dict[str, Scheduler] = {}  # Maps device_id to Scheduler
+        self._device_index: Dict[str, Tuple[Device, Room]] = {}  # Maps device_id to (device, room)
+        # Secondary indexes; dicts with None values act as insertion-ordered sets of device IDs.
+        self._type_index: Dict[type, Dict[str, None]] = {}
+        # Both sides of each flag are indexed so negative queries stay sublinear too.
+        self._on_index: Dict[str, None] = {}
+        self._off_index: Dict[str, None] = {}
+        self._programmable_index: Dict[str, None] = {}
+        self._non_programmable_index: Dict[str, None] = {}
+        self._slot_index: Dict[int, Device] = {}  # Maps DeviceStore slot to device
+        self._observers: List[Callable[[str, Any], None]] = []
+        # Change tracking for delta saves
+        self._generation = 0
+        self._clean_generation = 0
+        self._dirty_devices: Dict[str, Device] = {}
+        self._structure_changed = False
+        # Held while rooms, devices or schedulers are added or removed, while
+        # the schedule runner fires, and by code that needs a consistent view
+        # of the home, e.g. to take the recorded changes or a snapshot.
+        self.lock = threading.RLock()
+        self._history: Optional[DeviceHistory] = None
+        self._events: Optional[EventBus] = None
 
     @property
     def name(self) -> str:
@@ -29,28 +79,465 @@ class Home:
         """Gets a list of all rooms in the home."""
         return list(self._rooms.values())
 
+    def add_observer(self, callback: Callable[[str, Any], None]) -> None:
+        """
+        Registers a callback for structural changes of the home.
+
+        The callback receives an event name and its subject:
+        'room_added' (room), 'device_added'/'device_removed' (device),
+        'scheduler_added'/'scheduler_removed'/'schedule_changed' (scheduler),
+        'device_changed' (a (device, field) tuple) and
+        'batch_started'/'batch_finished' (the bulk action name) around `apply`.
+        """
+        self._observers.append(callback)
+
+    def remove_observer(self, callback: Callable[[str, Any], None]) -> None:
+        """Unregisters a previously added observer."""
+        self._observers.remove(callback)
+
+    def _notify(self, event: str, subject: Any) -> None:
+        """Records the change and notifies all observers about it."""
+        if event not in ('batch_started', 'batch_finished'):
+            self._generation += 1
+            if event != 'device_changed':
+                self._structure_changed = True
+        for callback in list(self._observers):
+            callback(event, subject)
+
+    @property
+    def events(self) -> EventBus:
+        """The publish/subscribe bus carrying every change of this home."""
+        if self._events is None:
+            self._events = EventBus(self)
+        return self._events
+
+    @_locked
     def add_room(self, room_name: str) -> Room:
         """Adds a new room to the home."""
         if room_name in self._rooms:
             raise ValueError(f"Room '{room_name}' already exists.")
         room = Room(room_name)
-        self._rooms[room_name] = room
+        self._attach_room(room)
         return room
 
+    def _attach_room(self, room: Room) -> None:
+        """Registers a room and indexes the devices it already contains."""
+        self._rooms[room.name] = room
+        for device in room.devices:
+            self._index_device(device, room)
+        room.add_observer(self._on_room_event)
+        self._notify('room_added', room)
+
+    @_locked
+    def _on_room_event(self, event: str, room: Room, device: Device) -> None:
+        """Keeps the device index and schedulers in sync with room membership."""
+        if event == 'device_added':
+            self._index_device(device, room)
+            self._notify(event, device)
+            if device.is_programmable and device.id not in self._schedulers:
+                self._attach_scheduler(Scheduler(device))
+        elif event == 'device_removed':
+            self._detach_scheduler(device.id)
+            # Observers can still look up the room the device is leaving.
+            self._notify(event, device)
+            self._unindex_device(device)
+
+    def _index_device(self, device: Device, room: Room) -> None:
+        """Adds a device to every index and starts observing its state."""
+        if device.id in self._device_index:
+            raise ValueError(f"Device with ID '{device.id}' already exists in this home.")
+        self._device_index[device.id] = (device, room)
+        self._slot_index[device.slot] = device
+        self._type_index.setdefault(type(device), {})[device.id] = None
+        (self._on_index if device.status else self._off_index)[device.id] = None
+        (self._programmable_index if device.is_programmable else self._non_programmable_index)[device.id] = None
+        device.add_observer(self._on_device_changed)
+
+    def _unindex_device(self, device: Device) -> None:
+        """Removes a device from every index and stops observing it."""
+        self._device_index.pop(device.id, None)
+        self._slot_index.pop(device.slot, None)
+        self._type_index.get(type(device), {}).pop(device.id, None)
+        self._on_index.pop(device.id, None)
+        self._off_index.pop(device.id, None)
+        self._programmable_index.pop(device.id, None)
+        self._non_programmable_index.pop(device.id, None)
+        device.remove_observer(self._on_device_changed)
+
+    def _on_device_changed(self, device: Device, field: str) -> None:
+        """Keeps the status index in sync with device state and forwards the change."""
+        if field == 'status':
+            if device.status:
+                self._off_index.pop(device.id, None)
+                self._on_index[device.id] = None
+            else:
+                self._on_index.pop(device.id, None)
+                self._off_index[device.id] = None
+        self._dirty_devices[device.id] = device
+        if self._observers:
+            self._notify('device_changed', (device, field))
+        else:
+            self._generation += 1
+
+    @property
+    def generation(self) -> int:
+        """A counter bumped on every change anywhere in the home."""
+        return self._generation
+
+    @property
+    def is_dirty(self) -> bool:
+        """Whether anything changed since the last `mark_clean`."""
+        return self._generation != self._clean_generation
+
+    @property
+    def structure_changed(self) -> bool:
+        """Whether rooms, device membership or schedules changed since the last `mark_clean`."""
+        return self._structure_changed
+
+    def dirty_devices(self) -> List[Device]:
+        """Gets the devices whose state changed since the last `mark_clean`."""
+        return list(self._dirty_devices.values())
+
+    def take_changes(self) -> Tuple[List[Device], bool]:
+        """
+        Returns the recorded changes and marks the home clean in one step.
+
+        Returns:
+            The devices whose state changed and whether the structure changed.
+        """
+        with self.lock:
+            # Read before the swap: a change slipping in after it bumps the
+            # generation again, so the home stays dirty instead of losing it.
+            generation = self._generation
+            dirty, self._dirty_devices = self._dirty_devices, {}
+            structure_changed, self._structure_changed = self._structure_changed, False
+            self._clean_generation = generation
+            for room in self._rooms.values():
+                if room.is_dirty:
+                    room.mark_clean()
+        return list(dirty.values()), structure_changed
+
+    def mark_clean(self) -> None:
+        """Forgets all recorded changes, e.g. after a full save."""
+        self.take_changes()
+
+    def mark_dirty(self) -> None:
+        """Flags the whole home as changed so the next delta save writes everything."""
+        self._structure_changed = True
+        self._generation += 1
+
     def get_room_by_name(self, room_name: str) -> Optional[Room]:
         """Retrieves a room by its name."""
         return self._rooms.get(room_name)
 
+    @_locked
     def add_device_to_room(self, device: Device, room_name: str) -> None:
         """Adds a device to a specified room and creates a scheduler if applicable."""
         room = self.get_room_by_name(room_name)
         if not room:
             raise ValueError(f"Room '{room_name}' does not exist.")
-        
+        if device.id in self._device_index:
+            raise ValueError(f"Device with ID '{device.id}' already exists in this home.")
+
         room.add_device(device)
 
-        if device.is_programmable:
-            self._schedulers[device.id] = Scheduler(device)
+    @_locked
+    def _attach_scheduler(self, scheduler: Scheduler) -> None:
+        """Registers a scheduler and forwards its changes to the home's observers."""
+        self._schedulers[scheduler.device.id] = scheduler
+        scheduler.add_observer(self._on_schedule_changed)
+        self._notify('scheduler_added', scheduler)
+
+    def _detach_scheduler(self, device_id: str) -> None:
+        """Drops the scheduler of a device, if it has one."""
+        scheduler = self._schedulers.pop(device_id, None)
+        if scheduler is not None:
+            scheduler.remove_observer(self._on_schedule_changed)
+            self._notify('scheduler_removed', scheduler)
+
+    def _on_schedule_changed(self, scheduler: Scheduler) -> None:
+        """Forwards a schedule change to the home's observers."""
+        self._notify('schedule_changed', scheduler)
+
+    @_locked
+    def remove_device(self, device_id: str) -> Device:
+        """Removes a device from its room, dropping its scheduler if it has one."""
+        room = self.get_room_of_device(device_id)
+        if room is None:
+            raise ValueError(f"Device with ID '{device_id}' does not exist.")
+        return room.remove_device(device_id)
+
+    def get_device_by_id(self, device_id: str) -> Optional[Device]:
+        """Retrieves any device of the home by its ID in constant time."""
+        entry = self._device_index.get(device_id)
+        return entry[0] if entry else None
+
+    def get_room_of_device(self, device_id: str) -> Optional[Room]:
+        """Retrieves the room containing the given device."""
+        entry = self._device_index.get(device_id)
+        return entry[1] if entry else None
+
+    def query(self, device_type: Optional[type] = None, status: Optional[bool] = None,
+              programmable: Optional[bool] = None, room: Union[Room, str, None] = None) -> List[Device]:
+        """
+        Finds devices matching all given criteria using the home's indexes.
+
+        Args:
+            device_type: Only devices of this class (or a subclass of it).
+            status: Only devices that are on (True) or off (False).
+            programmable: Only devices that are (or are not) programmable.
+            room: Only devices in this room, given as a Room or its name.
+
+        Returns:
+            The matching devices. The cost is proportional to the smallest
+            matching index rather than to the number of devices in the home.
+        """
+        included: List[Dict[str, Any]] = []
+
+        if device_type is not None:
+            matching = [ids for cls, ids in self._type_index.items() if issubclass(cls, device_type)]
+            if len(matching) == 1:
+                included.append(matching[0])
+            else:
+                included.append({dev_id: None for ids in matching for dev_id in ids})
+        if status is not None:
+            included.append(self._on_index if status else self._off_index)
+        if programmable is not None:
+            included.append(self._programmable_index if programmable else self._non_programmable_index)
+        if room is not None:
+            try:
+                room_obj = self._resolve_rooms(room)[0]
+            except ValueError:
+                return []
+            included.append(room_obj._devices)
+
+        if included:
+            included.sort(key=len)
+            candidates, others = included[0], included[1:]
+        else:
+            candidates, others = self._device_index, []
+
+        index = self._device_index
+        if not others:
+            return [index[dev_id][0] for dev_id in candidates]
+        return [index[dev_id][0] for dev_id in candidates if all(dev_id in ids for ids in others)]
+
+    def _resolve_rooms(self, room: Union[Room, str, None]) -> List[Room]:
+        """Returns the given room (by object or name) as a list, or all rooms if it is None."""
+        if room is None:
+            return list(self._rooms.values())
+        room_obj = self.get_room_by_name(room) if isinstance(room, str) else room
+        if room_obj is None or self._rooms.get(room_obj.name) is not room_obj:
+            raise ValueError(f"Room '{room if isinstance(room, str) else room.name}' does not exist.")
+        return [room_obj]
+
+    def device_slots(self, room: Union[Room, str, None] = None) -> array:
+        """Gets the DeviceStore slots of every device in the home or in one room."""
+        slots = array('i')
+        for room_obj in self._resolve_rooms(room):
+            slots.extend(room_obj.slots())
+        return slots
+
+    def count_on(self, room: Union[Room, str, None] = None) -> int:
+        """Counts the devices that are switched on, in the whole home or in one room."""
+        return Device.store.count_on(self.device_slots(room))
+
+    def average_intensity_by_room(self) -> Dict[str, Optional[float]]:
+        """Returns the mean intensity per room (None for rooms without devices)."""
+        store = Device.store
+        return {room.name: store.mean_intensity(room.slots()) for room in self._rooms.values()}
+
+    def clamp_intensity(self, upper: Optional[int] = None, room: Union[Room, str, None] = None) -> int:
+        """
+        Caps the intensity of every device in the home or in one room.
+
+        Args:
+            upper: The highest allowed intensity; None caps at each device's own maximum.
+            room: Limit the operation to this room.
+
+        Returns:
+            The number of devices whose intensity changed.
+        """
+        changed = Device.store.clamp_intensity(self.device_slots(room), upper)
+        for slot in changed:
+            self._slot_index[slot]._notify('intensity')
+        return len(changed)
+
+    def select(self, selector: Optional[Dict[str, Any]] = None) -> List[Device]:
+        """
+        Finds the devices matching a selector.
+
+        The selector is a dict with any of the keys 'room' (Room or name),
+        'type' (device class), 'programmable' (bool), 'status' (bool) and
+        'name' (a shell-style pattern such as 'Desk*'). None selects every
+        device in the home.
+        """
+        selector = selector or {}
+        unknown = set(selector) - set(SELECTOR_KEYS)
+        if unknown:
+            raise ValueError(f"Unknown selector keys: {', '.join(sorted(unknown))}.")
+        devices = self.query(device_type=selector.get('type'), status=selector.get('status'),
+                             programmable=selector.get('programmable'), room=selector.get('room'))
+        pattern = selector.get('name')
+        if pattern is not None:
+            match = fnmatch.fnmatchcase
+            devices = [device for device in devices if match(device.name, pattern)]
+        return devices
+
+    @_locked
+    def apply(self, selector: Optional[Dict[str, Any]], action: str, **args: Any) -> ApplyResult:
+        """
+        Runs one action on every device matching `selector` as a single batch.
+
+        Args:
+            selector: See `select`.
+            action: 'turn_on', 'turn_off', 'set_intensity' (value=...),
+                'set_temperature' (value=..., air conditioners only) or
+                'change_color' (r=..., g=..., b=..., bulbs only).
+
+        Returns:
+            An ApplyResult summarizing what happened.
+        """
+        if action not in BULK_ACTIONS:
+            raise ValueError(f"Unknown action '{action}'.")
+        started = time.perf_counter()
+        devices = self.select(selector)
+        store = Device.store
+        status, intensity = store.status, store.intensity
+        low, high = store.min_intensity, store.max_intensity
+        # Changed devices per field
+        changed: Dict[str, List[Device]] = {'status': [], 'intensity': [], 'color': []}
+        skipped = 0
+
+        if action == 'set_temperature':
+            targets = [device for device in devices if isinstance(device, AirConditioner)]
+            skipped = len(devices) - len(targets)
+        elif action == 'change_color':
+            targets = [device for device in devices if isinstance(device, SmartBulb)]
+            skipped = len(devices) - len(targets)
+        else:
+            targets = devices
+
+        # State is written straight into the DeviceStore columns; the
+        # bookkeeping normally done per call happens once, in _publish_batch.
+        self._notify('batch_started', action)
+        try:
+            if action == 'turn_on':
+                changed_status = changed['status']
+                for device in targets:
+                    slot = device._slot
+                    if not status[slot]:
+                        status[slot] = 1
+                        changed_status.append(device)
+            elif action == 'turn_off':
+                changed_status, changed_intensity = changed['status'], changed['intensity']
+                for device in targets:
+                    slot = device._slot
+                    if status[slot]:
+                        status[slot] = 0
+                        changed_status.append(device)
+                    if intensity[slot] != low[slot]:
+                        intensity[slot] = low[slot]
+                        changed_intensity.append(device)
+            elif action in ('set_intensity', 'set_temperature'):
+                value = int(args['value'])
+                changed_intensity = changed['intensity']
+                for device in targets:
+                    slot = device._slot
+                    target = min(max(value, low[slot]), high[slot])
+                    if intensity[slot] != target:
+                        intensity[slot] = target
+                        changed_intensity.append(device)
+            else:
+                r, g, b = args['r'], args['g'], args['b']
+                if not all(0 <= val <= 255 for val in [r, g, b]):
+                    raise ValueError("Color values must be between 0 and 255.")
+                packed = (r << 16) | (g << 8) | b
+                color, changed_color = store.color, changed['color']
+                for device in targets:
+                    if color[device._slot] != packed:
+                        color[device._slot] = packed
+                        changed_color.append(device)
+
+            for field, field_changed in changed.items():
+                if field_changed:
+                    self._publish_batch(field, field_changed)
+        finally:
+            self._notify('batch_finished', action)
+
+        if changed['intensity'] and changed['status']:
+            changed_count = len({device.id for field_changed in changed.values() for device in field_changed})
+        else:
+            changed_count = sum(len(field_changed) for field_changed in changed.values())
+        return ApplyResult(matched=len(devices), changed=changed_count,
+                           skipped=skipped, elapsed=time.perf_counter() - started)
+
+    def _publish_batch(self, field: str, devices: List[Device]) -> None:
+        """
+        Does the bookkeeping of `Device._notify` for many devices at once.
+
+        Indexes, dirty sets and generations of the home and its rooms are
+        updated in bulk; only observers other than the home and the device's
+        room are called per device.
+        """
+        dirty, device_index = self._dirty_devices, self._device_index
+        if field == 'status':
+            on_index, off_index = self._on_index, self._off_index
+            status = Device.store.status
+            for device in devices:
+                if status[device._slot]:
+                    off_index.pop(device._id, None)
+                    on_index[device._id] = None
+                else:
+                    on_index.pop(device._id, None)
+                    off_index[device._id] = None
+
+        touched_rooms: Dict[str, Room] = {}
+        own_callback = self._on_device_changed
+        for device in devices:
+            dev_id = device._id
+            device._generation += 1
+            dirty[dev_id] = device
+            room = device_index[dev_id][1]
+            room._dirty_devices[dev_id] = device
+            touched_rooms[room._name] = room
+            # Every device in a home is observed by the home and by its room.
+            if len(device._observers) > 2:
+                for callback in device._observers:
+                    if callback != own_callback and callback != room._on_device_changed:
+                        callback(device, field)
+        for room in touched_rooms.values():
+            room._generation += 1
+
+        if self._observers:
+            for device in devices:
+                self._notify('device_changed', (device, field))
+        else:
+            self._generation += len(devices)
+
+    def enable_history(self, **options: Any) -> DeviceHistory:
+        """
+        Starts recording status and intensity changes of every device.
+
+        Args:
+            **options: Passed on to DeviceHistory (raw_capacity, tiers, clock).
+
+        Returns:
+            The DeviceHistory, which is kept until the home goes away.
+        """
+        if self._history is None:
+            self._history = DeviceHistory(**options)
+            self.add_observer(self._history.on_home_event)
+        return self._history
+
+    def history(self, device_id: str, start: Optional[float] = None, end: Optional[float] = None,
+                resolution: Optional[float] = None, field: str = 'intensity') -> List[HistoryPoint]:
+        """Gets the recorded history of a device field; see `DeviceHistory.query`."""
+        if self._history is None:
+            raise ValueError("History recording is not enabled for this home.")
+        if device_id not in self._device_index:
+            raise ValueError(f"Device with ID '{device_id}' does not exist.")
+        return self._history.query(device_id, start, end, resolution, field)
 
     def get_all_devices(self) -> Iterator[Device]:
         """Returns an iterator over all devices in all rooms."""
@@ -62,6 +549,11 @@ class Home:
         """Retrieves the scheduler for a given device ID."""
         return self._schedulers.get(device_id)
 
+    @property
+    def schedulers(self) -> List[Scheduler]:
+        """Gets a list of all schedulers in the home."""
+        return list(self._schedulers.values())
+
     def __str__(self) -> str:
         report = [f"--- {self.name} Status ---"]
         if not self._rooms:
@@ -81,18 +573,20 @@ class Home:
         }
 
     @classmethod
+    @METRICS.timed("home_from_dict_seconds", "Seconds spent building a home from a dict")
     def from_dict(cls, data: Dict[str, Any]) -> 'Home':
         """Deserializes a Home object from a dictionary."""
         home = cls(name=data.get("name", "Unnamed Home"))
         
         for room_data in data.get("rooms", []):
             room = Room.from_dict(room_data, DEVICE_CLASSES)
-            home._rooms[room.name] = room
+            home._attach_room(room)
 
         schedulers_data = data.get("schedulers", {})
         for dev_id, sched_data in schedulers_data.items():
-            device = next((dev for dev in home.get_all_devices() if dev.id == dev_id), None)
+            device = home.get_device_by_id(dev_id)
             if device and device.is_programmable:
-                home._schedulers[dev_id] = Scheduler.from_dict(sched_data, device)
+                home._attach_scheduler(Scheduler.from_dict(sched_data, device))
 
+        home.mark_clean()
         return home
@@ -0,0 +1,258 @@
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+from array import array
+from typing import Any, Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+from .home import Home, DEVICE_CLASSES
+from .room import Room
+from .scheduler import Scheduler, _WEEK_DAYS, _ACTIONS
+from .smart_bulb import pack_color
+from .data_manager import DataManager
+from .sqlite_store import SQLiteStore, DeviceRow, ScheduleRow
+from . import binary_snapshot
+
+ROOM_NAMES = ("Living Room", "Kitchen", "Bedroom", "Bathroom", "Office", "Hallway",
+              "Dining Room", "Guest Room", "Garage", "Attic", "Basement", "Nursery")
+DEFAULT_DEVICE_MIX = {"SmartBulb": 0.7, "AirConditioner": 0.3}
+ID_PREFIXES = {"SmartBulb": "Bulb", "AirConditioner": "AC"}
+INTENSITY_RANGES = {"SmartBulb": (0, 100), "AirConditioner": (16, 30)}
+# Only bulbs can be programmed.
+PROGRAMMABLE_TYPES = ("SmartBulb",)
+
+
+class GeneratedDevice(NamedTuple):
+    id: str
+    type: str  # A key of DEVICE_CLASSES
+    name: str
+    is_programmable: bool
+    status: bool
+    intensity: int
+    color: Optional[Tuple[int, int, int]]  # Bulbs only
+
+    def to_row(self) -> DeviceRow:
+        """The row `SQLiteStore.save_rooms` and `binary_snapshot.write_rooms` take."""
+        return (self.id, self.type, self.name, self.is_programmable, self.status, self.intensity,
+                pack_color(*self.color) if self.color is not None else None)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """The same dict the device's own `to_dict` would produce."""
+        data = {"id": self.id, "status": self.status, "intensity": self.intensity, "type": self.type,
+                "name": self.name}
+        if self.color is not None:
+            r, g, b = self.color
+            data.update({"is_programmable": self.is_programmable, "color": {'r': r, 'g': g, 'b': b}})
+        return data
+
+
+class GeneratedRoom(NamedTuple):
+    name: str
+    devices: List[GeneratedDevice]
+    # Device ID to its sorted (seconds_of_week, action_code) events
+    schedules: Dict[str, List[Tuple[int, int]]]
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"name": self.name, "devices": [device.to_dict() for device in self.devices]}
+
+
+def schedule_to_dict(events: List[Tuple[int, int]]) -> Dict[str, Any]:
+    """The same dict `Scheduler.to_dict` produces for these events."""
+    schedule = []
+    for offset, action in events:
+        day, rest = divmod(offset, 86400)
+        hour, rest = divmod(rest, 3600)
+        minute, second = divmod(rest, 60)
+        schedule.append({'day': _WEEK_DAYS[day], 'hour': hour, 'minute': minute, 'second': second,
+                         'action': _ACTIONS[action]})
+    return {"schedule": schedule}
+
+
+class HomeGenerator:
+    """
+    Deterministic generator of large synthetic homes for load testing.
+
+    The same parameters and seed always produce the same home. Rooms are
+    generated one at a time, each from its own seeded random stream, so a
+    home can be written to JSON, binary or SQLite files while holding only
+    one room in memory, whatever the total number of devices.
+    """
+
+    def __init__(self, rooms: int = 10, devices: int = 100, device_mix: Optional[Dict[str, float]] = None,
+                 programmable_ratio: float = 0.3, events_per_device: float = 4.0, on_ratio: float = 0.3,
+                 seed: int = 0, name: str = "Generated Home"):
+        """
+        Initializes the generator.
+
+        Args:
+            rooms: Number of rooms; devices are spread evenly over them.
+            devices: Total number of devices.
+            device_mix: Relative weight of every device type, by class name.
+            programmable_ratio: Share of programmable-capable devices that are programmable.
+            events_per_device: Mean number of schedule events per programmable device.
+            on_ratio: Share of devices that are switched on.
+            seed: Selects one of the possible homes.
+            name: Name of the home.
+        """
+        device_mix = DEFAULT_DEVICE_MIX if device_mix is None else device_mix
+        unknown = set(device_mix) - set(DEVICE_CLASSES)
+        if unknown:
+            raise ValueError(f"Unknown device types: {', '.join(sorted(unknown))}.")
+        if rooms < 1 and devices > 0:
+            raise ValueError("Devices need at least one room.")
+        if not (0 <= programmable_ratio <= 1 and 0 <= on_ratio <= 1) or events_per_device < 0:
+            raise ValueError("Ratios must be between 0 and 1 and the event density must not be negative.")
+        total = sum(device_mix.values())
+        if total <= 0:
+            raise ValueError("The device mix needs at least one positive weight.")
+        self.rooms = rooms
+        self.devices = devices
+        self.programmable_ratio = programmable_ratio
+        self.events_per_device = events_per_device
+        self.on_ratio = on_ratio
+        self.seed = seed
+        self.name = name
+        self._types = list(device_mix)
+        self._cumulative = []
+        running = 0.0
+        for device_type in self._types:
+            running += device_mix[device_type] / total
+            self._cumulative.append(running)
+
+    def _pick_type(self, rng: random.Random) -> str:
+        roll = rng.random()
+        for device_type, bound in zip(self._types, self._cumulative):
+            if roll < bound:
+                return device_type
+        return self._types[-1]
+
+    def _events(self, rng: random.Random) -> List[Tuple[int, int]]:
+        count = round(rng.uniform(0, 2 * self.events_per_device))
+        times = sorted(rng.randrange(Scheduler.SECONDS_PER_WEEK) for _ in range(count))
+        # Alternating actions give realistic on/off cycles.
+        return [(offset, index % 2) for index, offset in enumerate(times)]
+
+    def iter_rooms(self) -> Iterator[GeneratedRoom]:
+        """Generates the rooms in order."""
+        counters = {device_type: 0 for device_type in self._types}
+        per_room, extra = divmod(self.devices, self.rooms) if self.rooms else (0, 0)
+        for index in range(self.rooms):
+            rng = random.Random(self.seed * 1_000_003 + index)
+            room_name = f"{ROOM_NAMES[index % len(ROOM_NAMES)]} {index // len(ROOM_NAMES) + 1}"
+            devices = []
+            schedules = {}
+            for _ in range(per_room + (1 if index < extra else 0)):
+                device_type = self._pick_type(rng)
+                number = counters[device_type]
+                counters[device_type] += 1
+                low, high = INTENSITY_RANGES[device_type]
+                status = rng.random() < self.on_ratio
+                intensity = rng.randint(low + 1, high) if status else low
+                is_programmable = device_type in PROGRAMMABLE_TYPES and rng.random() < self.programmable_ratio
+                color = None
+                if device_type == "SmartBulb":
+                    color = (255, 255, 255) if rng.random() < 0.5 else \
+                        (rng.randrange(256), rng.randrange(256), rng.randrange(256))
+                device_id = f"{ID_PREFIXES[device_type]}_{number}"
+                devices.append(GeneratedDevice(device_id, device_type, f"{room_name} {ID_PREFIXES[device_type]} {number}",
+                                               is_programmable, status, intensity, color))
+                if is_programmable:
+                    schedules[device_id] = self._events(rng)
+            yield GeneratedRoom(room_name, devices, schedules)
+
+    def build(self) -> Home:
+        """Creates the home in memory."""
+        home = Home(self.name)
+        for generated in self.iter_rooms():
+            room = Room.from_dict(generated.to_dict(), DEVICE_CLASSES)
+            home._attach_room(room)
+            for device_id, events in generated.schedules.items():
+                times = array('i', (offset for offset, _ in events))
+                actions = array('b', (action for _, action in events))
+                home._attach_scheduler(Scheduler.from_arrays(home.get_device_by_id(device_id), times, actions))
+        DataManager._synchronize_id_counters(home)
+        home.mark_clean()
+        return home
+
+    def write(self, filename: str) -> None:
+        """Writes the home in the format selected by the file extension, like `DataManager.save_home`."""
+        if DataManager.is_binary_file(filename):
+            self.write_binary(filename)
+        elif DataManager.is_sqlite_file(filename):
+            self.write_sqlite(filename)
+        else:
+            self.write_json(filename)
+
+    def write_json(self, filename: str) -> None:
+        """Writes a file `DataManager.load_home_from_json` can read, one room at a time."""
+        # Schedulers follow all rooms in the file, so they are spooled meanwhile.
+        with open(filename, 'w') as f, tempfile.TemporaryFile('w+') as schedulers:
+            f.write('{"name": %s, "rooms": [' % json.dumps(self.name))
+            first_room, first_scheduler = True, True
+            for room in self.iter_rooms():
+                f.write(('' if first_room else ', ') + json.dumps(room.to_dict()))
+                first_room = False
+                for device_id, events in room.schedules.items():
+                    schedulers.write(('' if first_scheduler else ', ') +
+                                     f"{json.dumps(device_id)}: {json.dumps(schedule_to_dict(events))}")
+                    first_scheduler = False
+            f.write('], "schedulers": {')
+            schedulers.seek(0)
+            shutil.copyfileobj(schedulers, f)
+            f.write('}}\n')
+
+    def iter_rows(self) -> Iterator[Tuple[str, List[DeviceRow], List[ScheduleRow]]]:
+        """The rooms as the (name, devices, schedules) rows the streaming writers take."""
+        for room in self.iter_rooms():
+            yield room.name, [device.to_row() for device in room.devices], list(room.schedules.items())
+
+    def write_binary(self, filename: str) -> None:
+        """Writes a binary snapshot, one room at a time."""
+        binary_snapshot.write_rooms(filename, self.name, self.iter_rows())
+
+    def write_sqlite(self, filename: str) -> None:
+        """Writes an SQLite database `DataManager.load_home_from_sqlite` can read, one room at a time."""
+        store = SQLiteStore(filename)
+        try:
+            store.save_rooms(self.name, self.iter_rows())
+        finally:
+            store.close()
+
+
+def main(argv: List[str]) -> int:
+    """Writes a synthetic home: python -m smart_home.home_generator OUTPUT [options]"""
+    import argparse
+
+    parser = argparse.ArgumentParser(prog="smart_home.home_generator", description="Generate a synthetic home.")
+    parser.add_argument("output", help="file to write; .json, .shb or .db selects the format")
+    parser.add_argument("--rooms", type=int, default=100)
+    parser.add_argument("--devices", type=int, default=1000)
+    parser.add_argument("--bulb-share", type=float, default=DEFAULT_DEVICE_MIX["SmartBulb"],
+                        help="share of smart bulbs; the rest are air conditioners")
+    parser.add_argument("--programmable-ratio", type=float, default=0.3)
+    parser.add_argument("--events-per-device", type=float, default=4.0)
+    parser.add_argument("--on-ratio", type=float, default=0.3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--name", default="Generated Home")
+    parser.add_argument("--force", action="store_true", help="overwrite an existing output file")
+    args = parser.parse_args(argv)
+    # SQLite keeps its write-ahead log and shared memory next to the database.
+    existing = [path for path in (args.output, args.output + "-wal", args.output + "-shm") if os.path.exists(path)]
+    if existing and not args.force:
+        print(f"{args.output} already exists; use --force to overwrite it.", file=sys.stderr)
+        return 1
+
+    generator = HomeGenerator(args.rooms, args.devices, {"SmartBulb": args.bulb_share,
+                                                         "AirConditioner": 1 - args.bulb_share},
+                              args.programmable_ratio, args.events_per_device, args.on_ratio, args.seed, args.name)
+    for path in existing:
+        os.remove(path)
+    generator.write(args.output)
+    print(f"Wrote {args.devices} devices in {args.rooms} rooms to {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,244 @@
+import json
+import os
+import shutil
+import threading
+from typing import Dict, Any, Optional, Tuple
+
+from .home import Home, DEVICE_CLASSES
+from .device import Device
+from .scheduler import Scheduler
+
+
+class HomeJournal:
+    """
+    Append-only log of mutations applied to a Home.
+
+    Every structural change, device state change and schedule change is
+    written as one JSON line to `<snapshot>.journal` and flushed right away,
+    so saving costs O(changes) and a crash can lose at most the record being
+    written (records of one bulk `Home.apply` are flushed together when it
+    finishes). `compact` folds the journal into a new snapshot of the whole
+    home; while it runs, new records go to a fresh journal file.
+    """
+
+    def __init__(self, snapshot_file: str, fsync: bool = False, compact_threshold: int = 10000):
+        """
+        Initializes a journal next to a JSON snapshot.
+
+        Args:
+            snapshot_file: The JSON snapshot the journal is replayed on top of.
+            fsync: Whether to fsync after every record (survives power loss, but is slower).
+            compact_threshold: Number of records after which a background compaction starts.
+        """
+        self.snapshot_file = snapshot_file
+        self.journal_file = snapshot_file + ".journal"
+        self.fsync = fsync
+        self.compact_threshold = compact_threshold
+        self._home: Optional[Home] = None
+        self._lock = threading.Lock()
+        self._file = None
+        self._seq = 0
+        self._records_since_compaction = 0
+        self._compaction_thread: Optional[threading.Thread] = None
+        self._in_batch = False
+
+    @property
+    def pending_file(self) -> str:
+        """The journal being folded into a snapshot by an unfinished compaction."""
+        return self.journal_file + ".compacting"
+
+    @property
+    def seq(self) -> int:
+        """The sequence number of the last written record."""
+        return self._seq
+
+    def attach(self, home: Home, seq: int = 0) -> None:
+        """Starts journaling every mutation of `home`, continuing after record `seq`."""
+        self._home = home
+        self._seq = seq
+        self._file = open(self.journal_file, 'a')
+        home.add_observer(self._on_home_event)
+
+    def close(self) -> None:
+        """Stops journaling and closes the journal file."""
+        if self._compaction_thread is not None:
+            self._compaction_thread.join()
+        if self._home is not None:
+            self._home.remove_observer(self._on_home_event)
+            self._home = None
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def _on_home_event(self, event: str, subject: Any) -> None:
+        """Translates a home change into a journal record."""
+        if event == 'batch_started':
+            self._in_batch = True
+        elif event == 'batch_finished':
+            self._in_batch = False
+            self.flush()
+        elif event == 'device_changed':
+            device, field = subject
+            value = dict(device.color) if field == 'color' else getattr(device, field)
+            self.append({"op": "set", "id": device.id, "field": field, "value": value})
+        elif event == 'schedule_changed':
+            self.append({"op": "schedule", "id": subject.device.id, "schedule": list(subject.schedule)})
+        elif event == 'room_added':
+            self.append({"op": "add_room", "name": subject.name})
+        elif event == 'device_added':
+            room = self._home.get_room_of_device(subject.id)
+            self.append({"op": "add_device", "room": room.name, "device": subject.to_dict()})
+        elif event == 'device_removed':
+            self.append({"op": "remove_device", "id": subject.id})
+
+    def append(self, record: Dict[str, Any]) -> None:
+        """Writes one record to the journal and flushes it."""
+        with self._lock:
+            self._seq += 1
+            record["seq"] = self._seq
+            self._file.write(json.dumps(record, separators=(',', ':')) + "\n")
+            if not self._in_batch:
+                self._flush_locked()
+            self._records_since_compaction += 1
+            should_compact = self._records_since_compaction >= self.compact_threshold
+        if should_compact:
+            self.compact_in_background()
+
+    def flush(self) -> None:
+        """Pushes buffered records to the operating system (and disk, with fsync)."""
+        with self._lock:
+            if self._file is not None:
+                self._flush_locked()
+
+    def _flush_locked(self) -> None:
+        self._file.flush()
+        if self.fsync:
+            os.fsync(self._file.fileno())
+
+    def compact_in_background(self) -> None:
+        """Starts a compaction on a daemon thread unless one is already running."""
+        if self._compaction_thread is not None and self._compaction_thread.is_alive():
+            return
+        self._compaction_thread = threading.Thread(target=self.compact, name="HomeJournalCompaction", daemon=True)
+        self._compaction_thread.start()
+
+    def compact(self) -> None:
+        """
+        Writes a fresh snapshot of the home and discards the records it covers.
+
+        The snapshot is taken under `Home.lock`, which adding or removing
+        rooms, devices and schedulers holds, so a background compaction sees
+        no half-made structural change. State changes that slip in are in
+        the new journal and are replayed on top of the snapshot.
+        """
+        with self._lock:
+            self._file.close()
+            if os.path.exists(self.pending_file):
+                # Left by a compaction that crashed; its records are not in the snapshot yet.
+                self._fold_into_pending()
+            else:
+                os.replace(self.journal_file, self.pending_file)
+            self._file = open(self.journal_file, 'a')
+            seq = self._seq
+            self._records_since_compaction = 0
+
+        # Records written from now on land in the new journal. Replay is
+        # idempotent, so a snapshot that already contains some of them is fine.
+        with self._home.lock:
+            data = self._home.to_dict()
+        data["journal_seq"] = seq
+        temp_file = self.snapshot_file + ".tmp"
+        with open(temp_file, 'w') as f:
+            json.dump(data, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_file, self.snapshot_file)
+        os.remove(self.pending_file)
+
+    def _fold_into_pending(self) -> None:
+        """Appends the journal to the pending file, dropping a truncated record at the end of the latter."""
+        temp_file = self.pending_file + ".tmp"
+        with open(temp_file, 'w') as f:
+            with open(self.pending_file, 'r') as pending:
+                for line in pending:
+                    # Replay stops at the first broken line, which would hide the records after it.
+                    try:
+                        json.loads(line)
+                    except json.JSONDecodeError:
+                        break
+                    f.write(line if line.endswith("\n") else line + "\n")
+            if os.path.exists(self.journal_file):
+                with open(self.journal_file, 'r') as journal:
+                    shutil.copyfileobj(journal, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_file, self.pending_file)
+        # Replaying the journal again after a crash right here is harmless.
+        if os.path.exists(self.journal_file):
+            os.remove(self.journal_file)
+
+    @classmethod
+    def replay(cls, home: Home, snapshot_file: str, after_seq: int = 0) -> Tuple[int, int]:
+        """
+        Applies the journal(s) belonging to `snapshot_file` to `home`.
+
+        A truncated last line (e.g. after a crash) ends the replay.
+
+        Returns:
+            The number of records applied and the last sequence number seen.
+        """
+        journal_file = snapshot_file + ".journal"
+        applied, last_seq = 0, after_seq
+        for path in (journal_file + ".compacting", journal_file):
+            if not os.path.exists(path):
+                continue
+            with open(path, 'r') as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        break
+                    if record.get("seq", 0) <= after_seq:
+                        continue
+                    cls._apply(home, record)
+                    applied += 1
+                    last_seq = max(last_seq, record["seq"])
+        return applied, last_seq
+
+    @staticmethod
+    def _apply(home: Home, record: Dict[str, Any]) -> None:
+        """Applies a single record. Records may be applied more than once."""
+        op = record["op"]
+        if op == "add_room":
+            if home.get_room_by_name(record["name"]) is None:
+                home.add_room(record["name"])
+        elif op == "add_device":
+            data = record["device"]
+            device_class = DEVICE_CLASSES.get(data.get("type"))
+            if device_class and home.get_device_by_id(data["id"]) is None:
+                home.add_device_to_room(device_class.from_dict(data), record["room"])
+        elif op == "remove_device":
+            if home.get_device_by_id(record["id"]) is not None:
+                home.remove_device(record["id"])
+        elif op == "set":
+            device = home.get_device_by_id(record["id"])
+            if device is not None:
+                HomeJournal._apply_field(device, record["field"], record["value"])
+        elif op == "schedule":
+            scheduler: Optional[Scheduler] = home.get_scheduler_for_device(record["id"])
+            if scheduler is not None:
+                scheduler.set_events(record["schedule"])
+
+    @staticmethod
+    def _apply_field(device: Device, field: str, value: Any) -> None:
+        """Sets one field of a device through its public API."""
+        if field == "status":
+            if value:
+                device.turn_on()
+            else:
+                device.turn_off()
+        elif field == "intensity":
+            device.set_intensity(value)
+        elif field == "color":
+            device.change_color(value['r'], value['g'], value['b'])
@@ -0,0 +1,231 @@
+import functools
+import json
+import math
+import os
+import re
+import threading
+import time
+from bisect import bisect_left
+from typing import Any, Callable, Dict, List, Sequence, Tuple
+
+# Upper bounds, in seconds, of the buckets timers sort their observations into
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+_Labels = Tuple[Tuple[str, str], ...]
+
+
+class Counter:
+    """A value that only goes up, e.g. the number of saves."""
+
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0) -> None:
+        with self._lock:
+            self.value += amount
+
+    def sample(self) -> Dict[str, Any]:
+        return {"value": self.value}
+
+
+class Histogram:
+    """Counts observations in cumulative buckets and keeps their sum, like a Prometheus histogram."""
+
+    def __init__(self, buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.bounds = tuple(sorted(buckets))
+        self.counts = [0] * (len(self.bounds) + 1)  # The last one is +Inf
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        index = bisect_left(self.bounds, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+            self.count += 1
+
+    def sample(self) -> Dict[str, Any]:
+        with self._lock:
+            counts, total, count = list(self.counts), self.sum, self.count
+        buckets, running = {}, 0
+        for bound, bucket_count in zip(list(self.bounds) + [math.inf], counts):
+            running += bucket_count
+            buckets["+Inf" if bound == math.inf else repr(bound)] = running
+        return {"count": count, "sum": total, "buckets": buckets}
+
+
+class _Timer:
+    """Observes the seconds spent inside a `with` block."""
+    __slots__ = ('_histogram', '_started')
+
+    def __init__(self, histogram: Histogram):
+        self._histogram = histogram
+
+    def __enter__(self) -> '_Timer':
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self._histogram.observe(time.perf_counter() - self._started)
+
+
+class _NoTimer:
+    """Stands in for a timer while metrics are disabled."""
+    __slots__ = ()
+
+    def __enter__(self) -> '_NoTimer':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        pass
+
+
+_NO_TIMER = _NoTimer()
+
+
+class MetricsRegistry:
+    """
+    Counters, timers and histograms of a process, exported as snapshots.
+
+    Metrics are opt-in: the registry starts disabled, and while it is
+    disabled `timer` returns a shared no-op context manager and
+    instrumented code skips its measurements after checking `enabled`, so
+    the cost is one attribute lookup per call site.
+
+    A metric is identified by its name and labels, e.g.
+    `registry.timer("data_manager_save_seconds", format="json")`.
+    """
+
+    def __init__(self, enabled: bool = False, clock: Callable[[], float] = time.time):
+        self.enabled = enabled
+        self._clock = clock
+        self._lock = threading.Lock()
+        # Name to (type, help, {labels: metric})
+        self._families: Dict[str, Tuple[str, str, Dict[_Labels, Any]]] = {}
+
+    def enable(self) -> None:
+        self.enabled = True
+
+    def disable(self) -> None:
+        self.enabled = False
+
+    def reset(self) -> None:
+        """Forgets every metric."""
+        with self._lock:
+            self._families = {}
+
+    def _get(self, kind: str, name: str, help: str, labels: Dict[str, Any], factory: Callable[[], Any]) -> Any:
+        key = tuple(sorted((label, str(value)) for label, value in labels.items()))
+        family = self._families.get(name)
+        if family is not None and key in family[2]:
+            return family[2][key]
+        with self._lock:
+            family = self._families.setdefault(name, (kind, help, {}))
+            if family[0] != kind:
+                raise ValueError(f"Metric '{name}' is a {family[0]}, not a {kind}.")
+            return family[2].setdefault(key, factory())
+
+    def counter(self, name: str, help: str = "", **labels: Any) -> Counter:
+        """Gets or creates a counter."""
+        return self._get("counter", name, help, labels, Counter)
+
+    def histogram(self, name: str, help: str = "", buckets: Sequence[float] = DEFAULT_BUCKETS,
+                  **labels: Any) -> Histogram:
+        """Gets or creates a histogram; the buckets of an existing one are kept."""
+        return self._get("histogram", name, help, labels, lambda: Histogram(buckets))
+
+    def timer(self, name: str, help: str = "", **labels: Any):
+        """A context manager recording the seconds spent in it into a histogram; a no-op while disabled."""
+        if not self.enabled:
+            return _NO_TIMER
+        return _Timer(self.histogram(name, help, **labels))
+
+    def timed(self, name: str, help: str = "", **labels: Any) -> Callable[[Callable], Callable]:
+        """Decorator timing every call of a function while metrics are enabled."""
+        def decorate(function: Callable) -> Callable:
+            @functools.wraps(function)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return function(*args, **kwargs)
+                with _Timer(self.histogram(name, help, **labels)):
+                    return function(*args, **kwargs)
+            return wrapper
+        return decorate
+
+    def _series(self) -> List[Tuple[str, str, str, Dict[str, str], Dict[str, Any]]]:
+        with self._lock:
+            families = [(name, kind, help, list(metrics.items()))
+                        for name, (kind, help, metrics) in sorted(self._families.items())]
+        return [(name, kind, help, dict(labels), metric.sample())
+                for name, kind, help, metrics in families for labels, metric in sorted(metrics)]
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Every metric at this point in time, as plain data."""
+        metrics: Dict[str, Any] = {}
+        for name, kind, help, labels, sample in self._series():
+            family = metrics.setdefault(name, {"type": kind, "help": help, "series": []})
+            family["series"].append({"labels": labels, **sample})
+        return {"timestamp": self._clock(), "metrics": metrics}
+
+    def to_ndjson(self) -> str:
+        """The snapshot with one JSON line per series, ready to be appended to a log."""
+        timestamp = self._clock()
+        return "".join(json.dumps({"ts": timestamp, "name": name, "type": kind, "labels": labels, **sample},
+                                  separators=(',', ':')) + "\n"
+                       for name, kind, _, labels, sample in self._series())
+
+    def to_prometheus(self) -> str:
+        """The snapshot in the Prometheus text exposition format."""
+        lines = []
+        current = None
+        for name, kind, help, labels, sample in self._series():
+            metric = _sanitize(name)
+            if metric != current:
+                current = metric
+                if help:
+                    lines.append(f"# HELP {metric} {help}")
+                lines.append(f"# TYPE {metric} {kind}")
+            if kind == "counter":
+                lines.append(f"{metric}{_format_labels(labels)} {_format_value(sample['value'])}")
+                continue
+            for bound, count in sample["buckets"].items():
+                lines.append(f"{metric}_bucket{_format_labels({**labels, 'le': bound})} {count}")
+            lines.append(f"{metric}_sum{_format_labels(labels)} {_format_value(sample['sum'])}")
+            lines.append(f"{metric}_count{_format_labels(labels)} {sample['count']}")
+        return "\n".join(lines) + "\n" if lines else ""
+
+    def write_ndjson(self, filename: str) -> None:
+        """Appends the snapshot to an NDJSON file."""
+        with open(filename, "a") as f:
+            f.write(self.to_ndjson())
+
+    def write_prometheus(self, filename: str) -> None:
+        """Replaces a Prometheus text file atomically, so a collector never reads half of it."""
+        temporary = filename + ".tmp"
+        with open(temporary, "w") as f:
+            f.write(self.to_prometheus())
+        os.replace(temporary, filename)
+
+
+def _sanitize(name: str) -> str:
+    return re.sub(r"[^a-zA-Z0-9_:]", "_", name)
+
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    pairs = []
+    for key, value in labels.items():
+        value = str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        pairs.append(f'{_sanitize(key)}="{value}"')
+    return "{" + ",".join(pairs) + "}"
+
+
+def _format_value(value: float) -> str:
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+# The registry the smart_home package and the UI report to.
+METRICS = MetricsRegistry()
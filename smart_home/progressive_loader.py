@@ -0,0 +1,140 @@
+import json
+import os
+import queue
+import threading
+from typing import Any, NamedTuple, Optional
+
+from .home import Home, DEVICE_CLASSES
+from .room import Room
+from .scheduler import Scheduler
+from .data_manager import DataManager
+
+
+class LoadUpdate(NamedTuple):
+    """What a call to `ProgressiveLoader.poll` changed."""
+    rooms_added: int  # Rooms attached to the home during this call
+    home_replaced: bool  # Whether `loader.home` is a different object now
+    done: bool  # Whether loading has finished
+
+
+class ProgressiveLoader:
+    """
+    Loads a saved home on a worker thread so it can be shown while it loads.
+
+    JSON files are parsed and turned into Room objects on the worker; the
+    rooms are handed over in chunks and attached to `home` by `poll`, which
+    runs on the caller's thread, so the home is only ever mutated there.
+    Binary and SQLite files are loaded whole on the worker and replace
+    `home` when they are ready.
+    """
+
+    def __init__(self, filename: str, default_name: str = "My Home", chunk_size: int = 25):
+        """
+        Prepares loading; nothing is read until `start`.
+
+        Args:
+            filename: The saved home, in any format DataManager supports.
+            default_name: Name of the home if the file does not exist.
+            chunk_size: Number of rooms handed over at a time.
+        """
+        self.filename = filename
+        self.chunk_size = chunk_size
+        self.home = Home(default_name)
+        self.rooms_loaded = 0
+        self.rooms_total: Optional[int] = None
+        self.done = False
+        self._queue: "queue.Queue[tuple]" = queue.Queue()
+        self._thread = threading.Thread(target=self._load, name="ProgressiveLoader", daemon=True)
+
+    def start(self) -> None:
+        """Starts reading the file on the worker thread."""
+        self._thread.start()
+
+    @property
+    def progress(self) -> Optional[float]:
+        """The fraction of rooms attached so far, or None while the total is unknown."""
+        if self.done:
+            return 1.0
+        if not self.rooms_total:
+            return None
+        return self.rooms_loaded / self.rooms_total
+
+    def poll(self, max_chunks: int = 1, timeout: Optional[float] = None) -> LoadUpdate:
+        """
+        Attaches what the worker has produced so far.
+
+        Args:
+            max_chunks: Most room chunks to attach in this call, to keep it short.
+            timeout: How long to wait for the worker if it has nothing ready yet.
+        """
+        rooms_added, home_replaced, chunks = 0, False, 0
+        block = timeout is not None
+        while not self.done and chunks < max_chunks:
+            try:
+                kind, payload = self._queue.get(block, timeout)
+            except queue.Empty:
+                break
+            block = False
+            if kind == "total":
+                name, self.rooms_total = payload
+                self.home._name = name
+            elif kind == "rooms":
+                for room in payload:
+                    if self.home.get_room_by_name(room.name) is not None:
+                        print(f"Warning: Duplicate room '{room.name}' found. Skipping.")
+                        continue
+                    self.home._attach_room(room)
+                    rooms_added += 1
+                self.rooms_loaded += len(payload)
+                chunks += 1
+            elif kind == "schedulers":
+                for device_id, scheduler_data in payload.items():
+                    device = self.home.get_device_by_id(device_id)
+                    if device and device.is_programmable:
+                        self.home._attach_scheduler(Scheduler.from_dict(scheduler_data, device))
+            elif kind == "home":
+                self.home = payload
+                self.rooms_loaded = self.rooms_total = len(payload.rooms)
+                rooms_added += self.rooms_loaded
+                home_replaced = True
+            elif kind == "done":
+                DataManager._synchronize_id_counters(self.home)
+                self.home.mark_clean()
+                self.done = True
+        return LoadUpdate(rooms_added, home_replaced, self.done)
+
+    def _put(self, kind: str, payload: Any = None) -> None:
+        self._queue.put((kind, payload))
+
+    def _load(self) -> None:
+        """Runs on the worker thread."""
+        try:
+            if not os.path.exists(self.filename):
+                print("No data file found.")
+            elif DataManager.is_binary_file(self.filename) or DataManager.is_sqlite_file(self.filename):
+                home = DataManager.load_home(self.filename)
+                if home is not None:
+                    self._put("home", home)
+            else:
+                self._load_json()
+        except Exception as e:
+            print(f"Error loading home state from '{self.filename}': {e}")
+            print("Starting with a new, empty home due to loading error.")
+            self._put("home", Home("Recovery Home"))
+        self._put("done")
+
+    def _load_json(self) -> None:
+        with open(self.filename, 'r') as f:
+            data = json.load(f)
+        rooms_data = data.get("rooms", [])
+        self._put("total", (data.get("name", "Unnamed Home"), len(rooms_data)))
+        chunk = []
+        for room_data in rooms_data:
+            chunk.append(Room.from_dict(room_data, DEVICE_CLASSES))
+            if len(chunk) >= self.chunk_size:
+                self._put("rooms", chunk)
+                chunk = []
+        if chunk:
+            self._put("rooms", chunk)
+        self._put("schedulers", data.get("schedulers", {}))
+        print(f"Home state successfully loaded from {self.filename}")
@@ -1,5 +1,6 @@
 import datetime
-from typing import List, Dict, Any, Optional
+from array import array
+from typing import List, Dict, Any, Optional, Callable
 from .device import Device
 from .history_log import HistoryLog
 
@@ -12,6 +13,11 @@ class Room(HistoryLog):
             raise ValueError("Room name cannot be empty.")
         self._name = name
         self._devices: Dict[str, Device] = {}
+        self._observers: List[Callable[[str, 'Room', Device], None]] = []
+        self._generation = 0
+        self._clean_generation = 0
+        self._dirty_devices: Dict[str, Device] = {}
+        self._slots: Optional[array] = None
 
     @property
     def name(self) -> str:
@@ -23,11 +29,81 @@ class Room(HistoryLog):
         """Gets a list of devices in the room."""
         return list(self._devices.values())
 
+    @property
+    def generation(self) -> int:
+        """A counter bumped on every membership or device state change."""
+        return self._generation
+
+    @property
+    def is_dirty(self) -> bool:
+        """Whether anything changed since the last `mark_clean`."""
+        return self._generation != self._clean_generation
+
+    def dirty_devices(self) -> List[Device]:
+        """Gets the devices whose state changed since the last `mark_clean`."""
+        return list(self._dirty_devices.values())
+
+    def mark_clean(self) -> None:
+        """Forgets all recorded changes."""
+        self._dirty_devices = {}
+        self._clean_generation = self._generation
+
+    def _on_device_changed(self, device: Device, field: str) -> None:
+        """Records a state change of one of the room's devices."""
+        self._dirty_devices[device.id] = device
+        self._generation += 1
+
+    def add_observer(self, callback: Callable[[str, 'Room', Device], None]) -> None:
+        """
+        Registers a callback for membership changes.
+
+        The callback receives ('device_added' | 'device_removed', room, device).
+        """
+        self._observers.append(callback)
+
+    def remove_observer(self, callback: Callable[[str, 'Room', Device], None]) -> None:
+        """Unregisters a previously added observer."""
+        self._observers.remove(callback)
+
+    def _notify(self, event: str, device: Device) -> None:
+        """Notifies all observers about a membership change."""
+        for callback in list(self._observers):
+            callback(event, self, device)
+
     def add_device(self, device: Device) -> None:
         """Adds a device to the room."""
         if device.id in self._devices:
             raise ValueError(f"Device with ID '{device.id}' already exists in this room.")
         self._devices[device.id] = device
+        device.add_observer(self._on_device_changed)
+        self._slots = None
+        self._generation += 1
+        try:
+            self._notify('device_added', device)
+        except Exception:
+            # An observer rejected the device, e.g. a home that already has its ID.
+            del self._devices[device.id]
+            device.remove_observer(self._on_device_changed)
+            self._slots = None
+            raise
+
+    def remove_device(self, device_id: str) -> Device:
+        """Removes a device from the room and returns it."""
+        device = self._devices.pop(device_id, None)
+        if device is None:
+            raise ValueError(f"Device with ID '{device_id}' does not exist in this room.")
+        device.remove_observer(self._on_device_changed)
+        self._dirty_devices.pop(device_id, None)
+        self._slots = None
+        self._generation += 1
+        self._notify('device_removed', device)
+        return device
+
+    def slots(self) -> array:
+        """Gets the DeviceStore slots of the room's devices, in device order."""
+        if self._slots is None:
+            self._slots = array('i', [device.slot for device in self._devices.values()])
+        return self._slots
 
     def get_device_by_id(self, device_id: str) -> Optional[Device]:
         """Retrieves a device from the room by its ID."""
@@ -68,6 +144,7 @@ class Room(HistoryLog):
                 room.add_device(device_obj)
             else:
                 print(f"Warning: Unknown device type '{device_type}' found. Skipping.")
+        room.mark_clean()
         return room
 
     def __str__(self) -> str:
@@ -0,0 +1,193 @@
+import heapq
+import itertools
+import threading
+import time
+from typing import List, Tuple, Optional, Callable, Any
+from .device import Device
+from .home import Home
+from .scheduler import Scheduler
+from .metrics import METRICS
+
+# (fire_time, sequence, device_id, scheduler_version, seconds_of_week)
+_HeapEntry = Tuple[int, int, str, int, int]
+
+
+class ScheduleRunner:
+    """
+    Executes the events stored in every Scheduler of a Home.
+
+    A single min-heap holds the next fire time of each scheduler, so picking
+    the next due event costs O(log n) no matter how many devices are
+    scheduled. Entries of schedulers that changed since they were pushed are
+    discarded lazily when they reach the top of the heap.
+    """
+
+    def __init__(self, home: Home, clock: Callable[[], float] = time.time,
+                 on_batch: Optional[Callable[[List[Tuple[Device, str]]], None]] = None):
+        """
+        Initializes the runner for a home.
+
+        Args:
+            home: The home whose schedulers should be executed.
+            clock: Returns the current time in seconds since the epoch.
+            on_batch: Optional callback invoked with every batch of fired (device, action) pairs.
+        """
+        self._home = home
+        self._clock = clock
+        self._on_batch = on_batch
+        self._heap: List[_HeapEntry] = []
+        self._sequence = itertools.count()
+        self._cursor = int(clock())
+        self._condition = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+        self._stopped = False
+        self._changed = False  # Set when the heap changed while the thread was not waiting
+
+        for scheduler in home.schedulers:
+            self._track(scheduler)
+        home.add_observer(self._on_home_event)
+
+    @staticmethod
+    def _local_time(local: time.struct_time, offset: int, after: int) -> int:
+        """
+        Returns the first timestamp after `after` that reads as the wall-clock
+        time `offset` seconds past the local Monday 00:00:00 of the week of
+        `local`. It is built from the calendar fields, so DST changes during
+        the week move it with them: a time repeated when clocks go back picks
+        its first occurrence after `after`, and a time skipped when they go
+        forward is moved later by the length of the gap.
+        """
+        days, seconds = divmod(offset, 86400)
+        fields = (local.tm_year, local.tm_mon, local.tm_mday - local.tm_wday + days,
+                  seconds // 3600, seconds // 60 % 60, seconds % 60, 0, 0)
+        candidates = {int(time.mktime(fields + (isdst,))) for isdst in (0, 1)}
+        matching = [t for t in candidates if t > after and time.localtime(t)[3:6] == fields[3:6]]
+        return min(matching) if matching else max(candidates)
+
+    def _push(self, scheduler: Scheduler, after: int) -> None:
+        """Pushes the first fire time of `scheduler` strictly after `after`."""
+        local = time.localtime(after)
+        offset = scheduler.next_event_time(local.tm_wday * 86400 + local.tm_hour * 3600
+                                           + local.tm_min * 60 + local.tm_sec)
+        if offset is not None:
+            entry = (self._local_time(local, offset, after), next(self._sequence), scheduler.device.id,
+                     scheduler.version, offset % Scheduler.SECONDS_PER_WEEK)
+            heapq.heappush(self._heap, entry)
+
+    def _track(self, scheduler: Scheduler) -> None:
+        """Starts following a scheduler and queues its next event."""
+        scheduler.add_observer(self.reschedule)
+        self._push(scheduler, self._cursor)
+
+    def _on_home_event(self, event: str, subject: Any) -> None:
+        """Picks up schedulers created after the runner was started."""
+        if event == 'scheduler_added':
+            with self._condition:
+                self._track(subject)
+                self._changed = True
+                self._condition.notify()
+
+    def reschedule(self, scheduler: Scheduler) -> None:
+        """Re-queues a scheduler after its schedule changed."""
+        with self._condition:
+            self._push(scheduler, self._cursor)
+            self._changed = True
+            self._condition.notify()
+
+    def next_fire_time(self) -> Optional[int]:
+        """Returns the timestamp of the earliest pending event, or None."""
+        with self._condition:
+            self._discard_stale()
+            return self._heap[0][0] if self._heap else None
+
+    def _discard_stale(self) -> None:
+        """Pops heap entries whose scheduler has changed or disappeared."""
+        while self._heap:
+            _, _, device_id, version, _ = self._heap[0]
+            scheduler = self._home.get_scheduler_for_device(device_id)
+            if scheduler is not None and scheduler.version == version:
+                return
+            heapq.heappop(self._heap)
+
+    def run_pending(self, now: Optional[float] = None) -> int:
+        """
+        Fires every event due at or before `now`.
+
+        Events sharing the same second are fired together as one batch.
+
+        Returns:
+            The number of actions executed.
+        """
+        # Home.lock is always taken before the condition: structural changes
+        # hold it while they notify the runner, which takes the condition.
+        with self._home.lock, self._condition:
+            return self._run_pending_locked(int(self._clock() if now is None else now))
+
+    def _run_pending_locked(self, now: int) -> int:
+        executed = 0
+        while True:
+            self._discard_stale()
+            if not self._heap or self._heap[0][0] > now:
+                break
+            fire_time = self._heap[0][0]
+            batch: List[Tuple[Device, str]] = []
+            while self._heap and self._heap[0][0] == fire_time:
+                _, _, device_id, version, offset = heapq.heappop(self._heap)
+                scheduler = self._home.get_scheduler_for_device(device_id)
+                if scheduler is None or scheduler.version != version:
+                    continue
+                batch.extend((scheduler.device, action) for action in scheduler.actions_at(offset))
+                self._push(scheduler, fire_time)
+            self._fire(batch)
+            executed += len(batch)
+            if METRICS.enabled:
+                METRICS.histogram("schedule_dispatch_lag_seconds",
+                                  "Seconds between an event's scheduled time and its execution"
+                                  ).observe(max(0.0, self._clock() - fire_time))
+                METRICS.counter("schedule_actions_total", "Scheduled actions executed").inc(len(batch))
+        self._cursor = max(self._cursor, now)
+        return executed
+
+    def _fire(self, batch: List[Tuple[Device, str]]) -> None:
+        """Applies a batch of actions to their devices; the caller holds the home's lock."""
+        for device, action in batch:
+            if action == 'turn_on':
+                device.turn_on()
+            elif action == 'turn_off':
+                device.turn_off()
+        if batch and self._on_batch:
+            self._on_batch(batch)
+
+    def start(self) -> None:
+        """Starts executing events on a background daemon thread."""
+        if self._thread is not None:
+            return
+        self._stopped = False
+        self._thread = threading.Thread(target=self._run, name="ScheduleRunner", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Stops the background thread and waits for it to finish."""
+        with self._condition:
+            self._stopped = True
+            self._condition.notify()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self) -> None:
+        """Sleeps until the earliest pending event, fires it and repeats."""
+        while True:
+            with self._home.lock, self._condition:
+                if self._stopped:
+                    return
+                self._run_pending_locked(int(self._clock()))
+                self._changed = False
+            # Home.lock is not held while sleeping; changes made in between set _changed.
+            with self._condition:
+                if self._stopped:
+                    return
+                if not self._changed:
+                    self._discard_stale()
+                    timeout = max(0.0, self._heap[0][0] - self._clock()) if self._heap else None
+                    self._condition.wait(timeout)
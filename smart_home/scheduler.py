@@ -1,13 +1,64 @@
 import time
-from typing import List, Dict, Any
+import bisect
+from array import array
+from collections.abc import Sequence
+from typing import List, Dict, Any, Callable, Optional, Iterable, Union, Tuple
 from .device import Device
 
+_WEEK_DAYS = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+_DAY_INDEX = {day: index for index, day in enumerate(_WEEK_DAYS)}
+_ACTIONS = ['turn_on', 'turn_off']
+_ACTION_CODES = {action: code for code, action in enumerate(_ACTIONS)}
+
+EventSpec = Union[Dict[str, Any], Tuple[str, int, int, int, str]]
+
 class InvalidTimeError(ValueError):
     """Custom exception for invalid time values."""
     pass
 
+class ScheduleView(Sequence):
+    """
+    A read-only, list-like view of a Scheduler's events.
+
+    Events are stored compactly inside the scheduler; each item is
+    materialized as a dict with 'day', 'hour', 'minute', 'second' and
+    'action' keys only when accessed.
+    """
+
+    def __init__(self, scheduler: 'Scheduler'):
+        self._scheduler = scheduler
+
+    def __len__(self) -> int:
+        return len(self._scheduler._times)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        times = self._scheduler._times
+        offset = times[index]
+        day, rest = divmod(offset, 86400)
+        hour, rest = divmod(rest, 3600)
+        minute, second = divmod(rest, 60)
+        return {'day': _WEEK_DAYS[day], 'hour': hour, 'minute': minute, 'second': second,
+                'action': _ACTIONS[self._scheduler._actions[index]]}
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, (ScheduleView, list)):
+            return list(self) == list(other)
+        return NotImplemented
+
+    def __repr__(self) -> str:
+        return repr(list(self))
+
+
 class Scheduler:
-    """Schedules on/off events for any programmable device."""
+    """
+    Schedules on/off events for any programmable device.
+
+    Events are kept sorted in two parallel arrays: the seconds elapsed since
+    Monday 00:00:00 and an action code. `schedule` exposes them as dicts.
+    """
+    SECONDS_PER_WEEK = 7 * 24 * 3600
 
     def __init__(self, device: Device):
         """Initializes a Scheduler for a given Device."""
@@ -16,7 +67,10 @@ class Scheduler:
         if not device.is_programmable:
             raise ValueError("Device must be programmable to be scheduled.")
         self._device = device
-        self._schedule: List[Dict[str, Any]] = []
+        self._times = array('i')
+        self._actions = array('b')
+        self._version = 0
+        self._observers: List[Callable[['Scheduler'], None]] = []
 
     @property
     def device(self) -> Device:
@@ -24,26 +78,50 @@ class Scheduler:
         return self._device
 
     @property
-    def schedule(self) -> List[Dict[str, Any]]:
-        """Gets the current schedule."""
-        return self._schedule
+    def schedule(self) -> ScheduleView:
+        """Gets the current schedule as a sequence of event dicts."""
+        return ScheduleView(self)
+
+    @property
+    def version(self) -> int:
+        """A counter bumped every time the schedule changes."""
+        return self._version
+
+    def add_observer(self, callback: Callable[['Scheduler'], None]) -> None:
+        """Registers a callback invoked with this scheduler whenever its schedule changes."""
+        self._observers.append(callback)
+
+    def remove_observer(self, callback: Callable[['Scheduler'], None]) -> None:
+        """Unregisters a previously added observer."""
+        self._observers.remove(callback)
+
+    def _schedule_changed(self) -> None:
+        """Bumps the version and notifies observers."""
+        self._version += 1
+        for callback in list(self._observers):
+            callback(self)
 
     @classmethod
     def get_week_days(cls) -> List[str]:
         """Returns a list of week days in English."""
-        return ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+        return list(_WEEK_DAYS)
 
     @classmethod
     def get_system_time(cls) -> str:
         """Returns the current system time in 'DayOfWeek-HH:MM:SS' format."""
         current_time = time.localtime()
-        day_of_week = cls.get_week_days()[current_time.tm_wday]
+        day_of_week = _WEEK_DAYS[current_time.tm_wday]
         return time.strftime(f"{day_of_week}-%H:%M:%S", current_time)
 
+    @classmethod
+    def seconds_of_week(cls, day: str, hour: int, minute: int, second: int) -> int:
+        """Converts a weekly time to seconds elapsed since Monday 00:00:00."""
+        return _DAY_INDEX[day] * 86400 + hour * 3600 + minute * 60 + second
+
     @staticmethod
     def _validate_event_time(day: str, hour: int, minute: int, second: int):
         """Validates the day, hour, minute, and second for an event."""
-        if day not in Scheduler.get_week_days():
+        if day not in _DAY_INDEX:
             raise InvalidTimeError(f"Invalid day: {day}.")
         if not (0 <= hour <= 23):
             raise InvalidTimeError(f"Invalid hour: {hour}.")
@@ -52,31 +130,112 @@ class Scheduler:
         if not (0 <= second <= 59):
             raise InvalidTimeError(f"Invalid second: {second}.")
 
-    def add_event(self, day: str, hour: int, minute: int, second: int, action: str):
-        """Adds an event to the schedule."""
-        self._validate_event_time(day, hour, minute, second)
-        if action not in ['turn_on', 'turn_off']:
+    @classmethod
+    def _encode_event(cls, day: str, hour: int, minute: int, second: int, action: str) -> Tuple[int, int]:
+        """Validates an event and returns its (seconds_of_week, action_code) pair."""
+        cls._validate_event_time(day, hour, minute, second)
+        if action not in _ACTION_CODES:
             raise ValueError("Action must be 'turn_on' or 'turn_off'.")
-        event = {'day': day, 'hour': hour, 'minute': minute, 'second': second, 'action': action}
-        self._schedule.append(event)
-        self._schedule.sort(key=lambda x: (self.get_week_days().index(x['day']), x['hour'], x['minute'], x['second']))
+        return cls.seconds_of_week(day, hour, minute, second), _ACTION_CODES[action]
+
+    @classmethod
+    def _encode_from_spec(cls, event: EventSpec) -> Tuple[int, int]:
+        """Encodes an event given as a dict or as a (day, hour, minute, second, action) tuple."""
+        if isinstance(event, dict):
+            return cls._encode_event(event['day'], event['hour'], event['minute'],
+                                     event.get('second', 0), event['action'])
+        return cls._encode_event(*event)
+
+    def add_event(self, day: str, hour: int, minute: int, second: int, action: str):
+        """Adds an event to the schedule, keeping it sorted by time of week."""
+        offset, code = self._encode_event(day, hour, minute, second, action)
+        index = bisect.bisect_right(self._times, offset)
+        self._times.insert(index, offset)
+        self._actions.insert(index, code)
+        self._schedule_changed()
+
+    def add_events(self, events: Iterable[EventSpec]) -> None:
+        """
+        Adds many events at once, sorting the schedule only once.
+
+        Each event is either a dict shaped like the items of `schedule` or a
+        (day, hour, minute, second, action) tuple. Nothing is added if any
+        event is invalid.
+        """
+        encoded = [self._encode_from_spec(event) for event in events]
+        if not encoded:
+            return
+        merged = sorted(list(zip(self._times, self._actions)) + encoded, key=lambda pair: pair[0])
+        self._times = array('i', (offset for offset, _ in merged))
+        self._actions = array('b', (code for _, code in merged))
+        self._schedule_changed()
+
+    def set_events(self, events: Iterable[EventSpec]) -> None:
+        """Replaces the whole schedule with the given events (see `add_events`)."""
+        encoded = sorted((self._encode_from_spec(event) for event in events), key=lambda pair: pair[0])
+        self._times = array('i', (offset for offset, _ in encoded))
+        self._actions = array('b', (code for _, code in encoded))
+        self._schedule_changed()
 
     def delete_event(self, event_index: int):
         """Deletes an event from the schedule by its index."""
-        if 0 <= event_index < len(self._schedule):
-            del self._schedule[event_index]
+        if 0 <= event_index < len(self._times):
+            del self._times[event_index]
+            del self._actions[event_index]
+            self._schedule_changed()
         else:
             raise IndexError("Event index out of range.")
 
+    def next_event_time(self, after: int) -> Optional[int]:
+        """
+        Returns the seconds-of-week of the first event strictly after `after`.
+
+        Events earlier in the week wrap around and are returned offset by
+        SECONDS_PER_WEEK. Returns None if the schedule is empty.
+        """
+        if not self._times:
+            return None
+        index = bisect.bisect_right(self._times, after)
+        if index < len(self._times):
+            return self._times[index]
+        return self._times[0] + self.SECONDS_PER_WEEK
+
+    def actions_at(self, offset: int) -> List[str]:
+        """Returns the actions of all events at the given seconds-of-week, in order."""
+        offset %= self.SECONDS_PER_WEEK
+        start = bisect.bisect_left(self._times, offset)
+        end = bisect.bisect_right(self._times, offset, start)
+        return [_ACTIONS[code] for code in self._actions[start:end]]
+
+    def event_arrays(self) -> Tuple[array, array]:
+        """Returns copies of the sorted seconds-of-week and action-code arrays."""
+        return array('i', self._times), array('b', self._actions)
+
     def to_dict(self) -> Dict[str, Any]:
         """Serializes the Scheduler to a dictionary."""
-        return {"schedule": self._schedule}
+        return {"schedule": list(self.schedule)}
 
     @classmethod
     def from_dict(cls, data: Dict[str, Any], device: Device) -> 'Scheduler':
-        """Deserializes a Scheduler from a dictionary."""
+        """Deserializes a Scheduler from a dictionary, skipping stored events that are invalid."""
+        encoded = []
+        for event in data.get("schedule", []):
+            try:
+                encoded.append(cls._encode_from_spec(event))
+            except (ValueError, KeyError, TypeError) as e:
+                print(f"Warning: Skipping invalid event {event!r} of device '{device.id}': {e}")
+        encoded.sort(key=lambda pair: pair[0])
+        return cls.from_arrays(device, array('i', (offset for offset, _ in encoded)),
+                               array('b', (code for _, code in encoded)))
+
+    @classmethod
+    def from_arrays(cls, device: Device, times: array, actions: array) -> 'Scheduler':
+        """Creates a Scheduler from arrays previously returned by `event_arrays`."""
+        if len(times) != len(actions):
+            raise ValueError("Event time and action arrays must have the same length.")
         scheduler = cls(device)
-        scheduler._schedule = data.get("schedule", [])
+        scheduler._times = array('i', times)
+        scheduler._actions = array('b', actions)
         return scheduler
 
     def __str__(self):
@@ -84,7 +243,7 @@ class Scheduler:
         # Accessing device.name which is available on SmartBulb and AirConditioner
         device_name = getattr(self._device, 'name', self._device.id)
         schedule_str = "\n".join([f"  {i+1}: {e['day']} {e['hour']:02d}:{e['minute']:02d}:{e['second']:02d} - {e['action'].replace('_', ' ').title()}"
-                                 for i, e in enumerate(self._schedule)]) if self._schedule else "  No events scheduled."
+                                 for i, e in enumerate(self.schedule)]) if self._times else "  No events scheduled."
         return (f"{header}\n"
                 f"SCHEDULER for {device_name}\n"
                 f"Current System Time: {self.get_system_time()}\n"
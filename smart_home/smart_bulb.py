@@ -1,9 +1,43 @@
 import itertools
-from typing import Dict, Any, Optional
+from collections.abc import Mapping
+from typing import Dict, Any, Optional, Iterator
 from .device import Device
 
+WHITE = 0xFFFFFF
+
+
+def pack_color(r: int, g: int, b: int) -> int:
+    """Packs an RGB triple into a 24-bit 0xRRGGBB integer, clamping each channel to 0-255."""
+    if (r | g | b) & ~0xFF:
+        r, g, b = (min(max(channel, 0), 255) for channel in (r, g, b))
+    return (r << 16) | (g << 8) | b
+
+
+class ColorView(Mapping):
+    """A read-only {'r', 'g', 'b'} mapping over a packed 24-bit color."""
+    __slots__ = ('_packed',)
+    _KEYS = ('r', 'g', 'b')
+    _SHIFTS = {'r': 16, 'g': 8, 'b': 0}
+
+    def __init__(self, packed: int):
+        self._packed = packed
+
+    def __getitem__(self, key: str) -> int:
+        return (self._packed >> self._SHIFTS[key]) & 0xFF
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._KEYS)
+
+    def __len__(self) -> int:
+        return 3
+
+    def __repr__(self) -> str:
+        return repr(dict(self))
+
+
 class SmartBulb(Device):
     """Represents a smart bulb, a concrete implementation of a Device."""
+    __slots__ = ('_name', '_is_programmable_flag')
     _id_counter = itertools.count()
     DEFAULT_INTENSITY_INCREMENT = 10
 
@@ -13,10 +47,18 @@ class SmartBulb(Device):
         self._name = name
         self._is_programmable_flag = is_programmable
         
-        if isinstance(color, dict) and all(k in color for k in ['r', 'g', 'b']):
-            self._color = color
+        if isinstance(color, Mapping) and all(k in color for k in ['r', 'g', 'b']):
+            self._color = pack_color(color['r'], color['g'], color['b'])
         else:
-            self._color = {'r': 255, 'g': 255, 'b': 255}
+            self._color = WHITE
+
+    @property
+    def _color(self) -> int:
+        return self.store.color[self._slot]
+
+    @_color.setter
+    def _color(self, value: int) -> None:
+        self.store.color[self._slot] = value
 
     @property
     def name(self) -> str:
@@ -29,8 +71,13 @@ class SmartBulb(Device):
         return self._is_programmable_flag
 
     @property
-    def color(self) -> Dict[str, int]:
-        """Gets the current RGB color of the bulb."""
+    def color(self) -> ColorView:
+        """Gets the current RGB color of the bulb as an {'r', 'g', 'b'} mapping."""
+        return ColorView(self._color)
+
+    @property
+    def packed_color(self) -> int:
+        """Gets the current color as a 0xRRGGBB integer."""
         return self._color
 
     def increase_intensity(self, amount: Optional[int] = None) -> None:
@@ -38,28 +85,32 @@ class SmartBulb(Device):
         increment = amount if amount else self.DEFAULT_INTENSITY_INCREMENT
         new_intensity = self._intensity + increment
         if new_intensity > self._max_intensity:
-            self._intensity = self._max_intensity
+            self._update_intensity(self._max_intensity)
         else:
-            self._intensity = new_intensity
+            self._update_intensity(new_intensity)
 
     def decrease_intensity(self, amount: Optional[int] = None) -> None:
         """Decreases the bulb's intensity."""
         decrement = amount if amount else self.DEFAULT_INTENSITY_INCREMENT
         new_intensity = self._intensity - decrement
         if new_intensity < self._min_intensity:
-            self._intensity = self._min_intensity
+            self._update_intensity(self._min_intensity)
         else:
-            self._intensity = new_intensity
+            self._update_intensity(new_intensity)
 
     def change_color(self, r: int, g: int, b: int) -> None:
         """Changes the RGB color of the bulb."""
         if not all(0 <= val <= 255 for val in [r, g, b]):
             raise ValueError("Color values must be between 0 and 255.")
-        self._color = {'r': r, 'g': g, 'b': b}
+        packed = pack_color(r, g, b)
+        if packed != self._color:
+            self._color = packed
+            self._notify('color')
 
     def __str__(self) -> str:
         status_str = "ON" if self.status else "OFF"
-        color_str = f"RGB({self._color.get('r', 0)}, {self._color.get('g', 0)}, {self._color.get('b', 0)})"
+        color = self.color
+        color_str = f"RGB({color['r']}, {color['g']}, {color['b']})"
         return (f"Device: {self.name} ({self.id}) | Type: Smart Bulb | Status: {status_str} | "
                 f"Intensity: {self.intensity}% | Color: {color_str}")
 
@@ -69,7 +120,7 @@ class SmartBulb(Device):
         data.update({
             "name": self.name,
             "is_programmable": self.is_programmable,
-            "color": self.color
+            "color": dict(self.color)
         })
         return data
 
@@ -0,0 +1,313 @@
+import sqlite3
+import threading
+from array import array
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from .home import Home, DEVICE_CLASSES
+from .room import Room
+from .device import Device
+from .scheduler import Scheduler
+from .smart_bulb import ColorView
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS homes (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS rooms (
+    id INTEGER PRIMARY KEY,
+    home_id INTEGER NOT NULL REFERENCES homes(id),
+    name TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    UNIQUE (home_id, name)
+);
+CREATE TABLE IF NOT EXISTS devices (
+    id TEXT NOT NULL,
+    home_id INTEGER NOT NULL REFERENCES homes(id),
+    room_id INTEGER NOT NULL REFERENCES rooms(id),
+    position INTEGER NOT NULL,
+    type TEXT NOT NULL,
+    name TEXT NOT NULL,
+    is_programmable INTEGER NOT NULL,
+    status INTEGER NOT NULL,
+    intensity INTEGER NOT NULL,
+    color INTEGER,
+    PRIMARY KEY (home_id, id)
+);
+CREATE INDEX IF NOT EXISTS devices_by_room ON devices (room_id, position);
+CREATE TABLE IF NOT EXISTS schedule_events (
+    home_id INTEGER NOT NULL,
+    device_id TEXT NOT NULL,
+    seconds_of_week INTEGER NOT NULL,
+    action INTEGER NOT NULL,
+    position INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS events_by_device ON schedule_events (home_id, device_id, position);
+"""
+
+# Statements are kept as module constants so sqlite3's statement cache reuses
+# the prepared form on every call.
+UPDATE_STATUS_SQL = "UPDATE devices SET status = ? WHERE home_id = ? AND id = ?"
+UPDATE_INTENSITY_SQL = "UPDATE devices SET intensity = ? WHERE home_id = ? AND id = ?"
+UPDATE_COLOR_SQL = "UPDATE devices SET color = ? WHERE home_id = ? AND id = ?"
+UPDATE_STATE_SQL = "UPDATE devices SET status = ?, intensity = ?, color = ? WHERE home_id = ? AND id = ?"
+UPSERT_DEVICE_SQL = """
+INSERT INTO devices (id, home_id, room_id, position, type, name, is_programmable, status, intensity, color)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (home_id, id) DO UPDATE SET
+    room_id = excluded.room_id, position = excluded.position, type = excluded.type, name = excluded.name,
+    is_programmable = excluded.is_programmable, status = excluded.status,
+    intensity = excluded.intensity, color = excluded.color
+"""
+INSERT_ROOM_SQL = "INSERT OR IGNORE INTO rooms (home_id, name, position) VALUES (?, ?, ?)"
+INSERT_EVENT_SQL = "INSERT INTO schedule_events (home_id, device_id, seconds_of_week, action, position) VALUES (?, ?, ?, ?, ?)"
+DELETE_EVENTS_SQL = "DELETE FROM schedule_events WHERE home_id = ? AND device_id = ?"
+DELETE_DEVICE_SQL = "DELETE FROM devices WHERE home_id = ? AND id = ?"
+
+
+# (id, type name, name, is_programmable, status, intensity, packed color or None)
+DeviceRow = Tuple[str, str, str, bool, bool, int, Optional[int]]
+# (device id, its (seconds_of_week, action_code) events in order)
+ScheduleRow = Tuple[str, Sequence[Tuple[int, int]]]
+
+
+def _pack_color(device: Device) -> Optional[int]:
+    return getattr(device, 'packed_color', None)
+
+
+class SQLiteStore:
+    """
+    Stores a Home in an SQLite database, one row per room, device and event.
+
+    When attached to a home, every device change updates only that device's
+    row, so changing one bulb no longer rewrites the whole home. The
+    database runs in WAL mode, so other processes can read it while the
+    application writes.
+    """
+
+    def __init__(self, filename: str, home_id: int = 1, autocommit: bool = True):
+        """
+        Opens (and if needed creates) the database.
+
+        Args:
+            filename: Path of the SQLite database file.
+            home_id: Which home in the database this store reads and writes.
+            autocommit: Whether every attached change is committed immediately.
+        """
+        self.filename = filename
+        self.home_id = home_id
+        self.autocommit = autocommit
+        self._home: Optional[Home] = None
+        self._lock = threading.RLock()
+        # The schedule runner fires devices from its own thread; access is serialized by _lock.
+        self._connection = sqlite3.connect(filename, check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.executescript(SCHEMA)
+        self._room_ids: Dict[str, int] = {}
+
+    def close(self) -> None:
+        """Detaches from the home, commits pending changes and closes the database."""
+        self.detach()
+        with self._lock:
+            self._connection.commit()
+            self._connection.close()
+
+    def commit(self) -> None:
+        """Commits pending changes."""
+        with self._lock:
+            self._connection.commit()
+
+    def has_home(self) -> bool:
+        """Whether the database contains this store's home."""
+        with self._lock:
+            row = self._connection.execute("SELECT 1 FROM homes WHERE id = ?", (self.home_id,)).fetchone()
+        return row is not None
+
+    def save_home(self, home: Home) -> None:
+        """Replaces the stored home with a full copy of `home`."""
+        self.save_rooms(home.name, ((room.name, [self._device_values(device) for device in room.devices],
+                                     self._room_schedules(home, room)) for room in home.rooms))
+
+    def save_rooms(self, home_name: str, rooms: Iterable[Tuple[str, Sequence[DeviceRow], Iterable[ScheduleRow]]]) -> None:
+        """
+        Replaces the stored home with plain rows, one room at a time.
+
+        Each room is a (name, devices, schedules) tuple, so a home can be
+        written without ever being built in memory. Everything is written
+        in one transaction.
+        """
+        with self._lock, self._connection:
+            cursor = self._connection.cursor()
+            for table in ("schedule_events", "devices", "rooms"):
+                cursor.execute(f"DELETE FROM {table} WHERE home_id = ?", (self.home_id,))
+            cursor.execute("INSERT OR REPLACE INTO homes (id, name) VALUES (?, ?)", (self.home_id, home_name))
+            self._room_ids = {}
+            for position, (room_name, devices, schedules) in enumerate(rooms):
+                self._insert_room(cursor, room_name, position)
+                room_id = self._room_id(room_name)
+                cursor.executemany(UPSERT_DEVICE_SQL, (
+                    (device_id, self.home_id, room_id, device_position, device_type, name, int(is_programmable),
+                     int(status), intensity, color)
+                    for device_position, (device_id, device_type, name, is_programmable, status, intensity, color)
+                    in enumerate(devices)))
+                for device_id, events in schedules:
+                    cursor.executemany(INSERT_EVENT_SQL, ((self.home_id, device_id, offset, action, event_position)
+                                                          for event_position, (offset, action) in enumerate(events)))
+
+    def load_home(self) -> Optional[Home]:
+        """Loads the stored home with one bulk SELECT per table, or None if there is none."""
+        with self._lock:
+            connection = self._connection
+            row = connection.execute("SELECT name FROM homes WHERE id = ?", (self.home_id,)).fetchone()
+            if row is None:
+                return None
+            home = Home(row[0])
+
+            rooms: Dict[int, Room] = {}
+            self._room_ids = {}
+            for room_id, name in connection.execute(
+                    "SELECT id, name FROM rooms WHERE home_id = ? ORDER BY position", (self.home_id,)):
+                rooms[room_id] = Room(name)
+                self._room_ids[name] = room_id
+
+            for (device_id, room_id, device_type, name, programmable, status, intensity,
+                 color) in connection.execute(
+                    "SELECT id, room_id, type, name, is_programmable, status, intensity, color "
+                    "FROM devices WHERE home_id = ? ORDER BY room_id, position", (self.home_id,)):
+                device_class = DEVICE_CLASSES.get(device_type)
+                if device_class is None:
+                    print(f"Warning: Unknown device type '{device_type}' found. Skipping.")
+                    continue
+                data: Dict[str, Any] = {"id": device_id, "name": name, "type": device_type,
+                                        "is_programmable": bool(programmable),
+                                        "status": bool(status), "intensity": intensity}
+                if color is not None:
+                    data["color"] = ColorView(color)
+                rooms[room_id].add_device(device_class.from_dict(data))
+
+            for room in rooms.values():
+                home._attach_room(room)
+
+            events: Dict[str, List[tuple]] = {}
+            for device_id, offset, action in connection.execute(
+                    "SELECT device_id, seconds_of_week, action FROM schedule_events "
+                    "WHERE home_id = ? ORDER BY device_id, position", (self.home_id,)):
+                events.setdefault(device_id, []).append((offset, action))
+            for device in home.query(programmable=True):
+                device_events = events.get(device.id, [])
+                scheduler = Scheduler.from_arrays(device, array('i', (e[0] for e in device_events)),
+                                                  array('b', (e[1] for e in device_events)))
+                home._attach_scheduler(scheduler)
+        home.mark_clean()
+        return home
+
+    def attach(self, home: Home) -> None:
+        """Starts writing every mutation of `home` to its own row(s)."""
+        self._home = home
+        home.add_observer(self._on_home_event)
+
+    def detach(self) -> None:
+        """Stops following the attached home."""
+        if self._home is not None:
+            self._home.remove_observer(self._on_home_event)
+            self._home = None
+
+    def update_device_status(self, device: Device) -> None:
+        """Writes one device's on/off status."""
+        self._execute(UPDATE_STATUS_SQL, (int(device.status), self.home_id, device.id))
+
+    def update_device_intensity(self, device: Device) -> None:
+        """Writes one device's intensity (temperature for air conditioners)."""
+        self._execute(UPDATE_INTENSITY_SQL, (device.intensity, self.home_id, device.id))
+
+    def update_device_color(self, device: Device) -> None:
+        """Writes one bulb's color."""
+        self._execute(UPDATE_COLOR_SQL, (_pack_color(device), self.home_id, device.id))
+
+    def update_device_states(self, devices: List[Device]) -> None:
+        """Writes status, intensity and color of many devices in one transaction."""
+        with self._lock, self._connection:
+            self._connection.executemany(UPDATE_STATE_SQL, ((int(device.status), device.intensity, _pack_color(device),
+                                                             self.home_id, device.id) for device in devices))
+
+    def upsert_device(self, device: Device, room_name: str) -> None:
+        """Inserts or fully rewrites one device row."""
+        with self._lock:
+            position = self._connection.execute(
+                "SELECT COALESCE(MAX(position) + 1, 0) FROM devices WHERE home_id = ? AND room_id = ?",
+                (self.home_id, self._room_id(room_name))).fetchone()[0]
+            self._execute(UPSERT_DEVICE_SQL, self._device_row(device, room_name, position))
+
+    def _execute(self, sql: str, parameters: tuple) -> None:
+        with self._lock:
+            self._connection.execute(sql, parameters)
+            if self.autocommit:
+                self._connection.commit()
+
+    def _on_home_event(self, event: str, subject: Any) -> None:
+        """Translates a home change into single-row updates."""
+        if event == 'device_changed':
+            device, field = subject
+            if field == 'status':
+                self.update_device_status(device)
+            elif field == 'intensity':
+                self.update_device_intensity(device)
+            elif field == 'color':
+                self.update_device_color(device)
+        elif event == 'device_added':
+            self.upsert_device(subject, self._home.get_room_of_device(subject.id).name)
+        elif event == 'device_removed':
+            with self._lock:
+                self._connection.execute(DELETE_EVENTS_SQL, (self.home_id, subject.id))
+                self._execute(DELETE_DEVICE_SQL, (self.home_id, subject.id))
+        elif event == 'room_added':
+            with self._lock:
+                position = self._connection.execute(
+                    "SELECT COALESCE(MAX(position) + 1, 0) FROM rooms WHERE home_id = ?", (self.home_id,)).fetchone()[0]
+                self._insert_room(self._connection.cursor(), subject.name, position)
+                if self.autocommit:
+                    self._connection.commit()
+        elif event == 'schedule_changed':
+            with self._lock:
+                self._write_schedule(self._connection.cursor(), subject)
+                if self.autocommit:
+                    self._connection.commit()
+
+    def _insert_room(self, cursor: sqlite3.Cursor, name: str, position: int) -> None:
+        cursor.execute(INSERT_ROOM_SQL, (self.home_id, name, position))
+        self._room_ids.pop(name, None)
+
+    def _room_id(self, room_name: str) -> int:
+        room_id = self._room_ids.get(room_name)
+        if room_id is None:
+            room_id = self._connection.execute("SELECT id FROM rooms WHERE home_id = ? AND name = ?",
+                                               (self.home_id, room_name)).fetchone()[0]
+            self._room_ids[room_name] = room_id
+        return room_id
+
+    @staticmethod
+    def _device_values(device: Device) -> DeviceRow:
+        return (device.id, type(device).__name__, device.name, device.is_programmable, device.status,
+                device.intensity, _pack_color(device))
+
+    @staticmethod
+    def _room_schedules(home: Home, room: Room) -> List[ScheduleRow]:
+        schedules = []
+        for device in room.devices:
+            scheduler = home.get_scheduler_for_device(device.id)
+            if scheduler is not None:
+                times, actions = scheduler.event_arrays()
+                schedules.append((device.id, list(zip(times, actions))))
+        return schedules
+
+    def _device_row(self, device: Device, room_name: str, position: int) -> tuple:
+        return (device.id, self.home_id, self._room_id(room_name), position, type(device).__name__, device.name,
+                int(device.is_programmable), int(device.status), device.intensity, _pack_color(device))
+
+    def _write_schedule(self, cursor: sqlite3.Cursor, scheduler: Scheduler) -> None:
+        device_id = scheduler.device.id
+        times, actions = scheduler.event_arrays()
+        cursor.execute(DELETE_EVENTS_SQL, (self.home_id, device_id))
+        cursor.executemany(INSERT_EVENT_SQL, ((self.home_id, device_id, offset, action, position)
+                                              for position, (offset, action) in enumerate(zip(times, actions))))
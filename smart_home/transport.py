@@ -0,0 +1,214 @@
+import asyncio
+import itertools
+import json
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+from .gateway import CommandRejectedError, DeviceCommand
+
+
+def encode_frame(frame_id: int, commands: List[DeviceCommand]) -> bytes:
+    """A frame of the bridge protocol: several commands in one line, answered with one result each."""
+    frame = {"id": frame_id, "commands": [command.to_dict() for command in commands]}
+    return json.dumps(frame, separators=(',', ':')).encode() + b"\n"
+
+
+class BridgeConnection:
+    """
+    One persistent connection to a bridge.
+
+    Commands queued while a frame is being written go into the next frame,
+    and frames are written without waiting for the answers to earlier ones.
+    The connection is opened on first use and again after it was lost.
+    """
+
+    def __init__(self, host: str, port: int, max_batch: int = 64):
+        self.host = host
+        self.port = port
+        self.max_batch = max_batch
+        self._reader: Optional[asyncio.StreamReader] = None
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._tasks: List[asyncio.Task] = []
+        self._connect_lock = asyncio.Lock()
+        self._outgoing: Deque[Tuple[DeviceCommand, asyncio.Future]] = deque()
+        self._ready = asyncio.Event()
+        # Frame id to the time it was written and the futures of its commands
+        self._in_flight: Dict[int, Tuple[float, List[asyncio.Future]]] = {}
+        self._frame_ids = itertools.count(1)
+        self.queue_depth = 0  # Commands sent to this connection and not answered yet
+        self.connects = 0
+        self.frames = 0
+        self.commands = 0
+        self.answered_frames = 0
+        self._rtt_total = 0.0
+        self.rtt_max = 0.0
+        self.rtt_last = 0.0
+
+    @property
+    def connected(self) -> bool:
+        return self._writer is not None and not self._writer.is_closing()
+
+    async def send(self, command: DeviceCommand) -> None:
+        """Sends a command and waits for its answer."""
+        self.queue_depth += 1
+        try:
+            if not self.connected:
+                await self._connect()
+            future = asyncio.get_running_loop().create_future()
+            self._outgoing.append((command, future))
+            self._ready.set()
+            await future
+        finally:
+            self.queue_depth -= 1
+
+    async def _connect(self) -> None:
+        async with self._connect_lock:
+            if self.connected:
+                return
+            self._reader, self._writer = await asyncio.open_connection(self.host, self.port)
+            self.connects += 1
+            self._tasks = [asyncio.create_task(self._write_frames(self._writer)),
+                           asyncio.create_task(self._read_answers(self._reader))]
+
+    async def _write_frames(self, writer: asyncio.StreamWriter) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            await self._ready.wait()
+            self._ready.clear()
+            while self._outgoing:
+                batch = []
+                while self._outgoing and len(batch) < self.max_batch:
+                    command, future = self._outgoing.popleft()
+                    # Commands whose sender gave up (e.g. timed out) are not sent.
+                    if not future.done():
+                        batch.append((command, future))
+                if not batch:
+                    continue
+                frame_id = next(self._frame_ids)
+                self._in_flight[frame_id] = (loop.time(), [future for _, future in batch])
+                writer.write(encode_frame(frame_id, [command for command, _ in batch]))
+                self.frames += 1
+                self.commands += len(batch)
+            self._forget_abandoned()
+            try:
+                await writer.drain()
+            except OSError as e:
+                self._fail(e)
+                return
+
+    def _forget_abandoned(self) -> None:
+        """Drops frames the bridge never answered once all their senders gave up."""
+        for frame_id in [frame_id for frame_id, (_, futures) in self._in_flight.items()
+                         if all(future.done() for future in futures)]:
+            del self._in_flight[frame_id]
+
+    async def _read_answers(self, reader: asyncio.StreamReader) -> None:
+        loop = asyncio.get_running_loop()
+        futures: List[asyncio.Future] = []  # Of the frame being answered, no longer in _in_flight
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    raise ConnectionError("The bridge closed the connection.")
+                response = json.loads(line)
+                entry = self._in_flight.pop(response["id"], None)
+                if entry is None:
+                    continue
+                sent, futures = entry
+                self.rtt_last = loop.time() - sent
+                self.rtt_max = max(self.rtt_max, self.rtt_last)
+                self._rtt_total += self.rtt_last
+                self.answered_frames += 1
+                results = response["results"]
+                for future, result in zip(futures, results):
+                    if future.done():
+                        continue
+                    if result.get("ok"):
+                        future.set_result(None)
+                    else:
+                        future.set_exception(CommandRejectedError(result.get("error", "Command rejected.")))
+                if len(results) < len(futures):
+                    raise ConnectionError(f"The bridge answered {len(results)} of the {len(futures)} "
+                                          f"commands of frame {response['id']}.")
+                futures = []
+        except (OSError, ValueError, KeyError, TypeError, AttributeError) as e:
+            # zip stops at the shorter sequence, so commands past a short or broken answer are failed here.
+            self._fail(e, futures)
+
+    def _fail(self, error: Exception, futures: Optional[List[asyncio.Future]] = None) -> None:
+        """Fails every unanswered command, and `futures`; the next send reconnects."""
+        if not isinstance(error, ConnectionError):
+            error = ConnectionError(f"Lost the connection to the bridge: {error!r}")
+        futures = list(futures or [])
+        futures.extend(future for _, future in self._outgoing)
+        for _, frame_futures in self._in_flight.values():
+            futures.extend(frame_futures)
+        self._outgoing.clear()
+        self._in_flight.clear()
+        for future in futures:
+            if not future.done():
+                future.set_exception(error)
+        self._close_socket()
+
+    def _close_socket(self) -> None:
+        current = asyncio.current_task()
+        for task in self._tasks:
+            if task is not current:
+                task.cancel()
+        self._tasks = []
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+    async def close(self) -> None:
+        tasks = self._tasks
+        self._fail(ConnectionError("The connection was closed."))
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "connected": self.connected,
+            "queue_depth": self.queue_depth,
+            "connects": self.connects,
+            "frames": self.frames,
+            "commands": self.commands,
+            "mean_batch": self.commands / self.frames if self.frames else 0.0,
+            "mean_rtt": self._rtt_total / self.answered_frames if self.answered_frames else 0.0,
+            "max_rtt": self.rtt_max,
+            "last_rtt": self.rtt_last,
+        }
+
+
+class PooledTransport:
+    """
+    Sends commands over a pool of pipelined connections to a bridge.
+
+    Each command goes to the connection with the fewest unanswered commands,
+    so a slow frame on one connection does not hold up the others.
+    """
+
+    def __init__(self, host: str, port: int, connections: int = 4, max_batch: int = 64):
+        """
+        Initializes the pool; connections are opened on first use.
+
+        Args:
+            host: Address of the bridge.
+            port: Port of the bridge.
+            connections: Number of connections kept open.
+            max_batch: Most commands packed into one frame.
+        """
+        if connections < 1:
+            raise ValueError("A pool needs at least one connection.")
+        self.connections = [BridgeConnection(host, port, max_batch) for _ in range(connections)]
+
+    async def send(self, command: DeviceCommand) -> None:
+        connection = min(self.connections, key=lambda connection: connection.queue_depth)
+        await connection.send(command)
+
+    async def close(self) -> None:
+        for connection in self.connections:
+            await connection.close()
+
+    def stats(self) -> List[Dict[str, Any]]:
+        """Queue depth, frame and round-trip statistics of every connection."""
+        return [connection.stats() for connection in self.connections]
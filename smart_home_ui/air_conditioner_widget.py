@@ -31,8 +31,17 @@ class AirConditionerWidget(DeviceWidget):
 
 
     def update_temperature(self, value):
-        self.device.set_temperature(int(float(value)))
-        self.update_widget()
+        # Called for every pixel of a drag; only the last value of a frame reaches the device.
+        temperature = int(float(value))
+        self.temp_display_var.set(f"{temperature}°C")
+        device = self.device
+        self.controller.render_scheduler.schedule(self, (self, 'temperature'),
+                                                  lambda: self._commit_temperature(device, temperature))
+
+    def _commit_temperature(self, device, temperature):
+        device.set_temperature(temperature)
+        if device is self.device and self.winfo_exists():
+            self.update_widget()
 
     def update_widget(self):
         super().update_widget()
@@ -13,13 +13,28 @@ class DeviceWidget(ttk.Frame):
         self._create_widgets()
 
     def _create_widgets(self):
-        self.name_label = ttk.Label(self, text=self.device.name)
+        self.name_label = ttk.Label(self, text=self._display_name())
         self.name_label.grid(row=0, column=0, sticky="w")
 
         self.on_off_var = tk.BooleanVar(value=self.device.status)
         on_off_switch = ttk.Checkbutton(self, text="On/Off", variable=self.on_off_var, command=self.toggle_power)
         on_off_switch.grid(row=0, column=1, sticky="e")
 
+    def _display_name(self):
+        return self.device.name
+
+    def bind_device(self, device: Device):
+        """Shows another device of the same type in this widget."""
+        self.controller.render_scheduler.run_widget(self)
+        self.device = device
+        self.name_label.config(text=self._display_name())
+        self.update_widget()
+
+    def destroy(self):
+        # Commits the last slider value before the widget is gone.
+        self.controller.render_scheduler.run_widget(self)
+        super().destroy()
+
     def toggle_power(self):
         if self.on_off_var.get():
             self.device.turn_on()
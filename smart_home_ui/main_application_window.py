@@ -1,7 +1,8 @@
 import tkinter as tk
 from tkinter import ttk
 import sv_ttk
-from .room_frame import RoomFrame
+from smart_home.metrics import METRICS
+from .room_grid import RoomGrid
 from .add_room_dialog import AddRoomDialog
 from .schedule_manager_dialog import ScheduleManagerDialog
 
@@ -24,50 +25,75 @@ class MainApplicationWindow(tk.Tk):
         control_frame = ttk.Frame(main_frame)
         control_frame.pack(fill=tk.X, pady=(0, 10))
 
-        ttk.Button(control_frame, text="Add New Room", command=self._open_add_room_dialog).pack(side=tk.LEFT, padx=5)
-        ttk.Button(control_frame, text="Manage Schedules", command=self._manage_schedules).pack(side=tk.LEFT, padx=5)
-        ttk.Button(control_frame, text="Save and Exit", command=self._save_and_exit).pack(side=tk.RIGHT, padx=5)
+        # Disabled until the home has finished loading
+        self.load_dependent_buttons = [
+            ttk.Button(control_frame, text="Add New Room", command=self._open_add_room_dialog, state=tk.DISABLED),
+            ttk.Button(control_frame, text="Manage Schedules", command=self._manage_schedules, state=tk.DISABLED),
+        ]
+        for button in self.load_dependent_buttons:
+            button.pack(side=tk.LEFT, padx=5)
+        save_button = ttk.Button(control_frame, text="Save and Exit", command=self._save_and_exit, state=tk.DISABLED)
+        save_button.pack(side=tk.RIGHT, padx=5)
+        self.load_dependent_buttons.append(save_button)
         ttk.Button(control_frame, text="Exit Without Saving", command=self._exit_without_saving).pack(side=tk.RIGHT, padx=5)
 
-        self.canvas = tk.Canvas(main_frame)
-        self.scrollbar = ttk.Scrollbar(main_frame, orient="vertical", command=self.canvas.yview)
-        self.scrollable_frame = ttk.Frame(self.canvas)
-
-        self.scrollable_frame.bind(
-            "<Configure>",
-            lambda e: self.canvas.configure(
-                scrollregion=self.canvas.bbox("all")
-            )
-        )
-
-        self.canvas.create_window((0, 0), window=self.scrollable_frame, anchor="nw")
-        self.canvas.configure(yscrollcommand=self.scrollbar.set)
-
-        self.canvas.pack(side="left", fill="both", expand=True)
-        self.scrollbar.pack(side="right", fill="y")
+        self.progress_label = ttk.Label(control_frame, text="Loading...")
+        self.progress_label.pack(side=tk.LEFT, padx=(20, 5))
+        self.progress_bar = ttk.Progressbar(control_frame, mode="indeterminate", length=200)
+        self.progress_bar.pack(side=tk.LEFT, padx=5)
+        self.progress_bar.start()
+
+        self.room_grid = RoomGrid(main_frame, self.controller)
+        self.room_grid.pack(fill="both", expand=True)
+
+    def show_progress(self, fraction):
+        if fraction is None:
+            return
+        if self.progress_bar["mode"] != "determinate":
+            self.progress_bar.stop()
+            self.progress_bar.configure(mode="determinate", maximum=100)
+        self.progress_bar["value"] = fraction * 100
+        self.progress_label.config(text=f"Loading... {fraction:.0%}")
+
+    def finish_loading(self):
+        self.progress_bar.stop()
+        self.progress_bar.pack_forget()
+        self.progress_label.pack_forget()
+        for button in self.load_dependent_buttons:
+            button.config(state=tk.NORMAL)
 
     def refresh_rooms(self):
-        for widget in self.scrollable_frame.winfo_children():
-            widget.destroy()
-
-        self.room_frames = []
-        rooms = self.controller.get_rooms()
-        
-        columns = 3
-        for i in range(columns):
-            self.scrollable_frame.columnconfigure(i, weight=1)
-
-        for i, room in enumerate(rooms):
-            row = i // columns
-            col = i % columns
-            
-            room_frame = RoomFrame(self.scrollable_frame, room, self.controller)
-            room_frame.grid(row=row, column=col, padx=5, pady=5, sticky="nsew")
-            self.room_frames.append(room_frame)
+        with METRICS.timer("ui_rebuild_seconds", "Seconds spent rebuilding views", view="rooms"):
+            self.room_grid.set_rooms(self.controller.get_rooms())
+
+    @property
+    def room_frames(self):
+        """The RoomFrames currently built, by room name; rooms out of view have none."""
+        return self.room_grid.room_frames
+
+    def apply_changes(self, events):
+        """Updates only the frames and widgets touched by a list of coalesced ChangeEvents."""
+        changed_devices = {}
+        for event in events:
+            if event.kind == 'room_added':
+                self.room_grid.add_room(event.subject)
+            elif event.kind == 'device_added':
+                self.room_grid.room_changed(event.room, device_added=event.subject)
+            elif event.kind == 'device_removed':
+                self.room_grid.room_changed(event.room, device_removed=event.device_id)
+                changed_devices.pop(event.device_id, None)
+            elif event.kind == 'device_changed':
+                changed_devices[event.device_id] = event.room
+        # A device whose status and intensity both changed is redrawn once.
+        for device_id, room_name in changed_devices.items():
+            self.room_grid.update_device(room_name, device_id)
+
+    def update_room_frames(self):
+        self.room_grid.update_visible()
 
     def _open_add_room_dialog(self):
         AddRoomDialog(self, self.controller)
-        self.refresh_rooms()
+        self.controller.process_changes()
 
     def _manage_schedules(self):
         ScheduleManagerDialog(self, self.controller)
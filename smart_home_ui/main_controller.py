@@ -1,34 +1,108 @@
-from smart_home.home import Home
 from smart_home.device import Device
 from smart_home.data_manager import DataManager
+from smart_home.progressive_loader import ProgressiveLoader
+from smart_home.schedule_runner import ScheduleRunner
 from .main_application_window import MainApplicationWindow
+from .render_scheduler import RenderScheduler
 
 class MainController:
+    SCHEDULE_POLL_MS = 500
+    AUTOSAVE_INTERVAL_MS = 30000
+    LOAD_POLL_MS = 10
+
     def __init__(self, data_file: str):
         self.data_file = data_file
-        self.home = DataManager.load_home_from_json(self.data_file)
-        if self.home is None:
-            self.home = Home(name="My First Smart Home")
-        
+        # The file is read on a worker thread while the window is being built.
+        self.loader = ProgressiveLoader(self.data_file, default_name="My First Smart Home")
+        self.loader.start()
+        self.loading = True
+
+        self.home = None
+        self.schedule_runner = None
+        self._changes = None
+        self._running = False
+        self.render_scheduler = RenderScheduler()
+
         self.view = MainApplicationWindow(self)
+        self._set_home(self.loader.home)
+
+    def _set_home(self, home):
+        if self._changes is not None:
+            self._changes.unsubscribe()
+        if self.schedule_runner is not None:
+            self.schedule_runner.stop()
+        self.home = home
+        self.schedule_runner = ScheduleRunner(self.home)
+        if self._running:
+            self.schedule_runner.start()
+        # Changes are queued (one per device field) and applied to the widgets in process_changes.
+        self._changes = self.home.events.subscribe(self.view.apply_changes, coalesce=True)
+        self.view.refresh_rooms()
 
     def run(self):
-        self.view.mainloop()
+        self._running = True
+        self.schedule_runner.start()
+        self.view.after(0, self._poll_loader)
+        self.view.after(self.SCHEDULE_POLL_MS, self._poll_schedule)
+        self.view.after(self.AUTOSAVE_INTERVAL_MS, self._autosave)
+        try:
+            self.view.mainloop()
+        finally:
+            self._running = False
+            self.schedule_runner.stop()
+
+    def _poll_loader(self):
+        # One chunk of rooms per call keeps the window responsive while the rest loads.
+        update = self.loader.poll()
+        if update.home_replaced:
+            self._set_home(self.loader.home)
+        self.process_changes()
+        self.view.show_progress(self.loader.progress)
+        if update.done:
+            self.loading = False
+            self.view.finish_loading()
+        else:
+            self.view.after(self.LOAD_POLL_MS, self._poll_loader)
+
+    def _poll_schedule(self):
+        # The runner fires on its own thread; widgets are only touched from the Tk thread.
+        self.process_changes()
+        self.view.after(self.SCHEDULE_POLL_MS, self._poll_schedule)
+
+    def process_changes(self):
+        self.home.events.flush()
+
+    def _autosave(self):
+        # Skips the write entirely when nothing changed since the last save.
+        try:
+            if not self.loading:
+                DataManager.save_changes(self.home, self.data_file)
+        except Exception as e:
+            print(f"Autosave failed: {e}")
+        self.view.after(self.AUTOSAVE_INTERVAL_MS, self._autosave)
+
+    def _check_loaded(self):
+        if self.loading:
+            raise ValueError("Please wait until the home has finished loading.")
 
     def get_rooms(self):
-        return self.home.rooms
+        return self.home.rooms if self.home is not None else []
 
     def add_room(self, room_name: str):
+        self._check_loaded()
         self.home.add_room(room_name)
 
     def add_device_to_room(self, device: Device, room_name: str):
+        self._check_loaded()
         self.home.add_device_to_room(device, room_name)
 
     def get_programmable_devices(self):
-        return [dev for dev in self.home.get_all_devices() if dev.is_programmable]
+        return self.home.query(programmable=True)
 
     def get_scheduler_for_device(self, device_id: str):
         return self.home.get_scheduler_for_device(device_id)
 
     def save_home(self):
-        DataManager.save_home_to_json(self.home, self.data_file)
+        self._check_loaded()
+        DataManager.save_home(self.home, self.data_file)
+        self.home.mark_clean()
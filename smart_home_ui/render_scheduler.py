@@ -0,0 +1,74 @@
+class RenderScheduler:
+    """
+    Coalesces widget updates into one Tk idle callback.
+
+    Every update is registered under a key (e.g. a widget and the value it
+    edits). A newer update for the same key replaces the pending one, so a
+    slider dragged across 100 pixels between two frames pushes only its
+    final value to the device.
+    """
+
+    def __init__(self):
+        self._pending = {}  # Key to callback, in first-request order
+        self._scheduled = False
+        self.requested = 0  # Updates passed to schedule()
+        self.merged = 0  # Updates replaced by a newer one for the same key
+        self.dropped = 0  # Updates cancelled before they ran
+        self.rendered = 0  # Updates that ran
+        self.frames = 0  # Idle callbacks that ran at least one update
+
+    def schedule(self, widget, key, callback):
+        """Runs `callback` when Tk is idle, unless another update for `key` comes first."""
+        self.requested += 1
+        if key in self._pending:
+            self.merged += 1
+        self._pending[key] = callback
+        if not self._scheduled:
+            self._scheduled = True
+            widget.after_idle(self.run_pending)
+
+    def cancel(self, key):
+        """Forgets the pending update of `key` without running it."""
+        if self._pending.pop(key, None) is not None:
+            self.dropped += 1
+
+    def _widget_keys(self, widget):
+        return [key for key in self._pending if isinstance(key, tuple) and key and key[0] is widget]
+
+    def cancel_widget(self, widget):
+        """Forgets every pending update whose key starts with `widget`."""
+        for key in self._widget_keys(widget):
+            self.cancel(key)
+
+    def run_widget(self, widget):
+        """
+        Runs the pending updates whose key starts with `widget` now.
+
+        Called before a widget is rebound or destroyed, so the last value
+        the user chose still reaches the device.
+        """
+        for key in self._widget_keys(widget):
+            callback = self._pending.pop(key)
+            callback()
+            self.rendered += 1
+
+    def run_pending(self):
+        """Runs the pending updates now."""
+        self._scheduled = False
+        pending, self._pending = self._pending, {}
+        if not pending:
+            return
+        self.frames += 1
+        for callback in pending.values():
+            callback()
+            self.rendered += 1
+
+    def stats(self):
+        return {
+            "requested": self.requested,
+            "merged": self.merged,
+            "dropped": self.dropped,
+            "rendered": self.rendered,
+            "frames": self.frames,
+            "pending": len(self._pending),
+        }
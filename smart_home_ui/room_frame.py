@@ -3,6 +3,7 @@ from tkinter import ttk
 from smart_home.room import Room
 from smart_home.smart_bulb import SmartBulb
 from smart_home.air_conditioner import AirConditioner
+from smart_home.metrics import METRICS
 from .smart_bulb_widget import SmartBulbWidget
 from .air_conditioner_widget import AirConditionerWidget
 from .device_widget import DeviceWidget
@@ -23,8 +24,8 @@ class RoomFrame(ttk.Frame):
         header_frame.grid(row=0, column=0, sticky="ew", pady=(0, 10))
         header_frame.columnconfigure(0, weight=1)
 
-        room_label = ttk.Label(header_frame, text=f"Room: {self.room.name}", font=("", 14, "bold"))
-        room_label.grid(row=0, column=0, sticky="w")
+        self.room_label = ttk.Label(header_frame, text=f"Room: {self.room.name}", font=("", 14, "bold"))
+        self.room_label.grid(row=0, column=0, sticky="w")
 
         add_device_button = ttk.Button(header_frame, text="Add Device", command=self._open_add_device_dialog)
         add_device_button.grid(row=0, column=1, sticky="e", padx=(10, 0))
@@ -34,31 +35,74 @@ class RoomFrame(ttk.Frame):
         self.devices_frame.columnconfigure(0, weight=1)
 
     def _open_add_device_dialog(self):
-        AddDeviceDialog(self.master, self.controller, self.room)
-        self.refresh_devices()
+        AddDeviceDialog(self.winfo_toplevel(), self.controller, self.room)
+        self.controller.process_changes()
 
     def refresh_devices(self):
-        for widget in self.devices_frame.winfo_children():
-            widget.destroy()
+        with METRICS.timer("ui_rebuild_seconds", "Seconds spent rebuilding views", view="devices"):
+            for widget in self.devices_frame.winfo_children():
+                widget.destroy()
+
+            self.device_widgets = {}
+            self._spare_widgets = {}  # Widget class to hidden widgets ready to be rebound
+            self.empty_label = ttk.Label(self.devices_frame, text="No devices in this room.")
+            for device in self.room.devices:
+                self.add_device_widget(device)
+            self._update_empty_label()
 
-        self.device_widgets = []
-        if not self.room.devices:
-            ttk.Label(self.devices_frame, text="No devices in this room.").pack(pady=10)
+    def bind_room(self, room: Room):
+        """Shows another room in this frame, reusing the device widgets it already has."""
+        self.room = room
+        self.room_label.config(text=f"Room: {room.name}")
+        for device_widget in self.device_widgets.values():
+            device_widget.pack_forget()
+            self._spare_widgets.setdefault(type(device_widget), []).append(device_widget)
+        self.device_widgets = {}
+        for device in room.devices:
+            self.add_device_widget(device)
+        self._update_empty_label()
+
+    def add_device_widget(self, device):
+        if device.id in self.device_widgets:
+            return
+        spares = self._spare_widgets.get(self._widget_class(device))
+        if spares:
+            device_widget = spares.pop()
+            device_widget.bind_device(device)
         else:
-            for i, device in enumerate(self.room.devices):
-                device_widget = self._create_device_widget(self.devices_frame, device)
-                if device_widget:
-                    device_widget.pack(fill=tk.X, pady=2)
-                    self.device_widgets.append(device_widget)
+            device_widget = self._create_device_widget(self.devices_frame, device)
+        device_widget.pack(fill=tk.X, pady=2)
+        self.device_widgets[device.id] = device_widget
+        self._update_empty_label()
 
-    def _create_device_widget(self, parent, device):
+    def remove_device_widget(self, device_id):
+        device_widget = self.device_widgets.pop(device_id, None)
+        if device_widget:
+            device_widget.destroy()
+        self._update_empty_label()
+
+    def update_device_widget(self, device_id):
+        device_widget = self.device_widgets.get(device_id)
+        if device_widget:
+            device_widget.update_widget()
+
+    def _update_empty_label(self):
+        if self.device_widgets:
+            self.empty_label.pack_forget()
+        elif not self.empty_label.winfo_manager():
+            self.empty_label.pack(pady=10)
+
+    def _widget_class(self, device):
         if isinstance(device, SmartBulb):
-            return SmartBulbWidget(parent, device, self.controller)
+            return SmartBulbWidget
         elif isinstance(device, AirConditioner):
-            return AirConditionerWidget(parent, device, self.controller)
+            return AirConditionerWidget
         else:
-            return DeviceWidget(parent, device, self.controller)
+            return DeviceWidget
+
+    def _create_device_widget(self, parent, device):
+        return self._widget_class(device)(parent, device, self.controller)
 
     def update_frame(self):
-        for widget in self.device_widgets:
+        for widget in self.device_widgets.values():
             widget.update_widget()
@@ -0,0 +1,183 @@
+import tkinter as tk
+from bisect import bisect_right
+from tkinter import ttk
+from smart_home.smart_bulb import SmartBulb
+from smart_home.air_conditioner import AirConditioner
+from smart_home.metrics import METRICS
+from .room_frame import RoomFrame
+
+class RoomGrid(ttk.Frame):
+    """
+    Scrollable grid of rooms that only builds the RoomFrames in view.
+
+    Rows get an estimated height until their frames have been laid out once;
+    frames scrolled out of view go back to a pool and are rebound to the
+    rooms scrolling in, so the number of Tk widgets depends on the window
+    size rather than on the size of the home.
+    """
+    COLUMNS = 3
+    PADDING = 5
+    # Pixels of rows kept built above and below the viewport
+    OVERSCAN = 300
+    ROOM_HEADER_HEIGHT = 70
+    DEVICE_HEIGHTS = {SmartBulb: 110, AirConditioner: 75}
+    DEFAULT_DEVICE_HEIGHT = 40
+
+    def __init__(self, parent, controller):
+        super().__init__(parent)
+        self.controller = controller
+        self.rooms = []
+        self._room_indexes = {}  # Room name to position in the grid
+        self.room_frames = {}  # Room name to the RoomFrame showing it, for rooms in view
+        self._row_heights = []
+        self._measured_rows = set()
+        self._row_offsets = [0]
+        self._pool = []
+        self._windows = {}  # RoomFrame to its canvas window item
+        self._update_pending = False
+
+        self.canvas = tk.Canvas(self, highlightthickness=0)
+        self.scrollbar = ttk.Scrollbar(self, orient="vertical", command=self._on_scrollbar)
+        self.canvas.configure(yscrollcommand=self.scrollbar.set)
+        self.canvas.pack(side="left", fill="both", expand=True)
+        self.scrollbar.pack(side="right", fill="y")
+        self.canvas.bind("<Configure>", lambda e: self._relayout())
+
+    def set_rooms(self, rooms):
+        for room_frame in list(self.room_frames.values()):
+            self._release(room_frame)
+        self.rooms = list(rooms)
+        self._room_indexes = {room.name: index for index, room in enumerate(self.rooms)}
+        self._row_heights = [self._estimate_row(row) for row in range(self._row_count())]
+        self._measured_rows = set()
+        self._relayout()
+
+    def add_room(self, room):
+        self._room_indexes[room.name] = len(self.rooms)
+        self.rooms.append(room)
+        row = (len(self.rooms) - 1) // self.COLUMNS
+        if row == len(self._row_heights):
+            self._row_heights.append(self._estimate_row(row))
+        else:
+            self._remeasure(row)
+        self._relayout()
+
+    def room_changed(self, room_name, device_added=None, device_removed=None):
+        """Handles a device being added to or removed from a room."""
+        room_frame = self.room_frames.get(room_name)
+        if room_frame is not None:
+            if device_added is not None:
+                room_frame.add_device_widget(device_added)
+            if device_removed is not None:
+                room_frame.remove_device_widget(device_removed)
+        index = self._room_indexes.get(room_name)
+        if index is not None:
+            self._remeasure(index // self.COLUMNS)
+            self._relayout()
+
+    def update_device(self, room_name, device_id):
+        room_frame = self.room_frames.get(room_name)
+        if room_frame is not None:
+            room_frame.update_device_widget(device_id)
+
+    def update_visible(self):
+        for room_frame in self.room_frames.values():
+            room_frame.update_frame()
+
+    @property
+    def pool_size(self):
+        return len(self._pool)
+
+    def _row_count(self):
+        return (len(self.rooms) + self.COLUMNS - 1) // self.COLUMNS
+
+    def _estimate_row(self, row):
+        height = 0
+        for room in self.rooms[row * self.COLUMNS:(row + 1) * self.COLUMNS]:
+            devices = room.devices
+            room_height = self.ROOM_HEADER_HEIGHT + sum(
+                self.DEVICE_HEIGHTS.get(type(device), self.DEFAULT_DEVICE_HEIGHT) for device in devices)
+            height = max(height, room_height if devices else self.ROOM_HEADER_HEIGHT + 40)
+        return height + 2 * self.PADDING
+
+    def _remeasure(self, row):
+        self._measured_rows.discard(row)
+        self._row_heights[row] = self._estimate_row(row)
+
+    def _relayout(self):
+        offsets = [0]
+        for height in self._row_heights:
+            offsets.append(offsets[-1] + height)
+        self._row_offsets = offsets
+        self.canvas.configure(scrollregion=(0, 0, self.canvas.winfo_width(), offsets[-1]))
+        self._schedule_update()
+
+    def _on_scrollbar(self, *args):
+        self.canvas.yview(*args)
+        self._schedule_update()
+
+    def _schedule_update(self):
+        # Many scroll events between two frames are handled once.
+        if not self._update_pending:
+            self._update_pending = True
+            self.after_idle(self._update_viewport)
+
+    def _update_viewport(self):
+        self._update_pending = False
+        with METRICS.timer("ui_rebuild_seconds", "Seconds spent rebuilding views", view="viewport"):
+            top = self.canvas.canvasy(0) - self.OVERSCAN
+            bottom = self.canvas.canvasy(self.canvas.winfo_height()) + self.OVERSCAN
+            first_row = max(0, bisect_right(self._row_offsets, top) - 1)
+            last_row = min(self._row_count() - 1, bisect_right(self._row_offsets, bottom) - 1)
+            in_view = range(first_row * self.COLUMNS, min(len(self.rooms), (last_row + 1) * self.COLUMNS))
+            visible = {self.rooms[index].name for index in in_view}
+
+            for name, room_frame in list(self.room_frames.items()):
+                if name not in visible:
+                    self._release(room_frame)
+
+            column_width = max(1, self.canvas.winfo_width() // self.COLUMNS)
+            for index in in_view:
+                room = self.rooms[index]
+                room_frame = self.room_frames.get(room.name)
+                if room_frame is None:
+                    room_frame = self._acquire(room)
+                row, column = divmod(index, self.COLUMNS)
+                x = column * column_width + self.PADDING
+                y = self._row_offsets[row] + self.PADDING
+                self.canvas.coords(self._windows[room_frame], x, y)
+                self.canvas.itemconfigure(self._windows[room_frame], width=column_width - 2 * self.PADDING,
+                                          state="normal")
+            self.after_idle(self._measure_rows, first_row, last_row)
+
+    def _measure_rows(self, first_row, last_row):
+        """Replaces estimated row heights with the real ones once frames are laid out."""
+        changed = False
+        for row in range(first_row, min(last_row + 1, self._row_count())):
+            if row in self._measured_rows:
+                continue
+            frames = [self.room_frames.get(room.name) for room in self.rooms[row * self.COLUMNS:(row + 1) * self.COLUMNS]]
+            if any(frame is None for frame in frames):
+                continue
+            height = max(frame.winfo_reqheight() for frame in frames) + 2 * self.PADDING
+            self._measured_rows.add(row)
+            if height != self._row_heights[row]:
+                self._row_heights[row] = height
+                changed = True
+        if changed:
+            self._relayout()
+
+    def _acquire(self, room):
+        if self._pool:
+            room_frame = self._pool.pop()
+            room_frame.bind_room(room)
+        else:
+            room_frame = RoomFrame(self.canvas, room, self.controller)
+            self._windows[room_frame] = self.canvas.create_window(0, 0, window=room_frame, anchor="nw")
+        self.room_frames[room.name] = room_frame
+        return room_frame
+
+    def _release(self, room_frame):
+        self.room_frames.pop(room_frame.room.name, None)
+        self.canvas.itemconfigure(self._windows[room_frame], state="hidden")
+        self._pool.append(room_frame)
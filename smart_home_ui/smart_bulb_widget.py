@@ -12,10 +12,10 @@ class SmartBulbWidget(DeviceWidget):
         self._create_bulb_widgets()
         self.after(10, self.update_widget)
 
-    def _create_bulb_widgets(self):
-        if self.device.is_programmable and self.name_label:
-            self.name_label.config(text=f"{self.device.name} (P)")
+    def _display_name(self):
+        return f"{self.device.name} (P)" if self.device.is_programmable else self.device.name
 
+    def _create_bulb_widgets(self):
         intensity_frame = ttk.Frame(self)
         intensity_frame.grid(row=1, column=0, columnspan=2, sticky="ew", pady=5)
         intensity_frame.columnconfigure(1, weight=1)
@@ -44,8 +44,17 @@ class SmartBulbWidget(DeviceWidget):
 
 
     def update_intensity(self, value):
-        self.device.set_intensity(int(float(value)))
-        self.update_widget()
+        # Called for every pixel of a drag; only the last value of a frame reaches the device.
+        intensity = int(float(value))
+        self.intensity_display_var.set(f"{intensity}%")
+        device = self.device
+        self.controller.render_scheduler.schedule(self, (self, 'intensity'),
+                                                  lambda: self._commit_intensity(device, intensity))
+
+    def _commit_intensity(self, device, intensity):
+        device.set_intensity(intensity)
+        if device is self.device and self.winfo_exists():
+            self.update_widget()
 
     def _get_color_hex(self) -> str:
         """Converts the device's RGB color to a hex string for Tkinter."""
@@ -1,12 +1,32 @@
 import unittest
 import os
 import json
+import asyncio
+import sqlite3
+import subprocess
+import sys
+import threading
 from smart_home.home import Home
 from smart_home.room import Room
 from smart_home.smart_bulb import SmartBulb
 from smart_home.air_conditioner import AirConditioner
 from smart_home.scheduler import Scheduler, InvalidTimeError
 from smart_home.data_manager import DataManager
+from smart_home.schedule_runner import ScheduleRunner
+from smart_home.device_store import DeviceStore
+from smart_home.buffered_history_log import BufferedHistoryLog
+from smart_home.history_reader import HistoryLogReader
+from smart_home.progressive_loader import ProgressiveLoader
+from smart_home.home_generator import HomeGenerator
+from smart_home.metrics import METRICS, MetricsRegistry
+from smart_home.daemon import HomeDaemon
+from smart_home.gateway import DeviceGateway, DeviceCommand, StreamTransport, GatewayError
+from smart_home.device_simulator import DeviceSimulator
+from smart_home.transport import PooledTransport
+from smart_home_ui.render_scheduler import RenderScheduler
+from smart_home import binary_snapshot, home_generator
+from smart_home.binary_snapshot import BinarySnapshotError
+import time
 
 class TestSmartBulb(unittest.TestCase):
     def test_initial_state(self):
@@ -42,6 +62,19 @@ class TestSmartBulb(unittest.TestCase):
         with self.assertRaises(ValueError):
             bulb.change_color(300, 100, 100)
 
+    def test_compact_representation(self):
+        bulb = SmartBulb("Test Bulb", color={'r': 1, 'g': 2, 'b': 3})
+        self.assertEqual(bulb.packed_color, 0x010203)
+        self.assertEqual(dict(bulb.color), {'r': 1, 'g': 2, 'b': 3})
+        self.assertEqual(bulb.to_dict()['color'], {'r': 1, 'g': 2, 'b': 3})
+        self.assertFalse(hasattr(bulb, '__dict__'))
+        self.assertFalse(hasattr(AirConditioner("Test AC"), '__dict__'))
+
+    def test_stored_color_out_of_range_is_clamped(self):
+        bulb = SmartBulb.from_dict({"id": "Bulb_90", "name": "Odd Bulb", "status": False, "intensity": 0,
+                                    "color": {'r': 256, 'g': -1, 'b': 7}})
+        self.assertEqual(dict(bulb.color), {'r': 255, 'g': 0, 'b': 7})
+
 class TestAirConditioner(unittest.TestCase):
     def test_initial_state(self):
         ac = AirConditioner("Test AC")
@@ -92,6 +125,83 @@ class TestHome(unittest.TestCase):
         with self.assertRaises(ValueError):
             home.add_device_to_room(bulb, "Kitchen")
 
+    def test_device_index(self):
+        home = Home("Indexed Home")
+        home.add_room("Kitchen")
+        home.add_room("Hall")
+        bulb = SmartBulb("Ceiling", is_programmable=True)
+        home.add_device_to_room(bulb, "Kitchen")
+        self.assertIs(home.get_device_by_id(bulb.id), bulb)
+        self.assertIs(home.get_room_of_device(bulb.id), home.get_room_by_name("Kitchen"))
+        with self.assertRaises(ValueError):
+            home.add_device_to_room(bulb, "Hall")
+
+        ac = AirConditioner("Split")
+        home.get_room_by_name("Hall").add_device(ac)
+        self.assertIs(home.get_room_of_device(ac.id), home.get_room_by_name("Hall"))
+
+        home.remove_device(bulb.id)
+        self.assertIsNone(home.get_device_by_id(bulb.id))
+        self.assertIsNone(home.get_scheduler_for_device(bulb.id))
+        self.assertNotIn(bulb, home.get_room_by_name("Kitchen").devices)
+
+        restored = Home.from_dict(home.to_dict())
+        self.assertEqual(restored.get_room_of_device(ac.id).name, "Hall")
+
+    def test_room_membership_goes_through_the_home(self):
+        home = Home("Direct Home")
+        kitchen = home.add_room("Kitchen")
+        hall = home.add_room("Hall")
+        bulb = SmartBulb("Ceiling", is_programmable=True)
+        kitchen.add_device(bulb)
+        self.assertIsNotNone(home.get_scheduler_for_device(bulb.id))
+
+        with self.assertRaises(ValueError):
+            hall.add_device(bulb)
+        self.assertEqual(hall.devices, [])
+        self.assertIs(home.get_room_of_device(bulb.id), kitchen)
+        bulb.turn_on()
+        self.assertEqual(hall.dirty_devices(), [])
+
+        kitchen.remove_device(bulb.id)
+        self.assertIsNone(home.get_scheduler_for_device(bulb.id))
+        hall.add_device(bulb)
+        self.assertIs(home.get_room_of_device(bulb.id), hall)
+
+    def test_query(self):
+        home = Home("Query Home")
+        home.add_room("Kitchen")
+        home.add_room("Bedroom")
+        lamp = SmartBulb("Lamp", is_programmable=True)
+        strip = SmartBulb("Strip")
+        ac = AirConditioner("AC")
+        home.add_device_to_room(lamp, "Kitchen")
+        home.add_device_to_room(strip, "Bedroom")
+        home.add_device_to_room(ac, "Bedroom")
+
+        self.assertEqual(home.query(device_type=SmartBulb), [lamp, strip])
+        self.assertEqual(home.query(programmable=True), [lamp])
+        self.assertEqual(home.query(room="Bedroom", programmable=False), [strip, ac])
+        self.assertEqual(home.query(status=True), [])
+
+        strip.turn_on()
+        ac.turn_on()
+        self.assertEqual(home.query(device_type=SmartBulb, status=True), [strip])
+        self.assertEqual(home.query(status=False), [lamp])
+        ac.turn_off()
+        self.assertEqual(home.query(status=True, room=home.get_room_by_name("Bedroom")), [strip])
+        self.assertEqual(home.query(status=False, programmable=False), [ac])
+        home.apply({"room": "Bedroom"}, "turn_off")
+        self.assertEqual(sorted(d.name for d in home.query(status=False)), ["AC", "Lamp", "Strip"])
+        self.assertEqual(home.query(status=True), [])
+        strip.turn_on()
+
+        home.remove_device(strip.id)
+        self.assertEqual(home.query(status=True), [])
+        strip.turn_on()
+        self.assertEqual(home.query(device_type=SmartBulb), [lamp])
+        self.assertEqual(home.query(room="Nowhere"), [])
+
 class TestScheduler(unittest.TestCase):
     def setUp(self):
         self.bulb = SmartBulb("Programmable Bulb", is_programmable=True)
@@ -117,6 +227,31 @@ class TestScheduler(unittest.TestCase):
         with self.assertRaises(IndexError):
             self.scheduler.delete_event(0)
 
+    def test_events_stay_sorted(self):
+        self.scheduler.add_event("Sunday", 23, 0, 0, "turn_off")
+        self.scheduler.add_event("Monday", 7, 0, 0, "turn_on")
+        self.scheduler.add_event("Monday", 6, 59, 59, "turn_off")
+        days = [(e['day'], e['hour']) for e in self.scheduler.schedule]
+        self.assertEqual(days, [("Monday", 6), ("Monday", 7), ("Sunday", 23)])
+
+    def test_add_events_bulk(self):
+        self.scheduler.add_event("Wednesday", 12, 0, 0, "turn_on")
+        self.scheduler.add_events([
+            ("Friday", 18, 30, 0, "turn_off"),
+            {'day': "Monday", 'hour': 8, 'minute': 0, 'second': 0, 'action': "turn_on"},
+        ])
+        self.assertEqual([e['day'] for e in self.scheduler.schedule], ["Monday", "Wednesday", "Friday"])
+        with self.assertRaises(InvalidTimeError):
+            self.scheduler.add_events([("Monday", 1, 0, 0, "turn_on"), ("Monday", 1, 61, 0, "turn_on")])
+        self.assertEqual(len(self.scheduler.schedule), 3)
+
+    def test_round_trip(self):
+        self.scheduler.add_events([("Tuesday", 9, 15, 30, "turn_on"), ("Tuesday", 9, 15, 30, "turn_off")])
+        restored = Scheduler.from_dict(self.scheduler.to_dict(), self.bulb)
+        self.assertEqual(restored.schedule, self.scheduler.schedule)
+        self.assertEqual(restored.to_dict()['schedule'][1],
+                         {'day': "Tuesday", 'hour': 9, 'minute': 15, 'second': 30, 'action': "turn_off"})
+
 class TestDataManager(unittest.TestCase):
     def setUp(self):
         self.test_file = "test_home_data.json"
@@ -153,6 +288,1037 @@ class TestDataManager(unittest.TestCase):
         self.assertEqual(len(loaded_scheduler.schedule), 1)
         self.assertEqual(loaded_scheduler.schedule[0]['day'], "Friday")
 
+    def test_binary_round_trip_and_convert(self):
+        binary_file = "test_home_data.shb"
+        self.addCleanup(lambda: os.path.exists(binary_file) and os.remove(binary_file))
+        bulb = next(self.home.get_all_devices())
+        bulb.turn_on()
+        bulb.set_intensity(40)
+        bulb.change_color(1, 2, 3)
+        self.home.add_room("Empty")
+        self.home.add_room("Bedroom")
+        self.home.add_device_to_room(AirConditioner("Split", initial_temp=24), "Bedroom")
+
+        DataManager.save_home(self.home, binary_file)
+        loaded_home = DataManager.load_home(binary_file)
+        self.assertEqual(loaded_home.to_dict(), self.home.to_dict())
+
+        DataManager.convert(binary_file, self.test_file)
+        with open(self.test_file) as f:
+            self.assertEqual(json.load(f), self.home.to_dict())
+        os.remove(binary_file)
+        DataManager.convert(self.test_file, binary_file)
+        self.assertEqual(DataManager.load_home(binary_file).to_dict(), self.home.to_dict())
+
+    def test_sqlite_round_trip(self):
+        db_file = "test_home_data.db"
+        self.addCleanup(self._remove_sqlite, db_file)
+        self.home.add_room("Bedroom")
+        self.home.add_device_to_room(AirConditioner("Split"), "Bedroom")
+        DataManager.save_home(self.home, db_file)
+        self.assertEqual(DataManager.load_home(db_file).to_dict(), self.home.to_dict())
+
+    def test_sqlite_row_updates(self):
+        db_file = "test_home_data.db"
+        self.addCleanup(self._remove_sqlite, db_file)
+        DataManager.save_home(self.home, db_file)
+        home, store = DataManager.open_sqlite_home(db_file)
+        bulb = home.get_room_by_name("Office").devices[0]
+        bulb.turn_on()
+        bulb.set_intensity(55)
+        bulb.change_color(9, 8, 7)
+        home.get_scheduler_for_device(bulb.id).add_event("Sunday", 20, 0, 0, "turn_off")
+        home.add_room("Garage")
+        home.add_device_to_room(AirConditioner("Garage AC"), "Garage")
+
+        # A second connection sees committed rows while the first one stays open.
+        reader = sqlite3.connect(db_file)
+        self.assertEqual(reader.execute("SELECT status, intensity FROM devices WHERE id = ?", (bulb.id,)).fetchone(), (1, 55))
+        reader.close()
+        store.close()
+
+        loaded = DataManager.load_home(db_file)
+        self.assertEqual(loaded.to_dict(), home.to_dict())
+
+    def test_dirty_tracking_and_delta_save(self):
+        db_file = "test_home_data.db"
+        self.addCleanup(self._remove_sqlite, db_file)
+        DataManager.save_home(self.home, db_file)
+        home = DataManager.load_home(db_file)
+        self.assertFalse(home.is_dirty)
+        self.assertFalse(DataManager.save_changes(home, db_file))
+
+        bulb = home.get_room_by_name("Office").devices[0]
+        generation = bulb.generation
+        bulb.set_intensity(30)
+        bulb.set_intensity(30)
+        self.assertEqual(bulb.generation, generation + 1)
+        self.assertTrue(home.get_room_by_name("Office").is_dirty)
+        self.assertEqual(home.dirty_devices(), [bulb])
+        self.assertFalse(home.structure_changed)
+
+        self.assertTrue(DataManager.save_changes(home, db_file))
+        self.assertFalse(home.is_dirty)
+        self.assertFalse(home.get_room_by_name("Office").is_dirty)
+        self.assertEqual(DataManager.load_home(db_file).get_device_by_id(bulb.id).intensity, 30)
+
+        home.add_room("Attic")
+        self.assertTrue(home.structure_changed)
+        self.assertTrue(DataManager.save_changes(home, db_file))
+        self.assertIsNotNone(DataManager.load_home(db_file).get_room_by_name("Attic"))
+
+    def test_invalid_stored_event_is_skipped(self):
+        bulb = next(self.home.get_all_devices())
+        data = self.home.to_dict()
+        data['schedulers'][bulb.id]['schedule'].append({'day': "Funday", 'hour': 9, 'minute': 0, 'second': 0, 'action': "turn_on"})
+        with open(self.test_file, "w") as f:
+            json.dump(data, f)
+        loaded_home = DataManager.load_home_from_json(self.test_file)
+        self.assertEqual(loaded_home.name, "Test Home")
+        self.assertEqual([event['day'] for event in loaded_home.get_scheduler_for_device(bulb.id).schedule],
+                         ["Friday"])
+
+    @staticmethod
+    def _remove_sqlite(db_file):
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(db_file + suffix):
+                os.remove(db_file + suffix)
+
+    def test_binary_rejects_other_files(self):
+        DataManager.save_home_to_json(self.home, self.test_file)
+        with self.assertRaises(BinarySnapshotError):
+            binary_snapshot.load_home(self.test_file)
+class TestDeviceStore(unittest.TestCase):
+    def test_slots_are_reused(self):
+        store = DeviceStore()
+        first = store.allocate(0, 100)
+        second = store.allocate(16, 30)
+        self.assertEqual(store.intensity[second], 16)
+        store.release(first)
+        self.assertEqual(len(store), 1)
+        self.assertEqual(store.allocate(16, 30), first)
+        self.assertEqual(store.capacity, 2)
+
+    def test_release_does_not_wait_for_the_lock(self):
+        # Garbage collection can free a device while the same thread holds the lock.
+        store = DeviceStore()
+        slot = store.allocate(0, 100)
+        with store._lock:
+            store.release(slot)
+        self.assertEqual(store.allocate(0, 100), slot)
+
+    def test_devices_are_views(self):
+        bulb = SmartBulb("View Bulb")
+        bulb.turn_on()
+        bulb.set_intensity(42)
+        store = SmartBulb.store
+        self.assertEqual(store.status[bulb.slot], 1)
+        self.assertEqual(store.intensity[bulb.slot], 42)
+        self.assertEqual(store.color[bulb.slot], 0xFFFFFF)
+
+    def test_home_wide_operations(self):
+        home = Home("Columnar Home")
+        home.add_room("Living")
+        home.add_room("Empty")
+        bulbs = [SmartBulb(f"Bulb {i}") for i in range(4)]
+        for i, bulb in enumerate(bulbs):
+            home.add_device_to_room(bulb, "Living")
+            bulb.set_intensity(20 * i)
+        bulbs[0].turn_on()
+        bulbs[3].turn_on()
+        ac = AirConditioner("AC", initial_temp=28)
+        home.add_device_to_room(ac, "Empty")
+
+        self.assertEqual(home.count_on(), 2)
+        self.assertEqual(home.count_on(room="Empty"), 0)
+        self.assertEqual(home.average_intensity_by_room(), {"Living": 30.0, "Empty": 28.0})
+        home.mark_clean()
+        self.assertEqual(home.clamp_intensity(25), 3)
+        self.assertEqual([bulb.intensity for bulb in bulbs], [0, 20, 25, 25])
+        self.assertEqual(ac.temperature, 25)
+        self.assertIn(bulbs[3], home.dirty_devices())
+        with self.assertRaises(ValueError):
+            home.count_on(room="Garage")
+
+
+class TestBulkApply(unittest.TestCase):
+    def setUp(self):
+        self.home = Home("Bulk Home")
+        self.home.add_room("Kitchen")
+        self.home.add_room("Bedroom")
+        self.lamps = [SmartBulb(f"Lamp {i}", is_programmable=(i % 2 == 0)) for i in range(4)]
+        for lamp in self.lamps:
+            self.home.add_device_to_room(lamp, "Kitchen")
+        self.strip = SmartBulb("Strip")
+        self.ac = AirConditioner("AC")
+        self.home.add_device_to_room(self.strip, "Bedroom")
+        self.home.add_device_to_room(self.ac, "Bedroom")
+
+    def test_turn_on_and_off(self):
+        result = self.home.apply({'type': SmartBulb}, 'turn_on')
+        self.assertEqual((result.matched, result.changed, result.skipped), (5, 5, 0))
+        self.assertTrue(all(lamp.status for lamp in self.lamps))
+        self.assertFalse(self.ac.status)
+        self.assertEqual(self.home.query(status=True, room="Bedroom"), [self.strip])
+
+        self.home.apply({'name': 'Lamp*'}, 'set_intensity', value=150)
+        self.assertEqual(self.lamps[0].intensity, 100)
+        result = self.home.apply(None, 'turn_off')
+        # The air conditioner was already off but gets reset to its minimum.
+        self.assertEqual(result.changed, 6)
+        self.assertEqual(self.home.query(status=True), [])
+        self.assertEqual(self.lamps[0].intensity, 0)
+
+    def test_selectors_and_skips(self):
+        result = self.home.apply({'room': "Kitchen", 'programmable': True}, 'change_color', r=1, g=2, b=3)
+        self.assertEqual(result.changed, 2)
+        self.assertEqual(self.lamps[0].color, {'r': 1, 'g': 2, 'b': 3})
+        self.assertEqual(self.lamps[1].color, {'r': 255, 'g': 255, 'b': 255})
+
+        result = self.home.apply({'room': "Bedroom"}, 'set_temperature', value=18)
+        self.assertEqual((result.matched, result.changed, result.skipped), (2, 1, 1))
+        self.assertEqual(self.ac.temperature, 18)
+
+        with self.assertRaises(ValueError):
+            self.home.apply({'colour': 'red'}, 'turn_on')
+        with self.assertRaises(ValueError):
+            self.home.apply(None, 'explode')
+
+    def test_notifies_observers(self):
+        events = []
+        self.home.add_observer(lambda event, subject: events.append(event))
+        self.home.mark_clean()
+        self.home.apply({'room': "Kitchen"}, 'turn_on')
+        self.assertEqual(events, ['batch_started'] + ['device_changed'] * 4 + ['batch_finished'])
+        self.assertEqual(len(self.home.dirty_devices()), 4)
+        self.assertTrue(self.home.get_room_by_name("Kitchen").is_dirty)
+        self.assertFalse(self.home.get_room_by_name("Bedroom").is_dirty)
+
+
+class TestEventBus(unittest.TestCase):
+    def setUp(self):
+        self.home = Home("Bus Home")
+        self.home.add_room("Den")
+        self.home.add_room("Attic")
+        self.lamp = SmartBulb("Lamp", is_programmable=True)
+        self.fan = AirConditioner("Cooler")
+        self.home.add_device_to_room(self.lamp, "Den")
+        self.home.add_device_to_room(self.fan, "Attic")
+
+    def test_filters(self):
+        den, lamp_colors, everything = [], [], []
+        subscription = self.home.events.subscribe(den.append, room="Den")
+        self.home.events.subscribe(lamp_colors.append, kinds=['device_changed'], device_id=self.lamp.id)
+        self.home.events.subscribe(everything.append)
+
+        self.lamp.turn_on()
+        self.fan.turn_on()
+        self.home.get_scheduler_for_device(self.lamp.id).add_event("Monday", 8, 0, 0, "turn_off")
+        self.home.remove_device(self.fan.id)
+
+        self.assertEqual([(e.kind, e.field) for e in den], [('device_changed', 'status'), ('schedule_changed', None)])
+        self.assertEqual([e.subject for e in lamp_colors], [self.lamp])
+        self.assertEqual([e.kind for e in everything][-1], 'device_removed')
+        self.assertEqual(everything[-1].room, "Attic")
+
+        subscription.unsubscribe()
+        self.lamp.turn_off()
+        self.assertEqual(len(den), 2)
+        with self.assertRaises(ValueError):
+            self.home.events.subscribe(den.append, kinds=['explosion'])
+
+    def test_coalescing_and_detach(self):
+        batches = []
+        subscription = self.home.events.subscribe(batches.append, kinds=['device_changed'], coalesce=True)
+        for value in (10, 20, 30):
+            self.lamp.set_intensity(value)
+        self.assertEqual(batches, [])
+        self.assertEqual(self.home.events.flush(), 1)
+        self.assertEqual(batches[0][0].field, 'intensity')
+
+        self.home.apply(None, 'turn_on')
+        self.assertEqual(sorted(e.device_id for e in batches[1]), sorted([self.lamp.id, self.fan.id]))
+
+        subscription.unsubscribe()
+        self.assertEqual(len(self.home.events), 0)
+        self.assertEqual(self.home._observers, [])
+
+    def test_coalescing_keeps_the_latest_order(self):
+        batches = []
+        self.home.events.subscribe(batches.append, kinds=['device_added', 'device_removed'], coalesce=True)
+        bulb = SmartBulb("Returning Bulb")
+        self.home.add_device_to_room(bulb, "Den")
+        self.home.remove_device(bulb.id)
+        self.home.add_device_to_room(bulb, "Den")
+        self.home.events.flush()
+        self.assertEqual([e.kind for e in batches[0]], ['device_removed', 'device_added'])
+        self.assertIs(self.home.get_device_by_id(bulb.id), bulb)
+
+
+class TestDeviceHistory(unittest.TestCase):
+    def setUp(self):
+        self.now = 0.0
+        self.home = Home("History Home")
+        self.home.add_room("Hall")
+        self.bulb = SmartBulb("Hall Light")
+        self.home.add_device_to_room(self.bulb, "Hall")
+        self.history = self.home.enable_history(raw_capacity=4, tiers=((60, 2),), clock=lambda: self.now)
+
+    def test_records_changes(self):
+        for value in (10, 20, 30):
+            self.now += 1
+            self.bulb.set_intensity(value)
+        self.bulb.turn_on()
+        points = self.home.history(self.bulb.id)
+        self.assertEqual([(p.timestamp, p.mean) for p in points], [(1, 10), (2, 20), (3, 30)])
+        self.assertEqual(len(self.home.history(self.bulb.id, start=2, end=3)), 1)
+        self.assertEqual(self.home.history(self.bulb.id, field='status')[0].max, 1)
+        with self.assertRaises(ValueError):
+            self.home.history("Bulb_missing")
+
+    def test_downsampling_keeps_memory_bounded(self):
+        for second in range(0, 600, 10):
+            self.now = second
+            self.bulb.set_intensity(second % 100 + 1)
+        points = self.home.history(self.bulb.id)
+        # Two one-minute buckets followed by the four newest raw samples.
+        self.assertEqual(len(points), 6)
+        self.assertEqual((points[0].timestamp, points[0].count), (480, 6))
+        self.assertEqual((points[1].min, points[1].max, points[1].count), (41, 51, 2))
+        self.assertEqual([p.count for p in points[2:]], [1, 1, 1, 1])
+
+        coarse = self.home.history(self.bulb.id, resolution=300)
+        self.assertEqual([(p.timestamp, p.count) for p in coarse], [(300, 12)])
+        self.home.remove_device(self.bulb.id)
+        self.assertEqual(len(self.history), 0)
+
+    def test_queries_while_recording_on_another_thread(self):
+        def write():
+            for second in range(20000):
+                self.history.record(self.bulb.id, 'intensity', second % 100, timestamp=second)
+
+        writer = threading.Thread(target=write)
+        writer.start()
+        while writer.is_alive():
+            points = self.history.query(self.bulb.id)
+            times = [p.timestamp for p in points]
+            self.assertEqual(times, sorted(set(times)))
+            self.assertLessEqual(len(points), 6)
+        writer.join()
+        self.assertEqual(self.history.query(self.bulb.id)[-1].timestamp, 19999)
+
+
+class TestBufferedHistoryLog(unittest.TestCase):
+    def setUp(self):
+        self.log_file = "test_history.log"
+        self.home = Home("Logged Home")
+        self.home.add_room("Office")
+        self.bulb = SmartBulb("Desk")
+        self.home.add_device_to_room(self.bulb, "Office")
+        self.home.add_device_to_room(AirConditioner("AC"), "Office")
+
+    def tearDown(self):
+        for suffix in ("", ".1", ".2", ".3"):
+            if os.path.exists(self.log_file + suffix):
+                os.remove(self.log_file + suffix)
+
+    def test_ndjson_records(self):
+        log = BufferedHistoryLog(self.log_file, flush_interval=60)
+        self.bulb.turn_on()
+        log.log_home(self.home, timestamp=100.0)
+        self.assertTrue(log.flush(timeout=5))
+        log.close()
+        with open(self.log_file) as f:
+            records = [json.loads(line) for line in f]
+        self.assertEqual(len(records), 2)
+        self.assertEqual(records[0], {"ts": 100.0, "room": "Office", "device": self.bulb.id,
+                                      "fields": {"type": "SmartBulb", "name": "Desk", "status": True,
+                                                 "intensity": 0, "color": "#ffffff"}})
+        self.assertEqual(records[1]["fields"]["type"], "AirConditioner")
+
+    def test_csv_rotation_and_overflow(self):
+        log = BufferedHistoryLog(self.log_file, format="csv", flush_interval=60, max_bytes=200, backup_count=2)
+        for i in range(4):
+            log.log_room(self.home.get_room_by_name("Office"), timestamp=float(i))
+            log.flush()
+        log.close()
+        self.assertGreaterEqual(log.rotations, 1)
+        self.assertTrue(os.path.exists(self.log_file + ".1"))
+        self.assertFalse(os.path.exists(self.log_file + ".3"))
+        with open(self.log_file) as f:
+            self.assertTrue(f.readline().startswith("ts,room,device"))
+
+        log = BufferedHistoryLog(self.log_file, flush_interval=60, batch_size=100, max_queue=3)
+        log.log_home(self.home)
+        log.log_home(self.home)
+        log.close()
+        self.assertEqual((log.dropped, log.written), (1, 3))
+        with self.assertRaises(ValueError):
+            log.log_home(self.home)
+
+    def test_writer_survives_a_bad_record(self):
+        log = BufferedHistoryLog(self.log_file, flush_interval=60)
+        log.record(object(), self.bulb)  # Not serializable
+        self.assertTrue(log.flush(timeout=5))
+        log.log_home(self.home, timestamp=1.0)
+        self.assertTrue(log.flush(timeout=5))
+        log.close()
+        self.assertEqual((log.failed, log.written), (1, 2))
+
+
+class TestHistoryLogReader(unittest.TestCase):
+    def setUp(self):
+        self.log_file = "test_reader.log"
+        self.room = Room("Lab")
+        self.bulb = SmartBulb("Bench")
+        self.room.add_device(self.bulb)
+
+    def tearDown(self):
+        for suffix in ("", ".idx", ".idx.tmp"):
+            if os.path.exists(self.log_file + suffix):
+                os.remove(self.log_file + suffix)
+
+    def _write(self, timestamps, format="ndjson"):
+        log = BufferedHistoryLog(self.log_file, format=format, flush_interval=60)
+        for timestamp in timestamps:
+            log.log_room(self.room, timestamp=float(timestamp))
+        log.close()
+
+    def test_seeks_and_extends_index(self):
+        self._write(range(1000))
+        reader = HistoryLogReader(self.log_file, index_interval=1024)
+        records = list(reader.read(500, 505))
+        self.assertEqual([r.timestamp for r in records], [500, 501, 502, 503, 504])
+        self.assertEqual(records[0].device_id, self.bulb.id)
+        entries = len(reader)
+        self.assertGreater(entries, 10)
+        self.assertTrue(os.path.exists(self.log_file + ".idx"))
+
+        self._write(range(1000, 1100))
+        reader = HistoryLogReader(self.log_file, index_interval=1024)
+        self.assertEqual(len(reader), entries)  # Loaded from the side index
+        self.assertEqual([r.timestamp for r in reader.read(1098)], [1098, 1099])
+        self.assertGreater(len(reader), entries)
+
+        os.remove(self.log_file)
+        self._write(range(5), format="csv")
+        self.assertEqual([r.fields["intensity"] for r in reader.read(3)], [0, 0])
+
+    def test_reads_save_log_text(self):
+        self.room.save_log(self.log_file)
+        self.bulb.turn_on()
+        self.room.save_log(self.log_file)
+        records = list(HistoryLogReader(self.log_file).read())
+        self.assertEqual(len(records), 2)
+        self.assertEqual((records[1].room, records[1].device_id), ("Lab", self.bulb.id))
+        self.assertIn("Status: ON", records[1].fields["text"])
+
+
+class TestProgressiveLoader(unittest.TestCase):
+    def setUp(self):
+        self.files = ["test_progressive.json", "test_progressive.shb"]
+        home = Home("Big Home")
+        for i in range(7):
+            home.add_room(f"Room {i}")
+            home.add_device_to_room(SmartBulb(f"Bulb {i}", is_programmable=True), f"Room {i}")
+        self.bulb_id = home.rooms[3].devices[0].id
+        home.get_scheduler_for_device(self.bulb_id).add_event("Friday", 18, 0, 0, "turn_on")
+        for filename in self.files:
+            DataManager.save_home(home, filename)
+
+    def tearDown(self):
+        for filename in self.files:
+            if os.path.exists(filename):
+                os.remove(filename)
+
+    def _poll_until_done(self, loader):
+        updates = []
+        while not loader.done:
+            updates.append(loader.poll(timeout=5))
+        return updates
+
+    def test_json_rooms_arrive_in_chunks(self):
+        loader = ProgressiveLoader(self.files[0], chunk_size=3)
+        home = loader.home
+        added = []
+        home.add_observer(lambda event, subject: added.append(event))
+        loader.start()
+        updates = self._poll_until_done(loader)
+
+        self.assertIs(loader.home, home)
+        self.assertEqual(home.name, "Big Home")
+        self.assertEqual([u.rooms_added for u in updates if u.rooms_added], [3, 3, 1])
+        self.assertEqual(added.count('room_added'), 7)
+        self.assertEqual(len(home.get_scheduler_for_device(self.bulb_id).schedule), 1)
+        self.assertEqual(loader.progress, 1.0)
+        self.assertFalse(home.is_dirty)
+
+    def test_other_formats_replace_the_home(self):
+        loader = ProgressiveLoader(self.files[1])
+        placeholder = loader.home
+        loader.start()
+        updates = self._poll_until_done(loader)
+        self.assertTrue(any(u.home_replaced for u in updates))
+        self.assertIsNot(loader.home, placeholder)
+        self.assertEqual(len(loader.home.rooms), 7)
+
+        loader = ProgressiveLoader("missing_home.json", default_name="Fresh Home")
+        loader.start()
+        self._poll_until_done(loader)
+        self.assertEqual(loader.home.name, "Fresh Home")
+
+
+class TestRenderScheduler(unittest.TestCase):
+    class FakeWidget:
+        def __init__(self):
+            self.idle_callbacks = []
+
+        def after_idle(self, callback):
+            self.idle_callbacks.append(callback)
+
+    def test_coalesces_slider_drags(self):
+        scheduler = RenderScheduler()
+        widget = self.FakeWidget()
+        bulb = SmartBulb("Slider Bulb")
+        for value in range(1, 51):
+            scheduler.schedule(widget, (widget, 'intensity'), lambda v=value: bulb.set_intensity(v))
+        scheduler.schedule(widget, (widget, 'color'), lambda: bulb.change_color(1, 2, 3))
+        scheduler.cancel_widget(widget)
+        scheduler.schedule(widget, (widget, 'intensity'), lambda: bulb.set_intensity(70))
+
+        self.assertEqual(len(widget.idle_callbacks), 1)
+        widget.idle_callbacks[0]()
+        self.assertEqual(bulb.intensity, 70)
+        self.assertEqual(bulb.color, {'r': 255, 'g': 255, 'b': 255})
+        self.assertEqual(scheduler.stats(), {"requested": 52, "merged": 49, "dropped": 2,
+                                             "rendered": 1, "frames": 1, "pending": 0})
+
+    def test_rebinding_commits_the_last_drag_value(self):
+        scheduler = RenderScheduler()
+        widget = self.FakeWidget()
+        dragged, next_bulb = SmartBulb("Dragged Bulb"), SmartBulb("Next Bulb")
+        for value in range(1, 41):
+            scheduler.schedule(widget, (widget, 'intensity'), lambda v=value: dragged.set_intensity(v))
+        # The widget is recycled for another device before Tk is idle.
+        scheduler.run_widget(widget)
+        self.assertEqual(dragged.intensity, 40)
+        widget.idle_callbacks[0]()
+        self.assertEqual((dragged.intensity, next_bulb.intensity), (40, 0))
+        self.assertEqual(scheduler.stats()["rendered"], 1)
+
+
+class TestHomeDaemon(unittest.TestCase):
+    def setUp(self):
+        self.files = ["test_daemon.json", "test_daemon.ndjson"]
+        home = Home("Server Home")
+        home.add_room("Attic")
+        home.add_device_to_room(SmartBulb("Attic Bulb"), "Attic")
+        DataManager.save_home(home, self.files[0])
+        self.now = 1000.0
+
+    def tearDown(self):
+        for filename in self.files:
+            if os.path.exists(filename):
+                os.remove(filename)
+
+    def test_autosave_and_history_log(self):
+        daemon = HomeDaemon(self.files[0], autosave_interval=30, log_file=self.files[1], log_interval=10,
+                            clock=lambda: self.now)
+        daemon.start()
+        try:
+            daemon.home.rooms[0].devices[0].turn_on()
+            self.assertEqual(daemon.tick(self.now), self.now + 10)
+            self.assertTrue(daemon.home.is_dirty)
+            self.now += 30
+            daemon.tick(self.now)
+            self.assertFalse(daemon.home.is_dirty)
+            self.assertTrue(DataManager.load_home(self.files[0]).rooms[0].devices[0].status)
+        finally:
+            daemon.close()
+        with open(self.files[1]) as f:
+            self.assertEqual(len(f.readlines()), 2)
+
+    def test_headless_mode_does_not_import_tk(self):
+        code = "import sys, main, smart_home.daemon; print(any(m.startswith(('tkinter', 'smart_home_ui')) for m in sys.modules))"
+        output = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True).stdout
+        self.assertEqual(output.strip(), "False")
+
+
+class TestDeviceGateway(unittest.TestCase):
+    async def _with_gateway(self, simulator, scenario, **options):
+        host, port = await simulator.start()
+        gateway = DeviceGateway(StreamTransport(host, port), **options)
+        try:
+            return await scenario(gateway)
+        finally:
+            await gateway.close()
+            await simulator.close()
+
+    def test_in_order_delivery_and_coalescing(self):
+        simulator = DeviceSimulator(latency=0.002, jitter=0.003, seed=7)
+
+        async def scenario(gateway):
+            futures = []
+            for step in range(6):
+                for device in range(10):
+                    futures.append(gateway.submit(DeviceCommand(f"dev-{device}", "status", step % 2 == 0)))
+                    futures.append(gateway.submit(DeviceCommand(f"dev-{device}", "intensity", step * 10)))
+            await gateway.drain()
+            return await asyncio.gather(*futures)
+
+        results = asyncio.run(self._with_gateway(simulator, scenario, max_in_flight=4))
+        for device in range(10):
+            self.assertEqual(simulator.state[f"dev-{device}"], {"status": False, "intensity": 50})
+        # Every status write arrives; intensity writes queued behind others are superseded.
+        self.assertEqual(results.count(True), simulator.applied)
+        self.assertGreater(results.count(False), 0)
+        self.assertEqual(results.count(True) + results.count(False), 120)
+
+    def test_retries_and_failures(self):
+        simulator = DeviceSimulator(latency=0.001, failure_rate=0.5, seed=3)
+
+        async def flaky(gateway):
+            results = await asyncio.gather(*[gateway.submit(DeviceCommand(f"dev-{i}", "status", True))
+                                             for i in range(20)])
+            return results, gateway.stats()
+
+        results, stats = asyncio.run(self._with_gateway(simulator, flaky, retries=10, backoff=0.001))
+        self.assertEqual(results, [True] * 20)
+        self.assertGreater(stats["retried"], 0)
+
+        async def unreachable(gateway):
+            with self.assertRaises(GatewayError):
+                await gateway.submit(DeviceCommand("dev-0", "status", True))
+            return gateway.stats()
+
+        stats = asyncio.run(self._with_gateway(DeviceSimulator(drop_rate=1.0), unreachable,
+                                               timeout=0.05, retries=1, backoff=0.001))
+        self.assertEqual((stats["retried"], stats["failed"]), (1, 1))
+
+    def test_simulator_answers_malformed_requests(self):
+        simulator = DeviceSimulator(latency=0)
+
+        async def scenario():
+            host, port = await simulator.start()
+            reader, writer = await asyncio.open_connection(host, port)
+            try:
+                answers = []
+                for line in (b"not json\n", b'{"id": 1, "device": "dev-0"}\n',
+                             b'{"id": 2, "device": "dev-0", "field": "status", "value": true}\n'):
+                    writer.write(line)
+                    answers.append(json.loads(await reader.readline()))
+                return answers
+            finally:
+                writer.close()
+                await simulator.close()
+
+        answers = asyncio.run(scenario())
+        self.assertEqual([(answer["id"], answer["ok"]) for answer in answers], [(None, False), (None, False), (2, True)])
+        self.assertTrue(answers[0]["error"].startswith("Malformed request"))
+        self.assertEqual((simulator.malformed, simulator.applied), (2, 1))
+
+    def test_forwards_home_changes(self):
+        home = Home("Gateway Home")
+        home.add_room("Hall")
+        bulb = SmartBulb("Hall Bulb")
+        home.add_device_to_room(bulb, "Hall")
+        simulator = DeviceSimulator(latency=0.001)
+
+        async def scenario(gateway):
+            gateway.attach(home)
+            bulb.turn_on()
+            bulb.change_color(10, 20, 30)
+            await asyncio.sleep(0)
+            await gateway.drain()
+
+        asyncio.run(self._with_gateway(simulator, scenario))
+        self.assertEqual(simulator.state[bulb.id], {"status": True, "color": {'r': 10, 'g': 20, 'b': 30}})
+        self.assertEqual(len(home.events), 0)
+
+
+class TestPooledTransport(unittest.TestCase):
+    def test_pipelines_commands_into_frames(self):
+        simulator = DeviceSimulator(latency=0.002, seed=5)
+
+        async def scenario():
+            host, port = await simulator.start()
+            transport = PooledTransport(host, port, connections=2, max_batch=16)
+            gateway = DeviceGateway(transport, max_in_flight=500)
+            results = await asyncio.gather(*[gateway.submit(DeviceCommand(f"dev-{i}", "intensity", i))
+                                             for i in range(300)])
+            stats = transport.stats()
+            await gateway.close()
+            await simulator.close()
+            return results, stats
+
+        results, stats = asyncio.run(scenario())
+        self.assertEqual(results, [True] * 300)
+        self.assertEqual(simulator.state["dev-299"], {"intensity": 299})
+        self.assertEqual(simulator.connections, 2)
+        self.assertLess(simulator.frames, 300)
+        self.assertEqual(sum(connection["commands"] for connection in stats), 300)
+        for connection in stats:
+            self.assertEqual(connection["queue_depth"], 0)
+            self.assertLessEqual(connection["mean_batch"], 16)
+            self.assertGreater(connection["mean_rtt"], 0)
+
+    def test_lost_frames_time_out(self):
+        simulator = DeviceSimulator(latency=0.001, drop_rate=1.0)
+
+        async def scenario():
+            host, port = await simulator.start()
+            transport = PooledTransport(host, port, connections=1)
+            gateway = DeviceGateway(transport, timeout=0.05, retries=1, backoff=0.001)
+            with self.assertRaises(GatewayError):
+                await gateway.submit(DeviceCommand("dev-0", "status", True))
+            stats = transport.stats()
+            await gateway.close()
+            await simulator.close()
+            return stats
+
+        stats = asyncio.run(scenario())
+        self.assertEqual((stats[0]["frames"], stats[0]["queue_depth"], stats[0]["connects"]), (2, 0, 1))
+
+    def test_short_answer_fails_the_remaining_commands(self):
+        async def short_bridge(reader, writer):
+            # Answers the first command of every frame only.
+            while line := await reader.readline():
+                frame = json.loads(line)
+                writer.write(json.dumps({"id": frame["id"], "results": [{"ok": True}]}).encode() + b"\n")
+            writer.close()
+
+        async def scenario():
+            server = await asyncio.start_server(short_bridge, "127.0.0.1", 0)
+            transport = PooledTransport(*server.sockets[0].getsockname()[:2], connections=1)
+            connection = transport.connections[0]
+            await connection.send(DeviceCommand("dev-0", "status", True))
+            # Queued in the same loop iteration, so they share one frame.
+            sends = [asyncio.ensure_future(connection.send(DeviceCommand(f"dev-{i}", "status", True)))
+                     for i in range(3)]
+            results = await asyncio.wait_for(asyncio.gather(*sends, return_exceptions=True), 2)
+            await transport.close()
+            server.close()
+            await server.wait_closed()
+            return results
+
+        results = asyncio.run(scenario())
+        self.assertIsNone(results[0])
+        self.assertEqual([type(result) for result in results[1:]], [ConnectionError, ConnectionError])
+
+
+class TestHomeGenerator(unittest.TestCase):
+    def setUp(self):
+        self.files = ["test_generated.json", "test_generated.shb", "test_generated.db"]
+
+    def tearDown(self):
+        for filename in self.files:
+            for suffix in ("", "-wal", "-shm"):
+                if os.path.exists(filename + suffix):
+                    os.remove(filename + suffix)
+
+    def test_deterministic_and_parameterized(self):
+        generator = HomeGenerator(rooms=12, devices=400, device_mix={"SmartBulb": 3, "AirConditioner": 1},
+                                  programmable_ratio=0.5, events_per_device=6, seed=42)
+        first = [room.to_dict() for room in generator.iter_rooms()]
+        self.assertEqual(first, [room.to_dict() for room in generator.iter_rooms()])
+        other_seed = HomeGenerator(rooms=12, devices=400, seed=43)
+        self.assertNotEqual(first, [room.to_dict() for room in other_seed.iter_rooms()])
+
+        home = generator.build()
+        devices = list(home.get_all_devices())
+        bulbs = [device for device in devices if isinstance(device, SmartBulb)]
+        self.assertEqual((len(home.rooms), len(devices)), (12, 400))
+        self.assertAlmostEqual(len(bulbs) / len(devices), 0.75, delta=0.08)
+        self.assertAlmostEqual(len(home.schedulers) / len(bulbs), 0.5, delta=0.08)
+        events = sum(len(scheduler.schedule) for scheduler in home.schedulers)
+        self.assertAlmostEqual(events / len(home.schedulers), 6, delta=1)
+        self.assertFalse(home.is_dirty)
+
+    def test_streamed_files_match_the_built_home(self):
+        generator = HomeGenerator(rooms=9, devices=120, seed=7)
+        expected = generator.build().to_dict()
+        for filename in self.files:
+            generator.write(filename)
+            self.assertEqual(DataManager.load_home(filename).to_dict(), expected, filename)
+
+    def test_command_line_needs_force_to_overwrite(self):
+        db_file = self.files[2]
+        arguments = [db_file, "--rooms", "2", "--devices", "10"]
+        self.assertEqual(home_generator.main(arguments), 0)
+        with open(db_file + "-wal", "w") as f:
+            f.write("stale")
+        self.assertEqual(home_generator.main(arguments), 1)
+        self.assertEqual(home_generator.main(arguments + ["--force", "--seed", "3"]), 0)
+        self.assertEqual(DataManager.load_home(db_file).to_dict(), HomeGenerator(2, 10, seed=3).build().to_dict())
+
+
+class TestMetrics(unittest.TestCase):
+    def setUp(self):
+        self.filename = "test_metrics.json"
+        home = Home("Metered Home")
+        home.add_room("Hall")
+        self.bulb = SmartBulb("Hall Bulb", is_programmable=True)
+        home.add_device_to_room(self.bulb, "Hall")
+        self.home = home
+
+    def tearDown(self):
+        METRICS.disable()
+        METRICS.reset()
+        if os.path.exists(self.filename):
+            os.remove(self.filename)
+
+    def test_disabled_registry_records_nothing(self):
+        DataManager.save_home(self.home, self.filename)
+        DataManager.load_home(self.filename)
+        self.assertEqual(METRICS.snapshot()["metrics"], {})
+        self.assertEqual(METRICS.to_prometheus(), "")
+
+    def test_instrumented_paths(self):
+        METRICS.enable()
+        DataManager.save_home(self.home, self.filename)
+        DataManager.load_home(self.filename)
+        DataManager.load_home(self.filename)
+        now = [time.mktime((2024, 1, 1, 0, 0, 0, 0, 0, -1))]
+        self.home.get_scheduler_for_device(self.bulb.id).add_event("Monday", 1, 0, 0, "turn_on")
+        runner = ScheduleRunner(self.home, clock=lambda: now[0])
+        now[0] += 3600 + 2
+        runner.run_pending()
+
+        metrics = METRICS.snapshot()["metrics"]
+        loads = metrics["data_manager_load_seconds"]["series"]
+        self.assertEqual([(series["labels"], series["count"]) for series in loads], [({"format": "json"}, 2)])
+        self.assertEqual(metrics["data_manager_save_seconds"]["series"][0]["count"], 1)
+        self.assertEqual(metrics["home_from_dict_seconds"]["series"][0]["count"], 2)
+        lag = metrics["schedule_dispatch_lag_seconds"]["series"][0]
+        self.assertEqual((lag["count"], lag["sum"], lag["buckets"]["1.0"], lag["buckets"]["2.5"]), (1, 2.0, 0, 1))
+        self.assertEqual(metrics["schedule_actions_total"]["series"][0]["value"], 1)
+
+    def test_exports(self):
+        registry = MetricsRegistry(enabled=True, clock=lambda: 100.0)
+        registry.counter("saves_total", "Saves", format="json").inc(3)
+        with registry.timer("rebuild_seconds", view="rooms"):
+            pass
+        registry.histogram("sizes", buckets=(10, 100)).observe(50)
+
+        lines = [json.loads(line) for line in registry.to_ndjson().splitlines()]
+        self.assertEqual([(line["ts"], line["name"]) for line in lines],
+                         [(100.0, "rebuild_seconds"), (100.0, "saves_total"), (100.0, "sizes")])
+        text = registry.to_prometheus()
+        self.assertIn('# HELP saves_total Saves\n# TYPE saves_total counter\nsaves_total{format="json"} 3\n', text)
+        self.assertIn('sizes_bucket{le="10"} 0\nsizes_bucket{le="100"} 1\nsizes_bucket{le="+Inf"} 1\n'
+                      'sizes_sum 50\nsizes_count 1\n', text)
+        self.assertIn('rebuild_seconds_count{view="rooms"} 1', text)
+        with self.assertRaises(ValueError):
+            registry.histogram("saves_total")
+
+
+class TestHomeJournal(unittest.TestCase):
+    def setUp(self):
+        self.test_file = "test_journal_home.json"
+
+    def tearDown(self):
+        for suffix in ("", ".journal", ".journal.compacting", ".journal.compacting.tmp", ".tmp"):
+            if os.path.exists(self.test_file + suffix):
+                os.remove(self.test_file + suffix)
+
+    def _populate(self):
+        home, journal = DataManager.open_journaled_home(self.test_file, "Journal Home")
+        home.add_room("Office")
+        bulb = SmartBulb("Desk Lamp", is_programmable=True)
+        home.add_device_to_room(bulb, "Office")
+        bulb.turn_on()
+        bulb.set_intensity(70)
+        bulb.change_color(10, 20, 30)
+        home.get_scheduler_for_device(bulb.id).add_event("Friday", 9, 0, 0, "turn_on")
+        return home, journal, bulb
+
+    def test_replay_after_reopen(self):
+        home, journal, bulb = self._populate()
+        journal.close()
+
+        loaded, journal = DataManager.open_journaled_home(self.test_file)
+        journal.close()
+        self.assertEqual(loaded.name, "Journal Home")
+        restored = loaded.get_device_by_id(bulb.id)
+        self.assertTrue(restored.status)
+        self.assertEqual(restored.intensity, 70)
+        self.assertEqual(restored.color, {'r': 10, 'g': 20, 'b': 30})
+        self.assertEqual(loaded.get_scheduler_for_device(bulb.id).schedule[0]['day'], "Friday")
+
+    def test_compaction_and_truncated_record(self):
+        home, journal, bulb = self._populate()
+        journal.compact()
+        bulb.turn_off()
+        journal.close()
+        self.assertFalse(os.path.exists(self.test_file + ".journal.compacting"))
+        with open(self.test_file + ".journal", 'a') as f:
+            f.write('{"op": "set", "id": "')
+
+        loaded, journal = DataManager.open_journaled_home(self.test_file)
+        journal.close()
+        restored = loaded.get_device_by_id(bulb.id)
+        self.assertFalse(restored.status)
+        self.assertEqual(restored.intensity, 0)
+        self.assertEqual(len(loaded.get_scheduler_for_device(bulb.id).schedule), 1)
+
+    def test_compaction_keeps_records_of_a_crashed_one(self):
+        home, journal, bulb = self._populate()
+        journal.close()
+        # A compaction crashed after rotating the journal.
+        os.replace(self.test_file + ".journal", self.test_file + ".journal.compacting")
+        with open(self.test_file + ".journal.compacting", 'a') as f:
+            f.write('{"op": "set", "id": "')
+
+        home, journal = DataManager.open_journaled_home(self.test_file)
+        home.get_device_by_id(bulb.id).set_intensity(30)
+
+        def crash():
+            raise OSError("Simulated crash")
+        home.to_dict = crash
+        with self.assertRaises(OSError):
+            journal.compact()
+        journal.close()
+
+        loaded, journal = DataManager.open_journaled_home(self.test_file)
+        journal.close()
+        restored = loaded.get_device_by_id(bulb.id)
+        self.assertEqual((restored.status, restored.intensity), (True, 30))
+        self.assertEqual(restored.color, {'r': 10, 'g': 20, 'b': 30})
+
+    def test_background_compaction_during_mutations(self):
+        errors = []
+        hook, threading.excepthook = threading.excepthook, lambda args: errors.append(args.exc_value)
+        self.addCleanup(setattr, threading, "excepthook", hook)
+        home, journal = DataManager.open_journaled_home(self.test_file, "Busy Home")
+        journal.compact_threshold = 25
+        for index in range(40):
+            room = home.add_room(f"Room {index}")
+            for number in range(10):
+                bulb = SmartBulb(f"Bulb {index}.{number}", is_programmable=True)
+                home.add_device_to_room(bulb, room.name)
+                home.get_scheduler_for_device(bulb.id).add_event("Monday", 8, number, 0, "turn_on")
+                if number % 2:
+                    home.remove_device(bulb.id)
+        expected = home.to_dict()
+        journal.close()
+        self.assertEqual(errors, [])
+        self.assertFalse(os.path.exists(self.test_file + ".journal.compacting"))
+
+        loaded, journal = DataManager.open_journaled_home(self.test_file)
+        journal.close()
+        self.assertEqual(loaded.to_dict(), expected)
+
+
+class TestScheduleRunner(unittest.TestCase):
+    def setUp(self):
+        # 2024-01-01 was a Monday.
+        self.monday = time.mktime((2024, 1, 1, 0, 0, 0, 0, 0, -1))
+        self.home = Home("Runner Home")
+        self.home.add_room("Hall")
+        self.bulbs = [SmartBulb(f"Bulb {i}", is_programmable=True) for i in range(3)]
+        for bulb in self.bulbs:
+            self.home.add_device_to_room(bulb, "Hall")
+
+    def test_fires_due_events_in_order(self):
+        first, second, _ = self.bulbs
+        self.home.get_scheduler_for_device(first.id).add_event("Monday", 8, 0, 0, "turn_on")
+        self.home.get_scheduler_for_device(first.id).add_event("Monday", 9, 0, 0, "turn_off")
+        self.home.get_scheduler_for_device(second.id).add_event("Monday", 8, 0, 0, "turn_on")
+        runner = ScheduleRunner(self.home, clock=lambda: self.monday)
+
+        self.assertEqual(runner.next_fire_time(), int(self.monday) + 8 * 3600)
+        self.assertEqual(runner.run_pending(self.monday + 8 * 3600 - 1), 0)
+        self.assertEqual(runner.run_pending(self.monday + 8 * 3600), 2)
+        self.assertTrue(first.status)
+        self.assertTrue(second.status)
+        self.assertEqual(runner.run_pending(self.monday + 9 * 3600), 1)
+        self.assertFalse(first.status)
+        # Next occurrence is one week later.
+        self.assertEqual(runner.next_fire_time(), int(self.monday) + 8 * 3600 + Scheduler.SECONDS_PER_WEEK)
+
+    def test_same_second_events_form_one_batch(self):
+        batches = []
+        for bulb in self.bulbs:
+            self.home.get_scheduler_for_device(bulb.id).add_event("Tuesday", 0, 0, 0, "turn_on")
+        runner = ScheduleRunner(self.home, clock=lambda: self.monday, on_batch=batches.append)
+        runner.run_pending(self.monday + 86400)
+        self.assertEqual(len(batches), 1)
+        self.assertEqual(len(batches[0]), 3)
+
+    def test_picks_up_schedule_changes(self):
+        runner = ScheduleRunner(self.home, clock=lambda: self.monday)
+        self.assertIsNone(runner.next_fire_time())
+        scheduler = self.home.get_scheduler_for_device(self.bulbs[0].id)
+        scheduler.add_event("Monday", 10, 0, 0, "turn_on")
+        self.assertEqual(runner.next_fire_time(), int(self.monday) + 10 * 3600)
+        scheduler.delete_event(0)
+        self.assertIsNone(runner.next_fire_time())
+
+        late_bulb = SmartBulb("Late Bulb", is_programmable=True)
+        self.home.add_device_to_room(late_bulb, "Hall")
+        self.home.get_scheduler_for_device(late_bulb.id).add_event("Monday", 1, 0, 0, "turn_on")
+        runner.run_pending(self.monday + 3600)
+        self.assertTrue(late_bulb.status)
+
+    def test_changes_wait_while_changes_are_taken(self):
+        bulb = self.bulbs[0]
+        self.home.get_scheduler_for_device(bulb.id).add_event("Monday", 8, 0, 0, "turn_on")
+        self.home.mark_clean()
+        runner = ScheduleRunner(self.home, clock=lambda: self.monday)
+        with self.home.lock:
+            worker = threading.Thread(target=runner.run_pending, args=(self.monday + 8 * 3600,))
+            worker.start()
+            worker.join(0.05)
+            self.assertFalse(bulb.status)
+            self.assertEqual(self.home.take_changes(), ([], False))
+        worker.join()
+        self.assertTrue(self.home.is_dirty)
+        self.assertEqual(self.home.take_changes(), ([bulb], False))
+
+
+    def _use_timezone(self, zone):
+        previous = os.environ.get('TZ')
+        os.environ['TZ'] = zone
+        time.tzset()
+
+        def restore():
+            if previous is None:
+                os.environ.pop('TZ', None)
+            else:
+                os.environ['TZ'] = previous
+            time.tzset()
+        self.addCleanup(restore)
+
+    def test_fire_times_follow_wall_clock_across_dst(self):
+        self._use_timezone('Europe/Madrid')
+        scheduler = self.home.get_scheduler_for_device(self.bulbs[0].id)
+        scheduler.add_event("Sunday", 10, 0, 0, "turn_on")
+        # Clocks go forward on Sunday 2024-03-31.
+        spring_monday = time.mktime((2024, 3, 25, 0, 0, 0, 0, 0, -1))
+        runner = ScheduleRunner(self.home, clock=lambda: spring_monday)
+        self.assertEqual(runner.next_fire_time(), time.mktime((2024, 3, 31, 10, 0, 0, 0, 0, 1)))
+        runner.run_pending(runner.next_fire_time())
+        self.assertEqual(runner.next_fire_time(), time.mktime((2024, 4, 7, 10, 0, 0, 0, 0, 1)))
+
+        # 02:30 does not exist on 2024-03-31; it fires at 03:30 instead.
+        self.home.get_scheduler_for_device(self.bulbs[1].id).add_event("Sunday", 2, 30, 0, "turn_on")
+        gap = ScheduleRunner(self.home, clock=lambda: spring_monday)
+        self.assertEqual(gap.next_fire_time(), time.mktime((2024, 3, 31, 3, 30, 0, 0, 0, 1)))
+
+    def test_repeated_hour_fires_once(self):
+        self._use_timezone('Europe/Madrid')
+        scheduler = self.home.get_scheduler_for_device(self.bulbs[0].id)
+        scheduler.add_event("Sunday", 2, 30, 0, "turn_on")
+        # Clocks go back from 03:00 to 02:00 on Sunday 2024-10-27.
+        first = time.mktime((2024, 10, 27, 2, 30, 0, 0, 0, 1))
+        runner = ScheduleRunner(self.home, clock=lambda: first - 60)
+        self.assertEqual(runner.next_fire_time(), first)
+        runner.run_pending(first)
+        self.assertEqual(runner.next_fire_time(), time.mktime((2024, 11, 3, 2, 30, 0, 0, 0, 0)))
+
+        # Started inside the repeated hour, before its second 02:30.
+        late = ScheduleRunner(self.home, clock=lambda: first + 3600 - 60)
+        self.assertEqual(late.next_fire_time(), first + 3600)
 
 if __name__ == '__main__':
     unittest.main()